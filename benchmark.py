@@ -0,0 +1,147 @@
+"""
+Client benchmarks against the mock DT Manager (insight_sql_testing_mock.py).
+
+    python3 benchmark.py --rows 100000 --latency 0.002
+    python3 benchmark.py --url http://127.0.0.1:7777/idt/ --user u --password p
+
+The mock runs in a child process so that peak RSS is the client's own.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from logging import getLogger, ERROR
+
+import insight_sql_testing
+from insight_sql_testing_metrics import RequestMetrics
+
+SCENARIOS = ('requests', 'paging', 'query_rows', 'download', 'wait')
+
+def _peak_rss_kb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def _requests(metrics):
+    return sum(entry['requests'] for entry in metrics.snapshot())
+
+def _run(name, metrics, function):
+    metrics.reset()
+    started = time.perf_counter()
+    result = function() or {}
+    seconds = time.perf_counter() - started
+    requests = _requests(metrics)
+    result.update({ 'scenario': name, 'seconds': seconds, 'requests': requests,
+        'requests_per_sec': requests / seconds if seconds else 0.0, 'peak_rss_kb': _peak_rss_kb() })
+    if 'rows' in result:
+        result['rows_per_sec'] = result['rows'] / seconds if seconds else 0.0
+    if 'bytes' in result:
+        result['mb_per_sec'] = result['bytes'] / seconds / 1024 / 1024 if seconds else 0.0
+    return result
+
+def run_benchmarks(sql_testing, metrics, scenarios, repeat, job_seconds, work_dir):
+    assessment = sql_testing.list_assessments()[0]
+    assessment_id = assessment['id']
+    database_id = sql_testing.get_database_id_from_name('mock-db')
+    sql_workload_id = assessment['sqlWorkloadId']
+    results = []
+
+    def requests():
+        for _ in range(repeat * 100):
+            sql_testing.get_version()
+
+    def paging():
+        rows = 0
+        for _ in range(repeat):
+            rows += sum(1 for _ in sql_testing.iter_assessment_sqls(assessment_id))
+        return { 'rows': rows }
+
+    def query_rows():
+        rows = 0
+        for row_id in range(repeat * 10):
+            rows += len(sql_testing.get_assessment_sql_query_rows_all(assessment_id, row_id))
+        return { 'rows': rows }
+
+    def download():
+        size = 0
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            for _ in range(repeat):
+                size += os.path.getsize(sql_testing.download_assessment_csv(assessment_id))
+        finally:
+            os.chdir(cwd)
+        return { 'bytes': size }
+
+    def wait():
+        # time spent waiting past the job's own duration
+        overheads = []
+        for i in range(repeat):
+            started = time.perf_counter()
+            sql_testing.execute_assessment('benchmark-' + str(i), sql_workload_id, ['user'], ['pass'], target_db_id=database_id)
+            overheads.append(time.perf_counter() - started - job_seconds)
+        return { 'wait_overhead_sec': sum(overheads) / len(overheads) }
+
+    functions = { 'requests': requests, 'paging': paging, 'query_rows': query_rows, 'download': download, 'wait': wait }
+    for name in scenarios:
+        results.append(_run(name, metrics, functions[name]))
+    return results
+
+def _print_table(results):
+    columns = ('scenario', 'seconds', 'requests', 'requests_per_sec', 'rows_per_sec', 'mb_per_sec', 'wait_overhead_sec', 'peak_rss_kb')
+    print(' '.join(c.rjust(18) for c in columns))
+    for result in results:
+        cells = []
+        for c in columns:
+            v = result.get(c, '')
+            cells.append((format(v, '.3f') if isinstance(v, float) else str(v)).rjust(18))
+        print(' '.join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description='PyInsightSQLTesting client benchmarks')
+    parser.add_argument('--url', help='DT Manager URL (default: start a mock server)')
+    parser.add_argument('--user', default='mock')
+    parser.add_argument('--password', default='mock')
+    parser.add_argument('--rows', type=int, default=10000, help='mock: result rows per assessment')
+    parser.add_argument('--query-rows', type=int, default=1000, help='mock: query rows per result row')
+    parser.add_argument('--latency', type=float, default=0.0, help='mock: seconds added per response')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='mock: share of failed requests')
+    parser.add_argument('--job-seconds', type=float, default=2.0, help='mock: job duration')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--json', action='store_true', help='print JSON lines instead of a table')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        mock = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'insight_sql_testing_mock.py')
+        server = subprocess.Popen([sys.executable, mock, '--port', '0', '--rows', str(args.rows), '--query-rows', str(args.query_rows),
+            '--latency', str(args.latency), '--failure-rate', str(args.failure_rate), '--job-seconds', str(args.job_seconds)],
+            stdout=subprocess.PIPE, text=True)
+        url = server.stdout.readline().strip()
+
+    logger = getLogger('benchmark')
+    logger.setLevel(ERROR)
+    metrics = RequestMetrics()
+    try:
+        with insight_sql_testing.InsightSQLTesting(url, args.user, args.password, upper_logger=logger, request_hooks=[metrics]) as sql_testing:
+            with tempfile.TemporaryDirectory() as work_dir:
+                results = run_benchmarks(sql_testing, metrics, args.scenarios.split(','), args.repeat, args.job_seconds, work_dir)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        _print_table(results)
+
+if __name__ == '__main__':
+    main()
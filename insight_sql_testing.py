@@ -1,16 +1,225 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 import json
+import os
+import fnmatch
+import uuid
+import hashlib
+import zlib
 import time, datetime
+import random
+import re
+from email.utils import parsedate_to_datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, InvalidStateError
+import concurrent.futures
 from logging import getLogger, StreamHandler, FileHandler, Formatter, DEBUG, INFO
 
+from insight_sql_testing_metrics import request_event, call_request_hooks
+from insight_sql_testing_rows import CompactRowFactory
+
 HEADERS = {'content-type': 'application/json'}
 
 # Paging parameter for list
 PAGE_LIMIT = 20
 MAX_ELEMENTS = 100000
 
-# Wait interval
+# Paging parameter for *_all (whole list) operations
+LIST_PAGE_LIMIT = 100
+LIST_PREFETCH_PAGES = 4     # pages requested concurrently
+TOTAL_COUNT_KEYS = ('total', 'totalCount')
+
+# Name -> id index lifetime in seconds (None: until invalidated, 0: no index)
+NAME_CACHE_TTL = 300
+
+# Wait interval: polls start after WAIT_FIRST_SECONDS and back off up to WAIT_SECONDS
 WAIT_SECONDS = 10
+WAIT_FIRST_SECONDS = 0.5
+WAIT_BACKOFF = 1.5
+
+# Job progress shown while waiting: resource -> (comment, key in jobs[0])
+JOB_PROGRESS = {
+    'sql-workloads': ('processed sqls', 'count'),
+    'patch-sqls': ('processed(%)', 'percent'),
+    'assessments': ('processed sessions', 'count'),
+}
+
+# Assessment result codes (index of summary.allCode)
+RESULT_CODES = {
+    0: 'Success',
+    1: 'Tgt-DB Failed',
+    2: 'Test src-DB Failed',
+    3: 'Both Failed',
+    4: 'Different returns',
+    5: 'Performance degradation',
+}
+
+# Keys of an assessment result row (assessments/<id>/results)
+RESULT_ID_KEY = 'id'
+RESULT_CODE_KEY = 'resultCode'
+RESULT_SQL_HASH_KEY = 'sqlHash'
+RESULT_SQL_TEXT_KEY = 'sqlText'
+RESULT_DB_USER_KEY = 'dbUser'
+RESULT_ELAPSED_KEY = 'elapsedTime'          # target DB
+RESULT_CMP_ELAPSED_KEY = 'cmpElapsedTime'   # compare DB
+
+# Upload: source files are streamed in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_RETRIES = 2      # re-sends after a connection failure
+
+# Download: files are written to <file>.part and renamed when complete
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3    # resumes (HTTP Range) after a cut-off transfer
+DOWNLOAD_WORKERS = 4    # parallel downloads of download_assessment_sql_query_rows_many
+
+# Batch SQL probing (iter_try_parse_sqls, iter_try_execute_sqls, iter_query_plans)
+PROBE_WORKERS = 8       # concurrent probes
+
+# Bulk operations (delete_*_where, create_many)
+BULK_WORKERS = 8        # concurrent requests
+
+# create method -> keyword argument holding the element name (create_many results)
+CREATE_NAME_KEYS = { 'create_user': 'user_name', 'create_database': 'database_name',
+    'create_sql_workload': 'sql_workload_name', 'create_sql_workload_upload': 'sql_workload_name',
+    'create_patch_sql_from_assessment': 'patch_sql_name', 'create_patch_sql_upload': 'patch_sql_name',
+    'execute_assessment': 'assessment_name' }
+
+# HTTP connection pool (shared by all requests of a client)
+POOL_CONNECTIONS = 4    # number of hosts to keep pools for
+POOL_MAXSIZE = 16       # max keep-alive connections per host
+POOL_BLOCK = False      # block instead of opening extra connections when the pool is full
+
+# HTTP timeouts (seconds)
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+
+# Retries of transient failures (connection errors, timeouts and RETRY_STATUSES)
+RETRIES = 3
+RETRY_BACKOFF = 0.5         # seconds, doubled per retry (full jitter)
+RETRY_MAX_WAIT = 30         # longest backoff in seconds
+RETRY_AFTER_MAX = 300       # longest Retry-After honoured in seconds
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')   # retried without opt-in
+
+# Circuit breaker: fail fast after this many consecutive failures, for CIRCUIT_RESET_SECONDS
+CIRCUIT_FAILURES = 5
+CIRCUIT_RESET_SECONDS = 30
+
+class InsightAPIError(Exception):
+    """An API request answered with an error status."""
+    def __init__(self, message, method = None, api = None, status = None, text = None):
+        super().__init__(message)
+        self.method = method
+        self.api = api
+        self.status = status
+        self.text = text
+
+class InsightAuthError(InsightAPIError):
+    """401/403: not logged in or not allowed."""
+
+class InsightNotFoundError(InsightAPIError):
+    """404: no such resource."""
+
+class InsightClientError(InsightAPIError):
+    """Other 4xx: the request was rejected."""
+
+class InsightServerError(InsightAPIError):
+    """5xx and 429: the manager failed or is overloaded (retried for idempotent requests)."""
+
+class InsightCircuitOpenError(InsightAPIError):
+    """Not sent: too many consecutive failures, the manager is given time to recover."""
+
+def api_error(method, api, status, text):
+    if status in (401, 403):
+        error_class = InsightAuthError
+    elif status == 404:
+        error_class = InsightNotFoundError
+    elif status == 429 or status >= 500:
+        error_class = InsightServerError
+    else:
+        error_class = InsightClientError
+    return error_class(method + ' ' + api + ': status=' + str(status), method, api, status, text)
+
+# failures worth retrying later (e.g. while waiting for a job)
+TRANSIENT_ERRORS = (InsightServerError, InsightCircuitOpenError, requests.ConnectionError, requests.Timeout)
+
+def connect_failed(error):
+    # True when the connection could not be made, i.e. the request was never sent
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, ConnectTimeoutError)    # NewConnectionError included
+
+class CircuitBreaker():
+    """
+    Consecutive-failure circuit breaker shared by the requests of a client.
+
+    After failures consecutive failures (connection errors, timeouts, 5xx or
+    429) requests fail fast with InsightCircuitOpenError for reset_seconds.
+    Then one trial request is let through: success closes the circuit, a
+    failure opens it again.
+    """
+    def __init__(self, failures = CIRCUIT_FAILURES, reset_seconds = CIRCUIT_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        # 'closed', 'open' or 'half-open'
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self._opened_at >= self.reset_seconds else 'open'
+
+    def before_request(self, method, api):
+        # True when this request is the half-open trial (end it with end_trial)
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at >= self.reset_seconds and not self._trial:
+                self._trial = True
+                return True
+        raise InsightCircuitOpenError('Circuit open after ' + str(self._consecutive) + ' consecutive failures: ' + method + ' ' + api, method, api)
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or (self.failures and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def end_trial(self):
+        # the trial ended without an outcome (e.g. a non-transient error); the next request may try
+        with self._lock:
+            self._trial = False
+
+def retry_delay(attempt, backoff = RETRY_BACKOFF, max_wait = RETRY_MAX_WAIT, retry_after = None):
+    # full jitter exponential backoff, at least Retry-After (seconds or HTTP date)
+    delay = random.uniform(0, min(max_wait, backoff * (2 ** attempt)))
+    if retry_after:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                seconds = 0
+        delay = max(delay, min(seconds, RETRY_AFTER_MAX))
+    return delay
 
 def get_property(dic, key):
     if key in dic:
@@ -18,8 +227,169 @@ def get_property(dic, key):
     else:
         return '(no ' + key + ')'
 
+JOB_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+def parse_job_time(job, key):
+    # jobs[n].startTime / endTime as datetime (None if missing)
+    if key in job and job[key] is not None:
+        return datetime.datetime.strptime(job[key], JOB_TIME_FORMAT)
+    return None
+
+def wait_intervals(first = WAIT_FIRST_SECONDS, backoff = WAIT_BACKOFF, longest = WAIT_SECONDS):
+    # fast polls for short jobs, growing to the longest interval for long ones
+    interval = first
+    while True:
+        yield interval
+        interval = min(interval * backoff, longest)
+
+def get_job_progress(response, progress_key):
+    if 'jobs' in response and len(response['jobs']) > 0:
+        return response['jobs'][0].get(progress_key)
+    return None
+
+class MultipartFileUpload():
+    """
+    multipart/form-data request body that streams one file in bounded chunks.
+
+    With compress=True the file part is gzip-compressed on the fly (the server
+    must accept gzip uploads); the body length is then unknown and the request
+    is sent with chunked transfer encoding. Iterating the object again re-reads
+    the file from the start, so a failed upload can be retried without holding
+    the file in memory.
+    """
+    def __init__(self, fields, file_field, file_path, file_name = 'upload_file', content_type = 'text/csv',
+        compress = False, chunk_size = UPLOAD_CHUNK_SIZE, progress_callback = None):
+        boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + boundary
+        self.file_path = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.bytes_sent = 0     # of the last iteration
+
+        head = ''
+        for k, v in fields.items():
+            head += '--' + boundary + '\r\nContent-Disposition: form-data; name="' + k + '"\r\n\r\n' + str(v) + '\r\n'
+        if compress:
+            file_name += '.gz'
+            content_type = 'application/gzip'
+        head += '--' + boundary + '\r\nContent-Disposition: form-data; name="' + file_field + '"; filename="' + file_name + '"\r\n'
+        head += 'Content-Type: ' + content_type + '\r\n\r\n'
+        self._head = head.encode('utf-8')
+        self._tail = ('\r\n--' + boundary + '--\r\n').encode('utf-8')
+
+    def __bool__(self):
+        # never an empty body, even when the length is unknown
+        return True
+
+    def __len__(self):
+        # 0: unknown (chunked transfer encoding)
+        if self.compress:
+            return 0
+        return len(self._head) + self.file_size + len(self._tail)
+
+    def __iter__(self):
+        bytes_sent = len(self._head)
+        bytes_read = 0
+        yield self._head
+        compressor = zlib.compressobj(wbits=31) if self.compress else None  # gzip format
+        with open(self.file_path, 'rb') as file:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                bytes_read += len(chunk)
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    bytes_sent += len(chunk)
+                    yield chunk
+                if self.progress_callback is not None:
+                    self.progress_callback(bytes_sent, bytes_read, self.file_size)
+        if compressor is not None:
+            chunk = compressor.flush()
+            bytes_sent += len(chunk)
+            yield chunk
+        yield self._tail
+        self.bytes_sent = bytes_sent + len(self._tail)
+        if self.progress_callback is not None:
+            self.progress_callback(self.bytes_sent, bytes_read, self.file_size)
+
+class InsightJob(Future):
+    """
+    Handle of a submitted server-side job (sql-workload, patch-sql or assessment).
+
+    It is a concurrent.futures.Future whose result is the resource info once the
+    job is ready (statusEx is 0), so concurrent.futures.wait/as_completed work on
+    it. The owning client polls all pending jobs together in the background.
+    """
+    def __init__(self, key, id):
+        super().__init__()
+        self.key = key
+        self.id = id
+        self.last_response = None
+        # the server-side job cannot be cancelled from here
+        self.set_running_or_notify_cancel()
+
+    def wait(self, timeout = None):
+        """Wait up to timeout seconds. Returns True if the job is finished."""
+        concurrent.futures.wait([self], timeout)
+        return self.done()
+
+    def progress(self):
+        """Last seen progress (processed count or percent), None before the first poll."""
+        if self.last_response is None:
+            return None
+        return get_job_progress(self.last_response, JOB_PROGRESS[self.key][1])
+
+    def _update(self, response):
+        self.last_response = response
+        if response['statusEx'] == 0:
+            try:
+                self.set_result(response)
+            except InvalidStateError:
+                pass
+
+class SQLProbeStats():
+    """Counters and per-statement latencies of the iter_try_*_sqls / iter_query_plans batches."""
+    def __init__(self):
+        self.statements = 0     # distinct statements probed
+        self.duplicates = 0     # skipped identical statements
+        self.succeeded = 0
+        self.failed = 0
+        self.latencies = []     # seconds per probed statement
+
+    def add(self, result):
+        self.statements += 1
+        if result['error'] is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.latencies.append(result['elapsed'])
+
+    def percentile(self, p):
+        # nearest rank, None before the first result
+        if len(self.latencies) == 0:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, max(0, int(round(p / 100.0 * len(latencies))) - 1))]
+
+    def __str__(self):
+        text = 'statements: ' + str(self.statements) + ' (succeeded:' + str(self.succeeded) + ', failed:' + str(self.failed) + ', duplicates:' + str(self.duplicates) + ')'
+        if len(self.latencies) > 0:
+            text += ', latency: mean=' + format(sum(self.latencies) / len(self.latencies), '.3f')
+            text += ', p50=' + format(self.percentile(50), '.3f') + ', p95=' + format(self.percentile(95), '.3f') + ', max=' + format(max(self.latencies), '.3f')
+        return text
+
 class InsightSQLTesting():
-    def __init__(self, url_base, user, password, upper_logger = None):
+    def __init__(self, url_base, user, password, upper_logger = None,
+        pool_connections = POOL_CONNECTIONS, pool_maxsize = POOL_MAXSIZE, pool_block = POOL_BLOCK,
+        connect_timeout = CONNECT_TIMEOUT, read_timeout = READ_TIMEOUT,
+        list_page_limit = LIST_PAGE_LIMIT, list_prefetch_pages = LIST_PREFETCH_PAGES,
+        name_cache_ttl = NAME_CACHE_TTL, download_chunk_size = DOWNLOAD_CHUNK_SIZE, query_plan_cache = None,
+        request_hooks = None, retries = RETRIES, retry_backoff = RETRY_BACKOFF, retry_max_wait = RETRY_MAX_WAIT,
+        retry_post = False, circuit_breaker = None, raise_errors = True, session_store = None, compact_rows = False):
         """
         Create Insight SQL Testing session.
 
@@ -31,10 +401,78 @@ class InsightSQLTesting():
         user : user name
         passwoer : password for the user
         upper_logger : logger to be used
+        pool_connections : number of per-host connection pools to keep
+        pool_maxsize : max keep-alive connections kept per host
+        pool_block : wait for a free connection when the pool is exhausted
+            instead of opening a throwaway connection
+        connect_timeout : seconds to wait for a TCP connection (None: no timeout)
+        read_timeout : seconds to wait for the server response (None: no timeout)
+        list_page_limit : page size used by *_all operations
+        list_prefetch_pages : pages fetched concurrently by *_all operations
+            (1: fetch pages one by one)
+        name_cache_ttl : seconds a name -> id index built by *_id_from_name
+            stays valid (None: until invalidate_name_cache, 0: no index);
+            a name missing from the index rebuilds it once
+        download_chunk_size : buffer size of file downloads in bytes
+        query_plan_cache : QueryPlanCache (insight_sql_testing_plan_cache) in
+            front of get_query_plan (None: no cache)
+        request_hooks : callables called with a dict after every request:
+            method, endpoint (ids replaced by {id}), api, status (None when no
+            response), latency (seconds), bytesSent, bytesReceived, retries,
+            page (offset / limit of paged requests, else None), error
+            (e.g. RequestMetrics of insight_sql_testing_metrics)
+        retries : retries of a GET/PUT/DELETE after a connection error, a
+            timeout or a 429/502/503/504 status (0: no retry)
+        retry_backoff : first backoff in seconds, doubled per retry with full
+            jitter; a Retry-After header is honoured (up to RETRY_AFTER_MAX)
+        retry_max_wait : longest backoff in seconds
+        retry_post : also retry POST requests (creating a resource twice is
+            possible when the first response was lost)
+        circuit_breaker : CircuitBreaker shared by the requests (None: a new
+            one with CIRCUIT_FAILURES/CIRCUIT_RESET_SECONDS, False: disabled)
+        raise_errors : raise InsightAPIError subclasses on error statuses
+            (False: log the error and return None)
+        session_store : SessionStore (insight_sql_testing_session) shared by
+            processes: a live stored session is reused without logging in,
+            a new one is stored, and the shared session is not logged out
+            on exit (see logout). Expired sessions (401) are renewed.
+        compact_rows : return the rows of list and query rows pages (get_*_sqls,
+            *_all, iter_*, list_*) as read-only CompactRow mappings
+            (insight_sql_testing_rows): one shared key tuple per kind of row
+            and repeated values (dbUser, host, resultCode, ...) interned.
+            Use row.to_dict() where a mutable dict is needed.
         """
         self._logger = upper_logger or getLogger(__name__)
 
         self._url_base = url_base + 'api/v2/'
+        self._cookies = None
+        self._user = user
+        self._password = password
+        self._session_store = session_store
+        self._session_lock = threading.Lock()
+        self._request_hooks = list(request_hooks or [])
+        self._retries = retries
+        self._retry_backoff = retry_backoff
+        self._retry_max_wait = retry_max_wait
+        self._retry_post = retry_post
+        self._circuit = CircuitBreaker() if circuit_breaker is None else (circuit_breaker or None)
+        self._raise_errors = raise_errors
+        self._http = self._create_transport(pool_connections, pool_maxsize, pool_block)
+        self._timeout = (connect_timeout, read_timeout)
+        self._list_page_limit = list_page_limit
+        self._list_prefetch_pages = max(1, list_prefetch_pages)
+        self._page_executor = None
+        self._page_executor_lock = threading.Lock()
+        self._row_factory = CompactRowFactory() if compact_rows else None
+        self._name_cache_ttl = name_cache_ttl
+        self._name_indexes = {}     # list_key -> (build time, { name: id })
+        self._name_index_lock = threading.Lock()
+        self._download_chunk_size = download_chunk_size
+        self.query_plan_cache = query_plan_cache
+        self._jobs = []             # pending InsightJob handles
+        self._jobs_lock = threading.Lock()
+        self._jobs_submitted = threading.Event()
+        self._job_poller = None
         self._cookies = self._create_session(user, password)
 
     def __enter__(self):
@@ -46,127 +484,673 @@ class InsightSQLTesting():
     def __del__(self):
         self._remove_session()
 
+    def _create_transport(self, pool_connections, pool_maxsize, pool_block):
+        # one keep-alive connection pool shared by every request of this client
+        http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        http.mount('http://', adapter)
+        http.mount('https://', adapter)
+        return http
+
+    def _close_transport(self):
+        self._stop_job_poller()
+        page_executor_lock = getattr(self, '_page_executor_lock', None)
+        if page_executor_lock is not None:
+            with page_executor_lock:
+                page_executor, self._page_executor = self._page_executor, None
+            if page_executor is not None:
+                page_executor.shutdown(wait=False, cancel_futures=True)
+        http = getattr(self, '_http', None)
+        if http is not None:
+            http.close()
+            self._http = None
+
     def _create_session(self, user, password):
+        if self._session_store is None:
+            return self._login(user, password)[1]
+
+        # the store stays locked from the lookup to the save, so clients
+        # starting together log in once and the others reuse that session
+        logins = []
+        def login():
+            succeeded, cookies = self._login(user, password)
+            logins.append(cookies)
+            return cookies if succeeded else None
+        cookies, stored = self._session_store.load_or_login(self._url_base, user, login)
+        if stored:
+            self._logger.info('Reuse the stored session: ' + user)
+            return cookies
+        return logins[0]
+
+    def _login(self, user, password):
+        # (logged in, cookies)
         url = self._url_base + 'auth'
         body = { 'username': user, 'password': password }
-        r = requests.post(url, headers=HEADERS, json=body)
+        started = time.perf_counter()
+        r = self._http.post(url, headers=HEADERS, json=body, timeout=self._timeout)
+        self._emit_request('POST', 'auth', started, r, len(r.request.body or b''))
+        if r.status_code != 200 and self._raise_errors:
+            raise api_error('POST', 'auth', r.status_code, r.text)
         self._logger.info(r.json())
-        return r.cookies
+        return r.status_code == 200, r.cookies
+
+    def _renew_session(self, stale_cookies):
+        # after a 401: log in again, unless another thread already did
+        with self._session_lock:
+            if self._cookies is not stale_cookies:
+                return
+            self._logger.info('Session expired, log in again: ' + self._user)
+            if self._session_store is not None:
+                # another process may have stored a renewed session meanwhile: reuse it
+                self._session_store.discard(self._url_base, self._user, stale_cookies)
+            self._cookies = self._create_session(self._user, self._password)
+
+    def logout(self):
+        """Log out now, also when the session is shared through a session_store."""
+        if self._cookies is not None:
+            if self._session_store is not None:
+                self._session_store.discard(self._url_base, self._user, self._cookies)
+            self._delete_session()
+
+    def _delete_session(self):
+        url = self._url_base + 'auth'
+        started = time.perf_counter()
+        r = self._http.delete(url, headers=HEADERS, cookies=self._cookies, timeout=self._timeout)
+        self._emit_request('DELETE', 'auth', started, r)
+        self._logger.info(r.json())
+        self._cookies = None
 
     def _remove_session(self):
-        if self._cookies is not None:
-            url = self._url_base + 'auth'
-            r = requests.delete(url, headers=HEADERS, cookies=self._cookies)
-            self._logger.info(r.json())
+        if getattr(self, '_session_store', None) is not None:
+            # shared with other clients: keep it logged in
             self._cookies = None
+        if getattr(self, '_cookies', None) is not None:
+            self._delete_session()
+        self._close_transport()
 
 
-    def _call_api(self, method, api, body=None, files=None):
+    def add_request_hook(self, hook):
+        self._request_hooks.append(hook)
+
+    def remove_request_hook(self, hook):
+        self._request_hooks.remove(hook)
+
+    def _emit_request(self, method, api, started, response = None, bytes_sent = 0, bytes_received = None, retries = 0, error = None):
+        if not self._request_hooks:
+            return
+        if bytes_received is None:
+            bytes_received = 0 if response is None else len(response.content)
+        event = request_event(method, api, None if response is None else response.status_code, time.perf_counter() - started,
+            bytes_sent, bytes_received, retries, error)
+        call_request_hooks(self._request_hooks, event, self._logger)
+
+    def _retry_delay(self, attempt, retry_after = None):
+        return retry_delay(attempt, self._retry_backoff, self._retry_max_wait, retry_after)
+
+    def _call_api(self, method, api, body=None, files=None, retries=0, idempotent=None, raise_errors=None):
+        # idempotent: retry on transient failures (None: GET/PUT/DELETE, or POST with retry_post)
+        # raise_errors: None for the client setting
+        if raise_errors is None:
+            raise_errors = self._raise_errors
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS or (self._retry_post and method.startswith('POST'))
+        max_retries = self._retries if idempotent else 0
         url = self._url_base + api
+        attempt = 0
+        renewed = False
+        renewing = False
+        trial = False
+        try:
+            while True:
+                # the retry after a session renewal belongs to the same attempt
+                if self._circuit is not None and not renewing:
+                    trial = self._circuit.before_request(method, api) or trial
+                renewing = False
+                started = time.perf_counter()
+                sent_cookies = self._cookies
+                try:
+                    r = self._send(method, url, api, body, files)
+                except requests.RequestException as e:
+                    self._emit_request(method, api, started, retries=retries + attempt, error=e)
+                    transient = isinstance(e, (requests.ConnectionError, requests.Timeout))
+                    if transient and self._circuit is not None:
+                        self._circuit.record_failure()
+                    if not transient or attempt >= max_retries:
+                        raise
+                    delay = self._retry_delay(attempt)
+                    self._logger.warning(method + ' ' + api + ' failed (' + str(e) + '), retrying in ' + format(delay, '.1f') + 's')
+                else:
+                    if self._request_hooks:
+                        bytes_sent = body.bytes_sent if method == 'POST_STREAM' else len(r.request.body or b'')
+                        self._emit_request(method, api, started, r, bytes_sent, retries=retries + attempt)
+                    if r.status_code == 401 and not renewed and self._password is not None:
+                        renewed = True
+                        renewing = True
+                        self._renew_session(sent_cookies)
+                        continue
+                    failed = r.status_code in RETRY_STATUSES or r.status_code >= 500
+                    if self._circuit is not None:
+                        if failed:
+                            self._circuit.record_failure()
+                        else:
+                            self._circuit.record_success()
+                    if r.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                        break
+                    delay = self._retry_delay(attempt, r.headers.get('Retry-After'))
+                    self._logger.warning(method + ' ' + api + ': status=' + str(r.status_code) + ', retrying in ' + format(delay, '.1f') + 's')
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            if trial:
+                self._circuit.end_trial()
+
+        if r.status_code != 200:
+            self._logger.error('status=' + str(r.status_code))
+            self._logger.error('text=' + r.text)
+            if raise_errors:
+                raise api_error(method, api, r.status_code, r.text)
+            return None
+
+        response = r.json()
+        # serialize only when DEBUG is enabled
+        if self._logger.isEnabledFor(DEBUG):
+            self._logger.debug(json.dumps(response, indent=2))
+
+        return response
+
+    def _send(self, method, url, api, body, files):
         if method == 'GET':
-            r = requests.get(url, headers=HEADERS, cookies=self._cookies)
+            r = self._http.get(url, headers=HEADERS, cookies=self._cookies, timeout=self._timeout)
         elif method == 'POST':
-            r = requests.post(url, headers=HEADERS, json=body, cookies=self._cookies)
+            r = self._http.post(url, headers=HEADERS, json=body, cookies=self._cookies, timeout=self._timeout)
         elif method == 'POST_UPLOAD':
-            r = requests.post(url, files=files, data=body, cookies=self._cookies)
+            r = self._http.post(url, files=files, data=body, cookies=self._cookies, timeout=self._timeout)
+        elif method == 'POST_STREAM':
+            # body is a MultipartFileUpload
+            r = self._http.post(url, headers={'content-type': body.content_type}, data=body, cookies=self._cookies, timeout=self._timeout)
         elif method == 'PUT':
-            r = requests.put(url, headers=HEADERS, json=body, cookies=self._cookies)
+            r = self._http.put(url, headers=HEADERS, json=body, cookies=self._cookies, timeout=self._timeout)
         elif method == 'PATCH':
-            r = requests.patch(url, headers=HEADERS, json=body, cookies=self._cookies)
+            r = self._http.patch(url, headers=HEADERS, json=body, cookies=self._cookies, timeout=self._timeout)
         elif method == 'DELETE':
-            r = requests.delete(url, headers=HEADERS, json=body, cookies=self._cookies)
+            r = self._http.delete(url, headers=HEADERS, json=body, cookies=self._cookies, timeout=self._timeout)
         else:
             error_message = 'Unknown method:' + method + 'for api:' + api + '.'
             self._logger.error(error_message)
             raise ValueError(error_message)
+        return r
 
-        if r.status_code != 200:
-            self._logger.error('status=' + str(r.status_code))
-            self._logger.error('text=' + r.text)
-            return None
-
-        self._logger.debug(json.dumps(r.json(), indent=2))
-
-        return r.json()
-
-    def _list_elements_part(self, list_key, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
+    def _list_page(self, list_key, limit, offset, query_parameters = None, raise_errors = None):
+        # returns (rows, total count or None)
         query_parameter_string = ''
         if query_parameters is not None:
             for k,v in query_parameters.items():
                 query_parameter_string += '&' + k + '=' + v
-        elements = []
-        response = self._call_api('GET', list_key + '?limit=' + str(limit) + '&offset=' + str(offset) + query_parameter_string)
+        response = self._call_api('GET', list_key + '?limit=' + str(limit) + '&offset=' + str(offset) + query_parameter_string, raise_errors=raise_errors)
         if response is None:
-            return None
+            return None, None
+
+        total = None
+        for key in TOTAL_COUNT_KEYS:
+            if isinstance(response.get(key), int):
+                total = response[key]
+                break
+        rows = response['rows']
+        if self._row_factory is not None:
+            rows = self._row_factory.rows(rows)
+        return rows, total
 
-        # search id from name
-        for target_element in response['rows']:
-            elements.append(target_element.copy())
+    def _list_elements_part(self, list_key, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
+        rows, _ = self._list_page(list_key, limit, offset, query_parameters)
+        return rows
 
-        return elements
+    def _iter_pages(self, fetch_page, offset = 0):
+        """
+        Yield non-empty pages in offset order.
+
+        fetch_page(offset) returns (rows, total). The first page is fetched alone;
+        it gives the page size the server actually applied and the total count
+        (if the API returns it). Then up to list_prefetch_pages pages are
+        requested concurrently. With a known total, no request is made past the
+        end. Without it, paging stops at the first short or empty page, and the
+        requests in flight start at one and double after every full page, so a
+        short listing costs at most one request past its end.
+        """
+        rows, total = fetch_page(offset)
+        if not rows:
+            return
+        yield rows
+
+        step = len(rows)
+        end = MAX_ELEMENTS if total is None else min(total, MAX_ELEMENTS)
+        next_offset = offset + step
+        if next_offset >= end:
+            return
+
+        in_flight = self._list_prefetch_pages if total is not None else 1
+        page_executor = self._get_page_executor()
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < in_flight and next_offset < end:
+                    pending.append(page_executor.submit(fetch_page, next_offset))
+                    next_offset += step
+                if len(pending) == 0:
+                    return
+
+                rows, _ = pending.popleft().result()
+                if not rows:
+                    return
+                yield rows
+                if len(rows) < step:
+                    return
+                in_flight = min(in_flight * 2, self._list_prefetch_pages)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _get_page_executor(self):
+        # one prefetch pool per client, created on first use
+        with self._page_executor_lock:
+            if self._page_executor is None:
+                self._page_executor = ThreadPoolExecutor(max_workers=self._list_prefetch_pages, thread_name_prefix='insight-page')
+            return self._page_executor
+
+    def _list_page_fetcher(self, list_key, query_parameters = None, raise_errors = None):
+        def fetch_page(offset):
+            return self._list_page(list_key, self._list_page_limit, offset, query_parameters, raise_errors)
+        return fetch_page
+
+    def _query_rows_page_fetcher(self, get_query_rows, assessment_id, assessment_row_id):
+        def fetch_page(offset):
+            rows = get_query_rows(assessment_id, assessment_row_id, offset)
+            if self._row_factory is not None and rows:
+                rows = self._row_factory.rows(rows)
+            return rows, None
+        return fetch_page
+
+    def _iter_elements(self, fetch_page, offset = 0, pages = False):
+        for page in self._iter_pages(fetch_page, offset):
+            if pages:
+                yield page
+            else:
+                yield from page
 
     def _list_elements(self, list_key, query_parameters = None):
         elements = []
-        for offset in range(0, MAX_ELEMENTS, PAGE_LIMIT):
-            elemens_part = self._list_elements_part(list_key, PAGE_LIMIT, offset, query_parameters)
-            if elemens_part is None:
-                break
-            if len(elemens_part) == 0:
-                break
+        for page in self._iter_pages(self._list_page_fetcher(list_key, query_parameters)):
+            elements.extend(page)
 
-            elements.extend(elemens_part)
+        return elements
+
+    def _query_rows_elements(self, get_query_rows, assessment_id, assessment_row_id):
+        elements = []
+        for page in self._iter_pages(self._query_rows_page_fetcher(get_query_rows, assessment_id, assessment_row_id)):
+            elements.extend(page)
 
         return elements
 
     def _get_id_from_name(self, list_key, target_name):
-        for offset in range(0, MAX_ELEMENTS, PAGE_LIMIT):
-            response = self._call_api('GET', list_key + '?limit=' + str(PAGE_LIMIT) + '&offset=' + str(offset))
-            if len(response['rows']) == 0:
-                # not found
-                return None
-
+        if self._name_cache_ttl == 0:
             # search id from name
-            target_id = '-'
-            for target_element in response['rows']:
+            for target_element in self._iter_elements(self._list_page_fetcher(list_key)):
                 if target_element['name'] == target_name:
-                    target_id = target_element['id']
-                    return target_id
+                    return target_element['id']
+            # not found
+            return None
+
+        names, built = self._get_name_index(list_key)
+        id = names.get(target_name)
+        if id is None and not built:
+            # maybe created by another client since the index was built: rebuild once
+            names, _ = self._get_name_index(list_key, rebuild=True)
+            id = names.get(target_name)
+        return id
+
+    def _get_name_index(self, list_key, rebuild = False):
+        # (names, True if built by this call)
+        with self._name_index_lock:
+            if list_key in self._name_indexes and not rebuild:
+                built_time, names = self._name_indexes[list_key]
+                if self._name_cache_ttl is None or time.monotonic() - built_time < self._name_cache_ttl:
+                    return names, False
+
+        # build from one bulk listing (the first element wins for duplicated names)
+        built_time = time.monotonic()
+        names = {}
+        for element in self._iter_elements(self._list_page_fetcher(list_key)):
+            names.setdefault(element['name'], element['id'])
+        with self._name_index_lock:
+            self._name_indexes[list_key] = (built_time, names)
+        return names, True
+
+    def _index_name(self, list_key, name, id):
+        # keep a built index in sync with this client's own changes
+        with self._name_index_lock:
+            if list_key in self._name_indexes and name is not None and id is not None:
+                self._name_indexes[list_key][1].setdefault(name, id)
+
+    def _rename_index(self, list_key, id, name):
+        with self._name_index_lock:
+            if list_key in self._name_indexes:
+                names = self._name_indexes[list_key][1]
+                for old_name in [k for k, v in names.items() if v == id]:
+                    del names[old_name]
+                names.setdefault(name, id)
+
+    def _unindex_id(self, list_key, id):
+        with self._name_index_lock:
+            if list_key in self._name_indexes:
+                names = self._name_indexes[list_key][1]
+                for old_name in [k for k, v in names.items() if v == id]:
+                    del names[old_name]
+
+    def invalidate_name_cache(self, list_key = None):
+        """
+        Drop the name -> id index of a resource
+        ('databases', 'sql-workloads', 'patch-sqls', 'assessments'), or all of them.
+        """
+        with self._name_index_lock:
+            if list_key is None:
+                self._name_indexes.clear()
+            else:
+                self._name_indexes.pop(list_key, None)
     
     def _set_optional_parameter(self, body, key, val):
         if val is not None:
             body[key] = val
     
-    def _wait_until_ready(self, key, id, progress_comment, progress_key):
-        time.sleep(WAIT_SECONDS)
-        # wait until statusEx becomes 0(ready)
-        while True:
-            response = self._call_api('GET', key + '/' + id)
-            if response['statusEx'] == 0:
-                # finished
-                self._logger.info('  ' + progress_comment + ':' + str(response['jobs'][0][progress_key]))
-                break
-
-            if 'jobs' in response and len(response['jobs']) > 0:
-                if progress_key in response['jobs'][0] and response['jobs'][0][progress_key] is not None:
-                    self._logger.info('  current ' + progress_comment + ':' + str(response['jobs'][0][progress_key]))
-                else:
-                    self._logger.warning('  not started ...')
+    def _wait_until_ready(self, key, id, timeout = None, progress_callback = None):
+        return self.wait_jobs(key, [id], timeout, progress_callback)[id]
+
+    def _poll_jobs(self, key, ids):
+        # one GET for a single job, one batched list poll for several jobs;
+        # { id: response }, None for a job that does not exist (deleted or wrong id).
+        # Other errors raise, also with raise_errors=False: a failed poll is not a missing job
+        if len(ids) == 1:
+            try:
+                return { ids[0]: self._call_api('GET', key + '/' + ids[0], raise_errors=True) }
+            except InsightNotFoundError:
+                return { ids[0]: None }
+
+        remaining = set(ids)
+        responses = {}
+        listed = 0
+        elements = self._iter_elements(self._list_page_fetcher(key, raise_errors=True))
+        for element in elements:
+            listed += 1
+            if element['id'] in remaining:
+                responses[element['id']] = element
+                remaining.discard(element['id'])
+                if len(remaining) == 0:
+                    elements.close()
+                    break
+        if listed < MAX_ELEMENTS:
+            # the whole list was read
+            for id in remaining:
+                responses[id] = None
+        return responses
+
+    def _job_not_found(self, key, id):
+        return InsightNotFoundError('Job not found: ' + key + ' ' + id, 'GET', key + '/' + id, 404)
+
+    def _log_job_progress(self, key, id, response, multiple):
+        progress_comment, progress_key = JOB_PROGRESS[key]
+        prefix = '  ' + (id + ' ' if multiple else '')
+        progress = get_job_progress(response, progress_key)
+        if response['statusEx'] == 0:
+            # finished
+            self._logger.info(prefix + progress_comment + ':' + str(progress))
+        elif 'jobs' in response and len(response['jobs']) > 0:
+            if progress is not None:
+                self._logger.info(prefix + 'current ' + progress_comment + ':' + str(progress))
             else:
-                self._logger.info('  preparing ...')
-            time.sleep(WAIT_SECONDS)
-        return response
-    
-    def _download_file(self, url, file_name):
-        CHUNK_SIZE = 1024
-        response = requests.get(url, stream=True, cookies=self._cookies)
-        if response.status_code == 200:
-            with open(file_name, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
-                    file.write(chunk)
+                self._logger.warning(prefix + 'not started ...')
         else:
+            self._logger.info(prefix + 'preparing ...')
+
+    def wait_jobs(self, key, ids, timeout = None, progress_callback = None):
+        """
+        Wait until jobs become ready (statusEx is 0).
+
+        Parameters
+        ----------
+        key : 'sql-workloads', 'patch-sqls' or 'assessments'
+        ids : ids of the resource to wait for
+            several ids are polled together with one list request per poll
+        timeout : overall deadline in seconds (None: wait forever)
+        progress_callback : called as progress_callback(key, id, response)
+            for every job on every poll
+
+        Returns
+        -------
+        { id: response } of the finished jobs.
+        TimeoutError is raised if some jobs are not finished by the deadline,
+        InsightNotFoundError if a job does not exist (deleted or wrong id).
+        """
+        pending = list(dict.fromkeys(ids))
+        finished = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        intervals = wait_intervals()
+        while len(pending) > 0:
+            interval = next(intervals)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('Jobs not ready in ' + str(timeout) + ' seconds: ' + key + ' ' + ', '.join(pending))
+                interval = min(interval, remaining)
+            time.sleep(interval)
+
+            try:
+                responses = self._poll_jobs(key, pending)
+            except TRANSIENT_ERRORS as e:
+                # the jobs keep running on the manager: poll again later
+                self._logger.warning('  polling ' + key + ' failed: ' + str(e))
+                continue
+            for id in pending:
+                if id not in responses:
+                    continue
+                response = responses[id]
+                if response is None:
+                    raise self._job_not_found(key, id)
+                self._log_job_progress(key, id, response, len(pending) > 1)
+                if progress_callback is not None:
+                    progress_callback(key, id, response)
+                if response['statusEx'] == 0:
+                    finished[id] = response
+            pending = [id for id in pending if id not in finished]
+        return finished
+
+    def _wait_or_submit(self, key, id, wait):
+        if wait:
+            return self._wait_until_ready(key, id)
+        return self._submit_job(key, id)
+
+    def _submit_job(self, key, id):
+        job = InsightJob(key, id)
+        with self._jobs_lock:
+            self._jobs.append(job)
+            if self._job_poller is None:
+                self._job_poller = threading.Thread(target=self._poll_submitted_jobs, name='insight-jobs', daemon=True)
+                self._job_poller.start()
+        self._jobs_submitted.set()
+        return job
+
+    def _poll_submitted_jobs(self):
+        # one poller thread per client; jobs of one resource are polled together
+        intervals = wait_intervals()
+        while True:
+            if self._jobs_submitted.wait(next(intervals)):
+                # a new job: poll soon again
+                self._jobs_submitted.clear()
+                intervals = wait_intervals()
+            with self._jobs_lock:
+                self._jobs = [job for job in self._jobs if not job.done()]
+                if len(self._jobs) == 0 or self._http is None:
+                    self._job_poller = None
+                    return
+                jobs = list(self._jobs)
+
+            for key in JOB_PROGRESS:
+                key_jobs = [job for job in jobs if job.key == key]
+                if len(key_jobs) == 0:
+                    continue
+                if self._http is None:
+                    # closed meanwhile: _stop_job_poller failed the jobs
+                    return
+                try:
+                    responses = self._poll_jobs(key, [job.id for job in key_jobs])
+                except Exception as e:
+                    if self._http is not None:
+                        self._logger.warning('  polling ' + key + ' failed: ' + str(e))
+                    continue
+                for job in key_jobs:
+                    if job.id not in responses:
+                        continue
+                    if responses[job.id] is None:
+                        try:
+                            job.set_exception(self._job_not_found(key, job.id))
+                        except InvalidStateError:
+                            pass
+                        continue
+                    self._log_job_progress(key, job.id, responses[job.id], True)
+                    job._update(responses[job.id])
+
+    def _stop_job_poller(self):
+        jobs_lock = getattr(self, '_jobs_lock', None)
+        if jobs_lock is None:
+            return
+        with jobs_lock:
+            jobs = self._jobs
+            self._jobs = []
+        for job in jobs:
+            if not job.done():
+                try:
+                    job.set_exception(RuntimeError('The client session was closed before the job finished: ' + job.key + ' ' + job.id))
+                except InvalidStateError:
+                    pass
+        self._jobs_submitted.set()
+
+    def wait_sql_workloads(self, sql_workload_ids, timeout = None, progress_callback = None):
+        return self.wait_jobs('sql-workloads', sql_workload_ids, timeout, progress_callback)
+
+    def wait_patch_sqls(self, patch_sql_ids, timeout = None, progress_callback = None):
+        return self.wait_jobs('patch-sqls', patch_sql_ids, timeout, progress_callback)
+
+    def wait_assessments(self, assessment_ids, timeout = None, progress_callback = None):
+        return self.wait_jobs('assessments', assessment_ids, timeout, progress_callback)
+    
+    def _upload_file(self, api, body, source_file_path, compress, progress_callback, retries = UPLOAD_RETRIES):
+        upload = MultipartFileUpload(body, 'source', source_file_path, compress=compress, progress_callback=progress_callback)
+        for attempt in range(retries + 1):
+            try:
+                return self._call_api('POST_STREAM', api, upload, retries=attempt, idempotent=False)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # after a read timeout or a cut-off response the server may
+                # have created the resource: send it again only with retry_post
+                if attempt == retries or not (self._retry_post or connect_failed(e)):
+                    raise
+                self._logger.warning('Upload failed (' + str(e) + '), retrying: ' + source_file_path)
+
+    def _part_validator(self, part_file_name, url):
+        # If-Range value for resuming part_file_name from url (None: start over)
+        try:
+            with open(part_file_name + '.json', encoding='utf-8') as file:
+                state = json.load(file)
+        except (FileNotFoundError, ValueError):
             return None
+        if state.get('url') != url:
+            return None
+        etag = state.get('etag')
+        if etag is not None and not etag.startswith('W/'):
+            return etag
+        return state.get('lastModified')
+
+    def _remove_part(self, part_file_name):
+        for name in (part_file_name, part_file_name + '.json'):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def _download_file(self, url, file_name, retries = DOWNLOAD_RETRIES):
+        # write to <file_name>.part, resume it with HTTP Range after a cut-off
+        # transfer, and rename it to file_name only when it is complete.
+        # <file_name>.part.json keeps the url and the ETag/Last-Modified of the
+        # part: a part of another url (e.g. other csv_type) or without a
+        # validator is not resumed, and If-Range makes the server send the
+        # whole file again when it has changed.
+        part_file_name = file_name + '.part'
+        api = url[len(self._url_base):]
+        for attempt in range(retries + 1):
+            offset = os.path.getsize(part_file_name) if os.path.exists(part_file_name) else 0
+            validator = self._part_validator(part_file_name, url) if offset > 0 else None
+            if offset > 0 and validator is None:
+                self._logger.warning('Download: ' + part_file_name + ' cannot be resumed safely, starting over')
+                self._remove_part(part_file_name)
+                offset = 0
+            started = time.perf_counter()
+            response = None
+            emitted = False
+            # identity: Range offsets and Content-Length must count file bytes
+            headers = { 'Accept-Encoding': 'identity' }
+            if offset > 0:
+                headers['Range'] = 'bytes=' + str(offset) + '-'
+                headers['If-Range'] = validator
+            try:
+                with self._http.get(url, headers=headers, stream=True, cookies=self._cookies, timeout=self._timeout) as response:
+                    if response.status_code == 416 and offset > 0:
+                        # the part file does not match the server file any more
+                        self._remove_part(part_file_name)
+                        continue
+                    if response.status_code == 206:
+                        content_range = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+                        if content_range is None or int(content_range.group(1)) != offset:
+                            self._logger.warning('Download: unexpected Content-Range ' + str(response.headers.get('Content-Range')) + ', starting over: ' + file_name)
+                            self._remove_part(part_file_name)
+                            continue
+                        mode = 'ab'
+                    elif response.status_code == 200:
+                        offset = 0
+                        mode = 'wb'
+                        with open(part_file_name + '.json', 'w', encoding='utf-8') as file:
+                            json.dump({ 'url': url, 'etag': response.headers.get('ETag'), 'lastModified': response.headers.get('Last-Modified') }, file)
+                    elif response.status_code in RETRY_STATUSES and attempt < retries:
+                        self._emit_request('GET', api, started, response, retries=attempt)
+                        delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+                        self._logger.warning('Download: status=' + str(response.status_code) + ', retrying in ' + format(delay, '.1f') + 's: ' + file_name)
+                        time.sleep(delay)
+                        continue
+                    else:
+                        self._logger.error('status=' + str(response.status_code))
+                        self._logger.error('text=' + response.text)
+                        self._emit_request('GET', api, started, response, retries=attempt)
+                        if self._raise_errors:
+                            raise api_error('GET', api, response.status_code, response.text)
+                        return None
+
+                    content_length = response.headers.get('Content-Length')
+                    with open(part_file_name, mode) as file:
+                        for chunk in response.iter_content(chunk_size=self._download_chunk_size):
+                            file.write(chunk)
+                self._emit_request('GET', api, started, response, bytes_received=os.path.getsize(part_file_name) - offset, retries=attempt)
+                emitted = True
+                if content_length is not None and os.path.getsize(part_file_name) != offset + int(content_length):
+                    raise requests.exceptions.ChunkedEncodingError('Download cut off: ' + str(os.path.getsize(part_file_name)) + '/' + str(offset + int(content_length)) + ' bytes')
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if not emitted:
+                    received = os.path.getsize(part_file_name) - offset if response is not None and os.path.exists(part_file_name) else 0
+                    self._emit_request('GET', api, started, response, bytes_received=received, retries=attempt, error=e)
+                if attempt == retries:
+                    self._logger.error('Download failed, ' + part_file_name + ' is kept to resume: ' + str(e))
+                    raise
+                self._logger.warning('Download interrupted (' + str(e) + '), resuming: ' + file_name)
+                continue
+
+            os.replace(part_file_name, file_name)
+            if os.path.exists(part_file_name + '.json'):
+                os.remove(part_file_name + '.json')
+            return file_name
 
-        return file_name
+        return None
 
     # for Version information
 
@@ -237,7 +1221,10 @@ class InsightSQLTesting():
         self._logger.info('Create a database: ' + database_name)
         body = { 'name': database_name, 'dbType': db_type, 'dbVersion': db_version, 'connectionString': connection_string }
         self._set_optional_parameter(body, 'memo', memo)
-        return self._call_api('POST', 'databases', body)
+        response = self._call_api('POST', 'databases', body)
+        if response is not None:
+            self._index_name('databases', database_name, response.get('id'))
+        return response
 
     def get_database(self, database_id):
         self._logger.info('Get the database: ' + database_id)
@@ -254,11 +1241,17 @@ class InsightSQLTesting():
         if len(body) == 0:
             # do nothing
             return
-        return self._call_api('PATCH', 'databases/' + database_id, body)
+        response = self._call_api('PATCH', 'databases/' + database_id, body)
+        if response is not None and database_name is not None:
+            self._rename_index('databases', database_id, database_name)
+        return response
 
     def delete_database(self, database_id):
         self._logger.info('Delete the database: ' + database_id)
-        return self._call_api('DELETE', 'databases/' + database_id)
+        response = self._call_api('DELETE', 'databases/' + database_id)
+        if response is not None:
+            self._unindex_id('databases', database_id)
+        return response
 
     def test_connect_database(self, database_user, database_password, db_type, connection_string):
         self._logger.info('Test connect to the database: ' + database_user + ', ' + connection_string)
@@ -268,7 +1261,7 @@ class InsightSQLTesting():
     def try_parse_sql(self, database_user, database_password, db_type, connection_string, sql_text, convert_parameter = False, query_timeout_millisec = None):
         self._logger.info('Try parse a SQL: ' + database_user + ', ' + connection_string + ', ' + sql_text)
         body = { 'user': database_user, 'pass': database_password, 'dbType': db_type, 'connectionString': connection_string, 'sqlText': sql_text, 'convertParameter': convert_parameter, 'queryTimeoutMillisec': query_timeout_millisec }
-        return self._call_api('POST', 'databases/parse', body)
+        return self._call_api('POST', 'databases/parse', body, idempotent=True)
 
     def try_execute_sql(self, database_user, database_password, db_type, connection_string, sql_text, persist = False, convert_parameter = False, bind = [], query_timeout_millisec = None):
         self._logger.info('Try execute a SQL: ' + database_user + ', ' + connection_string + ', ' + sql_text)
@@ -277,8 +1270,89 @@ class InsightSQLTesting():
 
     def get_query_plan(self, database_user, database_password, db_type, connection_string, sql_text, convert_parameter = False, bind = []):
         self._logger.info('Get a SQL query plan: ' + database_user + ', ' + connection_string + ', ' + sql_text)
+        cache = self.query_plan_cache
+        if cache is not None:
+            key = cache.key(db_type, connection_string, sql_text, bind, convert_parameter)
+            plan = cache.get(key)
+            if plan is not None:
+                return plan
         body = { 'user': database_user, 'pass': database_password, 'dbType': db_type, 'connectionString': connection_string, 'sqlText': sql_text, 'convertParameter': convert_parameter, 'bind': bind }
-        return self._call_api('POST', 'databases/query-plan', body)
+        plan = self._call_api('POST', 'databases/query-plan', body, idempotent=True)
+        if cache is not None and plan is not None:
+            cache.put(key, plan)
+        return plan
+
+    def _probe_sqls(self, probe, sqls, max_workers, stats):
+        # run probe(sql_text, bind) for each distinct statement, yielding results as they complete
+        if stats is None:
+            stats = SQLProbeStats()
+
+        def run(sql_text, bind):
+            started = time.perf_counter()
+            try:
+                response = probe(sql_text, bind)
+                error = None if response is not None else 'failed (see the log)'
+            except Exception as e:
+                response = None
+                error = repr(e)
+            return { 'sqlText': sql_text, 'bind': bind, 'response': response, 'error': error, 'elapsed': time.perf_counter() - started }
+
+        seen = set()
+        pending = set()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='insight-probe') as executor:
+            try:
+                for sql in sqls:
+                    sql_text, bind = (sql, []) if isinstance(sql, str) else (sql[0], list(sql[1]))
+                    fingerprint = hashlib.blake2b((sql_text + '\0' + json.dumps(bind, default=str)).encode('utf-8'), digest_size=8).digest()
+                    if fingerprint in seen:
+                        stats.duplicates += 1
+                        continue
+                    seen.add(fingerprint)
+                    pending.add(executor.submit(run, sql_text, bind))
+                    # bounded backlog: sqls may be a long generator
+                    if len(pending) >= max_workers * 2:
+                        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            stats.add(future.result())
+                            yield future.result()
+                for future in concurrent.futures.as_completed(pending):
+                    stats.add(future.result())
+                    yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_try_parse_sqls(self, database_user, database_password, db_type, connection_string, sql_texts,
+        convert_parameter = False, query_timeout_millisec = None, max_workers = PROBE_WORKERS, stats = None):
+        """
+        try_parse_sql for many SQL texts on max_workers threads.
+
+        Identical statements are probed once. A failed statement does not stop
+        the batch; results are yielded in completion order as dicts with
+        sqlText, bind, response (None on failure), error (None on success) and
+        elapsed (seconds). Pass a SQLProbeStats as stats to collect counters
+        and latencies.
+        """
+        return self._probe_sqls(lambda sql_text, bind: self.try_parse_sql(database_user, database_password, db_type, connection_string,
+            sql_text, convert_parameter, query_timeout_millisec), sql_texts, max_workers, stats)
+
+    def iter_try_execute_sqls(self, database_user, database_password, db_type, connection_string, sqls,
+        persist = False, convert_parameter = False, query_timeout_millisec = None, max_workers = PROBE_WORKERS, stats = None):
+        """
+        try_execute_sql for many statements (SQL texts or (SQL text, bind) tuples).
+        See iter_try_parse_sqls.
+        """
+        return self._probe_sqls(lambda sql_text, bind: self.try_execute_sql(database_user, database_password, db_type, connection_string,
+            sql_text, persist, convert_parameter, bind, query_timeout_millisec), sqls, max_workers, stats)
+
+    def iter_query_plans(self, database_user, database_password, db_type, connection_string, sqls,
+        convert_parameter = False, max_workers = PROBE_WORKERS, stats = None):
+        """
+        get_query_plan for many statements (SQL texts or (SQL text, bind) tuples).
+        See iter_try_parse_sqls.
+        """
+        return self._probe_sqls(lambda sql_text, bind: self.get_query_plan(database_user, database_password, db_type, connection_string,
+            sql_text, convert_parameter, bind), sqls, max_workers, stats)
 
     # for SQL workload operation
 
@@ -310,7 +1384,7 @@ class InsightSQLTesting():
             else:
                 print('    no jobs element.')
 
-    def create_sql_workload(self, sql_workload_name, db_type, source_file_name, is_unique = False, memo = None):
+    def create_sql_workload(self, sql_workload_name, db_type, source_file_name, is_unique = False, memo = None, wait = True):
         self._logger.info('Create a SQL-workload: ' + sql_workload_name)
         body = { 'name': sql_workload_name, 'dbType': db_type, 'dataKind': 'MS', 'source': source_file_name, 'unique': ('true' if is_unique else 'false') }
         self._set_optional_parameter(body, 'memo', memo)
@@ -319,20 +1393,27 @@ class InsightSQLTesting():
             return None
 
         sql_workload_id = response['id']
-        return self._wait_until_ready('sql-workloads', sql_workload_id, 'processed sqls', 'count')
+        self._index_name('sql-workloads', sql_workload_name, sql_workload_id)
+        return self._wait_or_submit('sql-workloads', sql_workload_id, wait)
 
-    def create_sql_workload_upload(self, sql_workload_name, db_type, source_file_path, is_unique = False, memo = None):
+    def create_sql_workload_upload(self, sql_workload_name, db_type, source_file_path, is_unique = False, memo = None, wait = True,
+        compress = False, progress_callback = None):
+        """
+        Create a SQL-workload from a local capture file.
+        The file is streamed in UPLOAD_CHUNK_SIZE chunks; compress=True gzips it
+        on the fly (the server must accept gzip uploads).
+        progress_callback(bytes_sent, bytes_read, file_size) is called per chunk.
+        """
         self._logger.info('Create a SQL-workload(upload): ' + sql_workload_name)
-        file_content = open(source_file_path, 'rb')
-        files = {'source': ('upload_file', file_content, 'text/csv')}
         body = { 'name': sql_workload_name, 'dbType': db_type, 'dataKind': 'MS', 'unique': ('true' if is_unique else 'false') }
         self._set_optional_parameter(body, 'memo', memo)
-        response = self._call_api('POST_UPLOAD', 'sql-workloads/upload', body, files)
+        response = self._upload_file('sql-workloads/upload', body, source_file_path, compress, progress_callback)
         if response is None:
             return None
 
         sql_workload_id = response['id']
-        return self._wait_until_ready('sql-workloads', sql_workload_id, 'processed sqls', 'count')
+        self._index_name('sql-workloads', sql_workload_name, sql_workload_id)
+        return self._wait_or_submit('sql-workloads', sql_workload_id, wait)
     
     def get_sql_workload(self, sql_workload_id):
         self._logger.info('Get tje SQL-workload: ' + sql_workload_id)
@@ -350,11 +1431,17 @@ class InsightSQLTesting():
         if len(body) == 0:
             # do nothing
             return
-        return self._call_api('PATCH', 'sql-workloads/' + sql_workload_id, body)
+        response = self._call_api('PATCH', 'sql-workloads/' + sql_workload_id, body)
+        if response is not None and sql_workload_name is not None:
+            self._rename_index('sql-workloads', sql_workload_id, sql_workload_name)
+        return response
 
     def delete_sql_workload(self, sql_workload_id):
         self._logger.info('Delete the SQL-workload: ' + sql_workload_id)
-        return self._call_api('DELETE', 'sql-workloads/' + sql_workload_id)
+        response = self._call_api('DELETE', 'sql-workloads/' + sql_workload_id)
+        if response is not None:
+            self._unindex_id('sql-workloads', sql_workload_id)
+        return response
 
     # Deprecated
     def get_sql_workload_summary(self, sql_workload_id):
@@ -370,16 +1457,32 @@ class InsightSQLTesting():
         self._logger.info('Get SQL-workload all SQLs (This operation may take long time to be processed.): ' + sql_workload_id)
         return self._list_elements('sql-workloads/' + sql_workload_id + '/rows')
 
+    def iter_sql_workload_sqls(self, sql_workload_id, offset = 0, query_parameters = None, pages = False):
+        """
+        Iterate SQL-workload SQLs from offset without loading the whole list.
+        Yields rows (or lists of rows if pages is True). Stopping the iteration
+        early stops fetching; pass the number of rows already consumed as
+        offset to resume.
+        """
+        self._logger.info('Iterate SQL-workload SQLs: ' + sql_workload_id + ' (offset=' + str(offset) + ')')
+        return self._iter_elements(self._list_page_fetcher('sql-workloads/' + sql_workload_id + '/rows', query_parameters), offset, pages)
+
     def copy_sql_workload(self, sql_workload_id, name):
         self._logger.info('Copy the SQL-workload: ' + sql_workload_id + ' (name=' + name + ')')
         body = { 'name': name }
-        return self._call_api('POST', 'sql-workloads/' + sql_workload_id + '/copy', body)
+        response = self._call_api('POST', 'sql-workloads/' + sql_workload_id + '/copy', body)
+        if response is not None:
+            self._index_name('sql-workloads', name, response.get('id'))
+        return response
 
     def update_sql_workload_db_user(self, sql_workload_id, old_users, new_users):
         self._logger.info('Update the SQL-workload DB users: ' + sql_workload_id)
         body = { 'oldusers': old_users, 'newusers': new_users }
         return self._call_api('PUT', 'sql-workloads/' + sql_workload_id + '/modify', body)
 
+    def wait_sql_workload(self, sql_workload_id, timeout = None, progress_callback = None):
+        return self._wait_until_ready('sql-workloads', sql_workload_id, timeout, progress_callback)
+
     def update_sql_workload_sqls(self, sql_workload_id):
         self._logger.info('Update the SQL-workload SQLs from SCT file: ' + sql_workload_id)
         self._logger.warn('Not supported yet.')
@@ -391,7 +1494,7 @@ class InsightSQLTesting():
     def list_patch_sqls(self):
         return self._list_elements('patch-sqls')
 
-    def create_patch_sql_from_assessment(self, patch_sql_name, assessment_id, memo = None):
+    def create_patch_sql_from_assessment(self, patch_sql_name, assessment_id, memo = None, wait = True):
         self._logger.info('Create a patch sql (from assessment): ' + patch_sql_name)
         body = { 'name': patch_sql_name, 'assessmentId': assessment_id }
         self._set_optional_parameter(body, 'memo', memo)
@@ -400,22 +1503,26 @@ class InsightSQLTesting():
             return None
 
         patch_sql_id = response['id']
-        return self._wait_until_ready('patch-sqls', patch_sql_id, 'processed(%)', 'percent')
+        self._index_name('patch-sqls', patch_sql_name, patch_sql_id)
+        return self._wait_or_submit('patch-sqls', patch_sql_id, wait)
 
-    def create_patch_sql_upload(self, patch_sql_name, source_file_path, memo = None):
+    def create_patch_sql_upload(self, patch_sql_name, source_file_path, memo = None, wait = True,
+        compress = False, progress_callback = None):
+        """
+        Create a patch sql from a local SCT file. See create_sql_workload_upload.
+        """
         self._logger.info('Create a patch sql (upload): ' + patch_sql_name)
-        file_content = open(source_file_path, 'rb')
-        files = {'source': ('upload_file', file_content, 'text/csv')}
         body = { 'name': patch_sql_name }
         self._set_optional_parameter(body, 'memo', memo)
-        response = self._call_api('POST_UPLOAD', 'patch-sqls/from-sct', body, files)
+        response = self._upload_file('patch-sqls/from-sct', body, source_file_path, compress, progress_callback)
         if response is None:
             return None
 
         patch_sql_id = response['id']
-        return self._wait_until_ready('patch-sqls', patch_sql_id, 'processed(%)', 'percent')
+        self._index_name('patch-sqls', patch_sql_name, patch_sql_id)
+        return self._wait_or_submit('patch-sqls', patch_sql_id, wait)
 
-    def merge_patch_sqls(self, patch_sql_name, patch_sqls, memo = None):
+    def merge_patch_sqls(self, patch_sql_name, patch_sqls, memo = None, wait = True):
         self._logger.info('Create a patch sql (from patch sqls): ' + patch_sql_name)
         body = { 'name': patch_sql_name, 'patchSqlIds': patch_sqls }
         self._set_optional_parameter(body, 'memo', memo)
@@ -424,7 +1531,8 @@ class InsightSQLTesting():
             return None
 
         patch_sql_id = response['id']
-        return self._wait_until_ready('patch-sqls', patch_sql_id, 'processed(%)', 'percent')
+        self._index_name('patch-sqls', patch_sql_name, patch_sql_id)
+        return self._wait_or_submit('patch-sqls', patch_sql_id, wait)
 
     def get_patch_sql(self, patch_sql_id):
         self._logger.info('Get the patch sql: ' + patch_sql_id)
@@ -441,11 +1549,20 @@ class InsightSQLTesting():
         if len(body) == 0:
             # do nothing
             return
-        return self._call_api('PATCH', 'patch-sqls/' + patch_sql_id, body)
+        response = self._call_api('PATCH', 'patch-sqls/' + patch_sql_id, body)
+        if response is not None and patch_sql_name is not None:
+            self._rename_index('patch-sqls', patch_sql_id, patch_sql_name)
+        return response
 
     def delete_patch_sql(self, patch_sql_id):
         self._logger.info('Delete the patch sql: ' + patch_sql_id)
-        return self._call_api('DELETE', 'patch-sqls/' + patch_sql_id)
+        response = self._call_api('DELETE', 'patch-sqls/' + patch_sql_id)
+        if response is not None:
+            self._unindex_id('patch-sqls', patch_sql_id)
+        return response
+
+    def wait_patch_sql(self, patch_sql_id, timeout = None, progress_callback = None):
+        return self._wait_until_ready('patch-sqls', patch_sql_id, timeout, progress_callback)
 
     def get_patch_sql_sqls(self, patch_sql_id, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
         self._logger.info('Get patch sql SQLs: ' + patch_sql_id + ' (limit=' + str(limit) + ', offset=' + str(offset) + ')')
@@ -455,6 +1572,13 @@ class InsightSQLTesting():
         self._logger.info('Get patch sql SQLs (This operation may take long time to be processed.): ' + patch_sql_id)
         return self._list_elements('patch-sqls/' + patch_sql_id + '/hash-rule/rows')
 
+    def iter_patch_sql_sqls(self, patch_sql_id, offset = 0, query_parameters = None, pages = False):
+        """
+        Iterate patch sql SQLs from offset. See iter_sql_workload_sqls.
+        """
+        self._logger.info('Iterate patch sql SQLs: ' + patch_sql_id + ' (offset=' + str(offset) + ')')
+        return self._iter_elements(self._list_page_fetcher('patch-sqls/' + patch_sql_id + '/hash-rule/rows', query_parameters), offset, pages)
+
     # for Assessment operation
 
     def list_assessments(self):
@@ -467,14 +1591,16 @@ class InsightSQLTesting():
             print('Assessment: ' + assessment['name'] + ' (' + assessment['id'] + ')')
             if 'jobs' in assessment:
                 if len(assessment['jobs']) > 0:
-                    if 'startTime' in assessment['jobs'][0]:
-                        print('    start:  ' + str(datetime.datetime.strptime(assessment['jobs'][0]['startTime'], '%Y-%m-%dT%H:%M:%S.%fZ')))
+                    start_time = parse_job_time(assessment['jobs'][0], 'startTime')
+                    end_time = parse_job_time(assessment['jobs'][0], 'endTime')
+                    if start_time is not None:
+                        print('    start:  ' + str(start_time))
                     else:
                         print('    start:  no start date info.')
-                    if 'endTime' in assessment['jobs'][0] and assessment['jobs'][0]['endTime'] is not None:
-                        print('    finish: ' + str(datetime.datetime.strptime(assessment['jobs'][0]['endTime'], '%Y-%m-%dT%H:%M:%S.%fZ')))
-                        if 'startTime' in assessment['jobs'][0]:
-                            print('    elapsed time:  ' + str(datetime.datetime.strptime(assessment['jobs'][0]['endTime'], '%Y-%m-%dT%H:%M:%S.%fZ') - datetime.datetime.strptime(assessment['jobs'][0]['startTime'], '%Y-%m-%dT%H:%M:%S.%fZ')))
+                    if end_time is not None:
+                        print('    finish: ' + str(end_time))
+                        if start_time is not None:
+                            print('    elapsed time:  ' + str(end_time - start_time))
                         else:
                             print('    elapsed time: cannot calculate')
 
@@ -517,7 +1643,7 @@ class InsightSQLTesting():
         trim_char = False, epsilon = None,
         fetch_size = None, fetch_limit = None,
         hook = None, cmp_hook = None, ses_hook = None, cmp_ses_hook = None,
-        cmp_pswds = None):
+        cmp_pswds = None, wait = True):
         self._logger.info('Execute an assessment: ' + assessment_name)
         body = {
             'name': assessment_name,
@@ -545,7 +1671,8 @@ class InsightSQLTesting():
             return None
 
         assessment_id = response['id']
-        return self._wait_until_ready('assessments', assessment_id, 'processed sessions', 'count')
+        self._index_name('assessments', assessment_name, assessment_id)
+        return self._wait_or_submit('assessments', assessment_id, wait)
 
     def get_assessment(self, assessment_id):
         self._logger.info('Get the assessment: ' + assessment_id)
@@ -562,11 +1689,20 @@ class InsightSQLTesting():
         if len(body) == 0:
             # do nothing
             return
-        return self._call_api('PATCH', 'assessments/' + assessment_id, body)
+        response = self._call_api('PATCH', 'assessments/' + assessment_id, body)
+        if response is not None and assessment_name is not None:
+            self._rename_index('assessments', assessment_id, assessment_name)
+        return response
 
     def delete_assessment(self, assessment_id):
         self._logger.info('Delete the assessment: ' + assessment_id)
-        return self._call_api('DELETE', 'assessments/' + assessment_id)
+        response = self._call_api('DELETE', 'assessments/' + assessment_id)
+        if response is not None:
+            self._unindex_id('assessments', assessment_id)
+        return response
+
+    def wait_assessment(self, assessment_id, timeout = None, progress_callback = None):
+        return self._wait_until_ready('assessments', assessment_id, timeout, progress_callback)
 
     def get_assessment_sqls(self, assessment_id, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
         self._logger.info('Get assessment SQLs: ' + assessment_id + ' (limit=' + str(limit) + ', offset=' + str(offset) + ')')
@@ -576,6 +1712,13 @@ class InsightSQLTesting():
         self._logger.info('Get assessment SQLs (This operation may take long time to be processed.): ' + assessment_id)
         return self._list_elements('assessments/' + assessment_id + '/results', query_parameters)
 
+    def iter_assessment_sqls(self, assessment_id, offset = 0, query_parameters = None, pages = False):
+        """
+        Iterate assessment SQLs (results) from offset. See iter_sql_workload_sqls.
+        """
+        self._logger.info('Iterate assessment SQLs: ' + assessment_id + ' (offset=' + str(offset) + ')')
+        return self._iter_elements(self._list_page_fetcher('assessments/' + assessment_id + '/results', query_parameters), offset, pages)
+
     def get_assessment_sql(self, assessment_id, assessment_row_id):
         self._logger.info('Get assessment SQL: ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
         return self._call_api('GET', 'assessments/' + assessment_id + '/results/' + str(assessment_row_id))
@@ -586,30 +1729,20 @@ class InsightSQLTesting():
 
     def get_assessment_sql_query_rows_all(self, assessment_id, assessment_row_id):
         self._logger.info('Get assessment SQL query rows (This operation may take long time to be processed.): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
-        elements = []
-        for offset in range(0, MAX_ELEMENTS, 100):
-            elemens_part = self.get_assessment_sql_query_rows(assessment_id, assessment_row_id, offset)
-            if elemens_part is None:
-                break
-            if len(elemens_part) == 0:
-                break
+        return self._query_rows_elements(self.get_assessment_sql_query_rows, assessment_id, assessment_row_id)
 
-            elements.extend(elemens_part)
-        return elements
+    def iter_assessment_sql_query_rows(self, assessment_id, assessment_row_id, offset = 0, pages = False):
+        """
+        Iterate assessment SQL query rows from offset. See iter_sql_workload_sqls.
+        """
+        return self._iter_elements(self._query_rows_page_fetcher(self.get_assessment_sql_query_rows, assessment_id, assessment_row_id), offset, pages)
     
     def download_assessment_sql_query_rows(self, assessment_id, assessment_row_id):
-        CHUNK_SIZE = 1024
         response = self._call_api('GET', 'assessments/' + assessment_id)
         if response is None:
             return None
 
-        assessment_name = response['name']
-        file_name = assessment_name + '_' + str(assessment_row_id) + '_returns(tgt).csv'
-    
-        self._logger.info('Donwload the assessment SQL query rows(csv): ' + file_name)
-
-        url = self._url_base + 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/queryRows/download?format=csv'
-        return self._download_file(url, file_name)
+        return self._download_query_rows(assessment_id, response['name'], assessment_row_id, False)
 
     def get_assessment_sql_cmp_query_rows(self, assessment_id, assessment_row_id, offset = 0):
         self._logger.info('Get assessment SQL query rows(cmp): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
@@ -617,33 +1750,80 @@ class InsightSQLTesting():
 
     def get_assessment_sql_cmp_query_rows_all(self, assessment_id, assessment_row_id):
         self._logger.info('Get assessment SQL query rows(cmp) (This operation may take long time to be processed.): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
-        elements = []
-        for offset in range(0, MAX_ELEMENTS, 100):
-            elemens_part = self.get_assessment_sql_cmp_query_rows(assessment_id, assessment_row_id, offset)
-            if elemens_part is None:
-                break
-            if len(elemens_part) == 0:
-                break
+        return self._query_rows_elements(self.get_assessment_sql_cmp_query_rows, assessment_id, assessment_row_id)
 
-            elements.extend(elemens_part)
-        return elements
+    def iter_assessment_sql_cmp_query_rows(self, assessment_id, assessment_row_id, offset = 0, pages = False):
+        """
+        Iterate assessment SQL query rows(cmp) from offset. See iter_sql_workload_sqls.
+        """
+        return self._iter_elements(self._query_rows_page_fetcher(self.get_assessment_sql_cmp_query_rows, assessment_id, assessment_row_id), offset, pages)
 
     def download_assessment_sql_cmp_query_rows(self, assessment_id, assessment_row_id):
-        CHUNK_SIZE = 1024
         response = self._call_api('GET', 'assessments/' + assessment_id)
         if response is None:
             return None
 
-        assessment_name = response['name']
-        file_name = assessment_name + '_' + str(assessment_row_id) + '_returns(cmp).csv'
-    
-        self._logger.info('Donwload the assessment SQL query rows(cmp, csv): ' + file_name)
+        return self._download_query_rows(assessment_id, response['name'], assessment_row_id, True)
 
-        url = self._url_base + 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/cmpQueryRows/download?format=csv'
+    def _download_query_rows(self, assessment_id, assessment_name, assessment_row_id, cmp):
+        if cmp:
+            file_name = assessment_name + '_' + str(assessment_row_id) + '_returns(cmp).csv'
+            self._logger.info('Donwload the assessment SQL query rows(cmp, csv): ' + file_name)
+            url = self._url_base + 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/cmpQueryRows/download?format=csv'
+        else:
+            file_name = assessment_name + '_' + str(assessment_row_id) + '_returns(tgt).csv'
+            self._logger.info('Donwload the assessment SQL query rows(csv): ' + file_name)
+            url = self._url_base + 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/queryRows/download?format=csv'
         return self._download_file(url, file_name)
 
+    def download_assessment_sql_query_rows_many(self, assessment_id, assessment_row_ids, cmp = None, max_workers = DOWNLOAD_WORKERS):
+        """
+        Download tgt (and cmp) query rows csv of many assessment rows in parallel.
+
+        Parameters
+        ----------
+        cmp : also download the cmp query rows (None: when the assessment has
+            a comparison database)
+
+        Returns
+        -------
+        { assessment_row_id: { tgt: file name, cmp: file name, error } }
+        A failed download leaves its file name None and is reported in error
+        (repr of the exceptions); the other rows are still downloaded.
+        """
+        response = self._call_api('GET', 'assessments/' + assessment_id)
+        if response is None:
+            return None
+
+        assessment_name = response['name']
+        if cmp is None:
+            cmp = response.get('cmpDatabaseId') is not None
+
+        def download(assessment_row_id, cmp_rows):
+            try:
+                return self._download_query_rows(assessment_id, assessment_name, assessment_row_id, cmp_rows), None
+            except Exception as e:
+                self._logger.warning('  ' + str(assessment_row_id) + (' cmp' if cmp_rows else ' tgt') + ' download failed: ' + repr(e))
+                return None, repr(e)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='insight-download') as executor:
+            futures = {}
+            for assessment_row_id in assessment_row_ids:
+                tgt = executor.submit(download, assessment_row_id, False)
+                cmp_file = executor.submit(download, assessment_row_id, True) if cmp else None
+                futures[assessment_row_id] = (tgt, cmp_file)
+
+            results = {}
+            for assessment_row_id, (tgt, cmp_file) in futures.items():
+                tgt_file_name, tgt_error = tgt.result()
+                cmp_file_name, cmp_error = (None, None) if cmp_file is None else cmp_file.result()
+                errors = [error for error in (tgt_error, cmp_error) if error is not None]
+                results[assessment_row_id] = { 'tgt': tgt_file_name, 'cmp': cmp_file_name, 'error': '; '.join(errors) if errors else None }
+        failed = sum(1 for result in results.values() if result['error'] is not None)
+        self._logger.info('  downloaded: ' + str(len(results) - failed) + ', failed: ' + str(failed))
+        return results
+
     def download_assessment_csv(self, assessment_id, csv_type = 'basic', result_code = '1,2,3,4,5'):
-        CHUNK_SIZE = 1024
         if result_code is None or result_code == '':
             self._logger.warning('result_code must not be empty.')
             return None
@@ -662,3 +1842,112 @@ class InsightSQLTesting():
 
         url = self._url_base + 'assessments/' + assessment_id + '/download/csv' + query_parameter
         return self._download_file(url, file_name)
+
+    # for bulk operation
+
+    def _run_bulk(self, items, operation, max_workers, dry_run, done_status):
+        # items: [(id, name, args)] -> per-item results in the same order
+        results = [{ 'id': id, 'name': name, 'status': 'dry-run' if dry_run else None, 'result': None, 'error': None } for id, name, _ in items]
+        if dry_run or len(items) == 0:
+            return results
+
+        def run(result, args):
+            try:
+                result['result'] = operation(*args)
+                result['status'] = done_status if result['result'] is not None else 'failed'
+                if result['id'] is None:
+                    if isinstance(result['result'], InsightJob):
+                        result['id'] = result['result'].id
+                    elif isinstance(result['result'], dict):
+                        result['id'] = result['result'].get('id')
+            except Exception as e:
+                result['status'] = 'failed'
+                result['error'] = repr(e)
+                self._logger.warning('  ' + str(result['name'] or result['id']) + ' failed: ' + repr(e))
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='insight-bulk') as executor:
+            for future in [executor.submit(run, result, args) for result, (_, _, args) in zip(results, items)]:
+                future.result()
+        failed = sum(1 for result in results if result['status'] == 'failed')
+        self._logger.info('  ' + done_status + ': ' + str(len(results) - failed) + ', failed: ' + str(failed))
+        return results
+
+    def select_elements(self, list_key, name_pattern = None, older_than = None, predicate = None):
+        """
+        Elements of a list ('databases', 'sql-workloads', 'patch-sqls' or 'assessments') matching all the given conditions.
+
+        Parameters
+        ----------
+        name_pattern : shell-style pattern of the name (e.g. 'nightly-*')
+        older_than : seconds (or datetime.timedelta) since jobs[0].endTime;
+            elements without a finished job never match
+        predicate : predicate(element) -> bool
+        """
+        if isinstance(older_than, datetime.timedelta):
+            older_than = older_than.total_seconds()
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        selected = []
+        for element in self._iter_elements(self._list_page_fetcher(list_key)):
+            if name_pattern is not None and not fnmatch.fnmatchcase(element.get('name') or '', name_pattern):
+                continue
+            if older_than is not None:
+                jobs = element.get('jobs') or []
+                end_time = parse_job_time(jobs[0], 'endTime') if len(jobs) > 0 else None
+                if end_time is None or (now - end_time).total_seconds() < older_than:
+                    continue
+            if predicate is not None and not predicate(element):
+                continue
+            selected.append(element)
+        return selected
+
+    def _delete_where(self, list_key, delete, name_pattern, older_than, predicate, dry_run, max_workers):
+        if name_pattern is None and older_than is None and predicate is None:
+            raise ValueError('Specify name_pattern, older_than or predicate to delete ' + list_key + '.')
+        elements = self.select_elements(list_key, name_pattern, older_than, predicate)
+        self._logger.info('Delete ' + list_key + (' (dry run)' if dry_run else '') + ': ' + str(len(elements)))
+        return self._run_bulk([(e['id'], e.get('name'), (e['id'],)) for e in elements], delete, max_workers, dry_run, 'deleted')
+
+    def delete_databases_where(self, name_pattern = None, older_than = None, predicate = None, dry_run = False, max_workers = BULK_WORKERS):
+        """
+        Delete the databases selected by select_elements on max_workers threads.
+
+        Returns
+        -------
+        [{ id, name, status ('deleted', 'failed' or 'dry-run'), result, error }]
+        """
+        return self._delete_where('databases', self.delete_database, name_pattern, older_than, predicate, dry_run, max_workers)
+
+    def delete_sql_workloads_where(self, name_pattern = None, older_than = None, predicate = None, dry_run = False, max_workers = BULK_WORKERS):
+        """See delete_databases_where."""
+        return self._delete_where('sql-workloads', self.delete_sql_workload, name_pattern, older_than, predicate, dry_run, max_workers)
+
+    def delete_patch_sqls_where(self, name_pattern = None, older_than = None, predicate = None, dry_run = False, max_workers = BULK_WORKERS):
+        """See delete_databases_where."""
+        return self._delete_where('patch-sqls', self.delete_patch_sql, name_pattern, older_than, predicate, dry_run, max_workers)
+
+    def delete_assessments_where(self, name_pattern = None, older_than = None, predicate = None, dry_run = False, max_workers = BULK_WORKERS):
+        """See delete_databases_where."""
+        return self._delete_where('assessments', self.delete_assessment, name_pattern, older_than, predicate, dry_run, max_workers)
+
+    def create_many(self, create, specs, dry_run = False, max_workers = BULK_WORKERS, name_key = None):
+        """
+        Call a create method once per spec on max_workers threads,
+        e.g. create_many(sql_testing.create_database, [{ 'database_name': ..., 'db_type': ..., ... }, ...]).
+
+        Parameters
+        ----------
+        create : create_database, create_user, create_sql_workload, execute_assessment, ...
+        specs : keyword arguments of each call
+            (for job resources, wait=False returns InsightJob handles at once)
+        name_key : spec key of the element name in the results
+            (None: CREATE_NAME_KEYS of the create method, else 'name')
+
+        Returns
+        -------
+        [{ id, name, status ('created', 'failed' or 'dry-run'), result, error }] in specs order
+        """
+        if name_key is None:
+            name_key = CREATE_NAME_KEYS.get(getattr(create, '__name__', None), 'name')
+        items = [(None, spec.get(name_key), (spec,)) for spec in specs]
+        self._logger.info('Create many' + (' (dry run)' if dry_run else '') + ': ' + str(len(items)))
+        return self._run_bulk(items, lambda spec: create(**spec), max_workers, dry_run, 'created')
@@ -0,0 +1,231 @@
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from insight_sql_testing import RESULT_CODES, RESULT_CODE_KEY, RESULT_SQL_HASH_KEY, RESULT_SQL_TEXT_KEY, RESULT_DB_USER_KEY, RESULT_ELAPSED_KEY, RESULT_CMP_ELAPSED_KEY
+
+PERCENTILES = (50, 95, 99)
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _percentiles(values, percentiles):
+    # linear interpolation between closest ranks (numpy's default), NaN ignored
+    if numpy is not None:
+        values = numpy.asarray(values, dtype=numpy.float64)
+        values = values[~numpy.isnan(values)]
+        if len(values) == 0:
+            return { p: math.nan for p in percentiles }
+        return dict(zip(percentiles, numpy.percentile(values, percentiles).tolist()))
+
+    values = sorted(v for v in values if not math.isnan(v))
+    if len(values) == 0:
+        return { p: math.nan for p in percentiles }
+    result = {}
+    for p in percentiles:
+        rank = (len(values) - 1) * p / 100.0
+        lower = int(math.floor(rank))
+        upper = min(lower + 1, len(values) - 1)
+        result[p] = values[lower] + (values[upper] - values[lower]) * (rank - lower)
+    return result
+
+class _Symbols():
+    # distinct strings -> small ints (one copy of each repeated value)
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def id(self, value):
+        symbol_id = self._ids.get(value)
+        if symbol_id is None:
+            symbol_id = len(self.values)
+            self._ids[value] = symbol_id
+            self.values.append(value)
+        return symbol_id
+
+class ResultColumns():
+    def __init__(self):
+        """
+        Assessment result rows held as typed columns.
+
+        codes, elapsed, cmp_elapsed, sql_hash_ids and db_user_ids are
+        array.array columns (one entry per row); sql_hashes and db_users hold
+        each distinct value once. With NumPy installed, the aggregates run on
+        zero-copy numpy views of the columns.
+        """
+        self.codes = array('b')
+        self.elapsed = array('d')
+        self.cmp_elapsed = array('d')
+        self.sql_hash_ids = array('l')
+        self.db_user_ids = array('l')
+        self._sql_hashes = _Symbols()
+        self._db_users = _Symbols()
+
+    @property
+    def sql_hashes(self):
+        return self._sql_hashes.values
+
+    @property
+    def db_users(self):
+        return self._db_users.values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, row):
+        sql_hash = row.get(RESULT_SQL_HASH_KEY) or row.get(RESULT_SQL_TEXT_KEY)
+        self.codes.append(int(row.get(RESULT_CODE_KEY, -1)))
+        self.elapsed.append(_float(row.get(RESULT_ELAPSED_KEY)))
+        self.cmp_elapsed.append(_float(row.get(RESULT_CMP_ELAPSED_KEY)))
+        self.sql_hash_ids.append(self._sql_hashes.id(sql_hash))
+        self.db_user_ids.append(self._db_users.id(row.get(RESULT_DB_USER_KEY)))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_rows(cls, rows):
+        columns = cls()
+        columns.extend(rows)
+        return columns
+
+    @classmethod
+    def load(cls, sql_testing, assessment_id, query_parameters = None):
+        """Stream the result rows of an assessment into columns."""
+        sql_testing._logger.info('Load assessment results into columns: ' + assessment_id)
+        columns = cls()
+        for page in sql_testing.iter_assessment_sqls(assessment_id, query_parameters=query_parameters, pages=True):
+            columns.extend(page)
+        return columns
+
+    def _np(self, column):
+        return numpy.frombuffer(column, dtype=numpy.dtype(column.typecode))
+
+    # aggregates
+
+    def result_code_counts(self):
+        # same layout as summary.allCode
+        if numpy is not None:
+            codes = self._np(self.codes)
+            return numpy.bincount(codes[codes >= 0], minlength=len(RESULT_CODES)).tolist()
+        counts = [0] * len(RESULT_CODES)
+        for code in self.codes:
+            if code >= 0:
+                if code >= len(counts):
+                    counts.extend([0] * (code + 1 - len(counts)))
+                counts[code] += 1
+        return counts
+
+    def latency_percentiles(self, percentiles = PERCENTILES):
+        return { 'tgt': _percentiles(self.elapsed, percentiles), 'cmp': _percentiles(self.cmp_elapsed, percentiles) }
+
+    def _group_rows(self, group_ids):
+        # { group id: row positions }
+        if numpy is not None:
+            ids = self._np(group_ids)
+            order = numpy.argsort(ids, kind='stable')
+            boundaries = numpy.flatnonzero(numpy.diff(ids[order])) + 1
+            return { int(ids[rows[0]]): rows for rows in numpy.split(order, boundaries) if len(rows) > 0 }
+        groups = {}
+        for position, group_id in enumerate(group_ids):
+            groups.setdefault(group_id, array('l')).append(position)
+        return groups
+
+    def _take(self, column, rows):
+        if numpy is not None:
+            return self._np(column)[rows]
+        return [column[i] for i in rows]
+
+    def latency_by_sql_hash(self, percentiles = PERCENTILES):
+        """
+        Per SQL hash: count, tgt/cmp elapsed percentiles and the ratio of the
+        tgt median to the cmp median.
+        """
+        result = {}
+        for sql_hash_id, rows in self._group_rows(self.sql_hash_ids).items():
+            with_median = tuple(sorted(set(percentiles) | {50}))
+            tgt = _percentiles(self._take(self.elapsed, rows), with_median)
+            cmp = _percentiles(self._take(self.cmp_elapsed, rows), with_median)
+            ratio = tgt[50] / cmp[50] if cmp[50] and not math.isnan(cmp[50]) else math.nan
+            result[self.sql_hashes[sql_hash_id]] = { 'count': len(rows),
+                'tgt': { p: tgt[p] for p in percentiles }, 'cmp': { p: cmp[p] for p in percentiles }, 'ratio': ratio }
+        return result
+
+    def breakdown(self):
+        """Rows per (result code name, DB user)."""
+        users = len(self.db_users)
+        if numpy is not None:
+            codes = self._np(self.codes).astype(numpy.int64)
+            valid = codes >= 0
+            keys = codes[valid] * max(users, 1) + self._np(self.db_user_ids)[valid]
+            counts = numpy.bincount(keys)
+            pairs = [(int(k), int(counts[k])) for k in numpy.flatnonzero(counts)]
+        else:
+            counted = {}
+            for code, user_id in zip(self.codes, self.db_user_ids):
+                if code >= 0:
+                    key = code * max(users, 1) + user_id
+                    counted[key] = counted.get(key, 0) + 1
+            pairs = sorted(counted.items())
+        result = {}
+        for key, count in pairs:
+            code, user_id = divmod(key, max(users, 1))
+            result[(RESULT_CODES.get(code, str(code)), self.db_users[user_id])] = count
+        return result
+
+    def regressions(self, time_threshold = None, ratio_threshold = None):
+        """
+        Row positions whose tgt elapsed time is worse than the cmp one, with the
+        thresholds of execute_assessment: the difference is at least
+        time_threshold and tgt is at least ratio_threshold times cmp
+        (None: that condition is not checked). Rows without both elapsed
+        times are skipped.
+        """
+        if numpy is not None:
+            tgt = self._np(self.elapsed)
+            cmp = self._np(self.cmp_elapsed)
+            mask = ~(numpy.isnan(tgt) | numpy.isnan(cmp)) & (tgt > cmp)
+            if time_threshold is not None:
+                mask &= (tgt - cmp) >= time_threshold
+            if ratio_threshold is not None:
+                mask &= tgt >= cmp * ratio_threshold
+            return numpy.flatnonzero(mask).tolist()
+
+        rows = []
+        for position, (tgt, cmp) in enumerate(zip(self.elapsed, self.cmp_elapsed)):
+            if math.isnan(tgt) or math.isnan(cmp) or tgt <= cmp:
+                continue
+            if time_threshold is not None and tgt - cmp < time_threshold:
+                continue
+            if ratio_threshold is not None and tgt < cmp * ratio_threshold:
+                continue
+            rows.append(position)
+        return rows
+
+    def regressed_sql_hashes(self, time_threshold = None, ratio_threshold = None):
+        # { SQL hash: regressed rows }
+        result = {}
+        for position in self.regressions(time_threshold, ratio_threshold):
+            sql_hash = self.sql_hashes[self.sql_hash_ids[position]]
+            result[sql_hash] = result.get(sql_hash, 0) + 1
+        return result
+
+def print_assessment_analytics(sql_testing, assessment_id, time_threshold = None, ratio_threshold = None, percentiles = PERCENTILES, top = 10):
+    columns = ResultColumns.load(sql_testing, assessment_id)
+    print('Assessment: ' + assessment_id + ' (' + str(len(columns)) + ' rows)')
+    for code, count in enumerate(columns.result_code_counts()):
+        print('    ' + RESULT_CODES.get(code, str(code)).rjust(24) + ':' + str(count))
+    for side, values in columns.latency_percentiles(percentiles).items():
+        print('    ' + side + ' elapsed: ' + ', '.join('p' + str(p) + '=' + format(v, '.3f') for p, v in values.items()))
+    regressed = columns.regressed_sql_hashes(time_threshold, ratio_threshold)
+    print('    regressed SQL hashes: ' + str(len(regressed)))
+    for sql_hash, count in sorted(regressed.items(), key=lambda item: -item[1])[:top]:
+        print('        ' + str(sql_hash) + ': ' + str(count))
@@ -0,0 +1,714 @@
+import asyncio
+import json
+import os
+import time
+from logging import getLogger, DEBUG
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from insight_sql_testing import (HEADERS, PAGE_LIMIT, MAX_ELEMENTS, JOB_PROGRESS, CONNECT_TIMEOUT, READ_TIMEOUT,
+    RETRIES, RETRY_BACKOFF, RETRY_MAX_WAIT, RETRY_STATUSES, IDEMPOTENT_METHODS, TRANSIENT_ERRORS,
+    api_error, retry_delay, wait_intervals, get_job_progress)
+from insight_sql_testing_metrics import request_event, call_request_hooks
+
+# Max HTTP requests in flight at the same time for one client
+MAX_CONCURRENCY = 100
+# Rows per queryRows page (set by the server)
+QUERY_ROWS_PAGE = 100
+
+class AsyncInsightSQLTesting():
+    def __init__(self, url_base, user, password, upper_logger = None,
+        max_concurrency = MAX_CONCURRENCY, limit_per_host = 0,
+        connect_timeout = CONNECT_TIMEOUT, read_timeout = READ_TIMEOUT, request_hooks = None, raise_errors = True,
+        retries = RETRIES, retry_backoff = RETRY_BACKOFF, retry_max_wait = RETRY_MAX_WAIT):
+        """
+        Create asyncio Insight SQL Testing client.
+        The session is created by 'await client.open()' or 'async with'.
+
+        Parameters
+        ----------
+        url_base : string
+            URL to Insight DT Manager
+            example: http://127.0.0.1:7777/idt/
+        user : user name
+        password : password for the user
+        upper_logger : logger to be used
+        max_concurrency : max HTTP requests in flight (job waits sleeping
+            between polls do not count)
+        limit_per_host : max connections per host (0: only max_concurrency applies)
+        connect_timeout : seconds to wait for a TCP connection (None: no timeout)
+        read_timeout : seconds to wait for the server response (None: no timeout)
+        request_hooks : callables called with a dict after every API request
+            (see InsightSQLTesting)
+        raise_errors : raise InsightAPIError subclasses on error statuses
+            (False: log the error and return None; a failed page of a *_all
+            operation raises anyway)
+        retries, retry_backoff, retry_max_wait : retries of a GET/PUT/DELETE
+            after a connection error, a timeout or a 429/502/503/504 status
+            (see InsightSQLTesting)
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncInsightSQLTesting requires aiohttp. (pip3 install aiohttp)')
+
+        self._logger = upper_logger or getLogger(__name__)
+
+        self._url_base = url_base + 'api/v2/'
+        self._user = user
+        self._password = password
+        self._max_concurrency = max_concurrency
+        self._limit_per_host = limit_per_host
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._semaphore = None
+        self._http = None
+        self._logged_in = False
+        self._request_hooks = list(request_hooks or [])
+        self._raise_errors = raise_errors
+        self._retries = retries
+        self._retry_backoff = retry_backoff
+        self._retry_max_wait = retry_max_wait
+
+    def add_request_hook(self, hook):
+        self._request_hooks.append(hook)
+
+    def remove_request_hook(self, hook):
+        self._request_hooks.remove(hook)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, ex_type, ex_value, trace):
+        await self.close()
+
+    async def open(self):
+        if self._http is not None:
+            return
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self._max_concurrency, limit_per_host=self._limit_per_host)
+        # unsafe: keep the session cookie also when the manager is addressed by IP
+        self._http = aiohttp.ClientSession(connector=connector, timeout=self._timeout, cookie_jar=aiohttp.CookieJar(unsafe=True))
+        try:
+            await self._create_session(self._user, self._password)
+        except BaseException:
+            await self._http.close()
+            self._http = None
+            raise
+
+    async def close(self):
+        if self._http is None:
+            return
+        try:
+            await self._remove_session()
+        finally:
+            await self._http.close()
+            self._http = None
+
+    async def _create_session(self, user, password):
+        url = self._url_base + 'auth'
+        body = { 'username': user, 'password': password }
+        async with self._semaphore:
+            async with self._http.post(url, headers=HEADERS, json=body) as r:
+                text = await r.text()
+        if r.status != 200:
+            # InsightAuthError for wrong credentials
+            raise api_error('POST', 'auth', r.status, text)
+        self._logger.info(json.loads(text))
+        self._logged_in = True
+
+    async def _remove_session(self):
+        if self._logged_in:
+            url = self._url_base + 'auth'
+            async with self._semaphore:
+                async with self._http.delete(url, headers=HEADERS) as r:
+                    self._logger.info(await r.json(content_type=None))
+            self._logged_in = False
+
+    async def _call_api(self, method, api, body=None, files=None, raise_errors=None):
+        # raise_errors: None for the client setting
+        if raise_errors is None:
+            raise_errors = self._raise_errors
+        max_retries = self._retries if method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    async with self._request(method, api, body, files) as r:
+                        content = await r.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if self._request_hooks:
+                        call_request_hooks(self._request_hooks, request_event(method, api, None, time.perf_counter() - started,
+                            retries=attempt, error=e), self._logger)
+                    if attempt >= max_retries:
+                        raise
+                    delay = retry_delay(attempt, self._retry_backoff, self._retry_max_wait)
+                    self._logger.warning(method + ' ' + api + ' failed (' + str(e) + '), retrying in ' + format(delay, '.1f') + 's')
+                else:
+                    if r.status not in RETRY_STATUSES or attempt >= max_retries:
+                        break
+                    if self._request_hooks:
+                        call_request_hooks(self._request_hooks, request_event(method, api, r.status, time.perf_counter() - started,
+                            bytes_received=len(content), retries=attempt), self._logger)
+                    delay = retry_delay(attempt, self._retry_backoff, self._retry_max_wait, r.headers.get('Retry-After'))
+                    self._logger.warning(method + ' ' + api + ': status=' + str(r.status) + ', retrying in ' + format(delay, '.1f') + 's')
+            # sleep outside the semaphore
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if self._request_hooks:
+            # request body size is not tracked here
+            call_request_hooks(self._request_hooks, request_event(method, api, r.status, time.perf_counter() - started,
+                bytes_received=len(content), retries=attempt), self._logger)
+        if r.status != 200:
+            text = content.decode('utf-8', 'replace')
+            self._logger.error('status=' + str(r.status))
+            self._logger.error('text=' + text)
+            if raise_errors:
+                raise api_error(method, api, r.status, text)
+            return None
+        response = json.loads(content)
+
+        if self._logger.isEnabledFor(DEBUG):
+            self._logger.debug(json.dumps(response, indent=2))
+
+        return response
+
+    def _request(self, method, api, body, files):
+        url = self._url_base + api
+        if method == 'GET':
+            return self._http.get(url, headers=HEADERS)
+        elif method == 'POST':
+            return self._http.post(url, headers=HEADERS, json=body)
+        elif method == 'POST_UPLOAD':
+            return self._http.post(url, data=self._upload_form(body, files))
+        elif method == 'PUT':
+            return self._http.put(url, headers=HEADERS, json=body)
+        elif method == 'PATCH':
+            return self._http.patch(url, headers=HEADERS, json=body)
+        elif method == 'DELETE':
+            return self._http.delete(url, headers=HEADERS, json=body)
+        error_message = 'Unknown method:' + method + 'for api:' + api + '.'
+        self._logger.error(error_message)
+        raise ValueError(error_message)
+
+    def _upload_form(self, body, files):
+        form = aiohttp.FormData()
+        for k, v in body.items():
+            form.add_field(k, v)
+        for k, (file_name, file_content, content_type) in files.items():
+            form.add_field(k, file_content, filename=file_name, content_type=content_type)
+        return form
+
+    async def _list_elements_part(self, list_key, limit = PAGE_LIMIT, offset = 0, query_parameters = None, raise_errors = None):
+        query_parameter_string = ''
+        if query_parameters is not None:
+            for k,v in query_parameters.items():
+                query_parameter_string += '&' + k + '=' + v
+        response = await self._call_api('GET', list_key + '?limit=' + str(limit) + '&offset=' + str(offset) + query_parameter_string, raise_errors=raise_errors)
+        if response is None:
+            return None
+
+        return response['rows']
+
+    async def _list_elements(self, list_key, query_parameters = None):
+        # a failed page raises: never return a partial list
+        elements = []
+        for offset in range(0, MAX_ELEMENTS, PAGE_LIMIT):
+            elements_part = await self._list_elements_part(list_key, PAGE_LIMIT, offset, query_parameters, raise_errors=True)
+            if len(elements_part) == 0:
+                break
+
+            elements.extend(elements_part)
+
+        return elements
+
+    async def _query_rows_elements(self, query_rows_key):
+        # a failed page raises: never return a partial list
+        elements = []
+        for offset in range(0, MAX_ELEMENTS, QUERY_ROWS_PAGE):
+            elements_part = await self._call_api('GET', query_rows_key + '?offset=' + str(offset), raise_errors=True)
+            if len(elements_part) == 0:
+                break
+
+            elements.extend(elements_part)
+        return elements
+
+    async def _get_id_from_name(self, list_key, target_name):
+        for offset in range(0, MAX_ELEMENTS, PAGE_LIMIT):
+            elements_part = await self._list_elements_part(list_key, PAGE_LIMIT, offset, raise_errors=True)
+            if len(elements_part) == 0:
+                # not found
+                return None
+
+            # search id from name
+            for target_element in elements_part:
+                if target_element['name'] == target_name:
+                    return target_element['id']
+        return None
+
+    def _set_optional_parameter(self, body, key, val):
+        if val is not None:
+            body[key] = val
+
+    async def _wait_until_ready(self, key, id, timeout = None, progress_callback = None):
+        progress_comment, progress_key = JOB_PROGRESS[key]
+        deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+        # wait until statusEx becomes 0(ready), sleeping outside the semaphore
+        for interval in wait_intervals():
+            if deadline is not None:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    raise TimeoutError('Job not ready in ' + str(timeout) + ' seconds: ' + key + ' ' + id)
+                interval = min(interval, remaining)
+            await asyncio.sleep(interval)
+
+            try:
+                response = await self._call_api('GET', key + '/' + id, raise_errors=True)
+            except TRANSIENT_ERRORS + (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # the job keeps running on the manager: poll again later
+                self._logger.warning('  polling ' + key + ' ' + id + ' failed: ' + str(e))
+                continue
+            if progress_callback is not None:
+                progress_callback(key, id, response)
+            progress = get_job_progress(response, progress_key)
+            if response['statusEx'] == 0:
+                # finished
+                self._logger.info('  ' + progress_comment + ':' + str(progress))
+                return response
+
+            if 'jobs' in response and len(response['jobs']) > 0:
+                if progress is not None:
+                    self._logger.info('  current ' + progress_comment + ':' + str(progress))
+                else:
+                    self._logger.warning('  not started ...')
+            else:
+                self._logger.info('  preparing ...')
+
+    async def _wait_all(self, key, ids, timeout, progress_callback):
+        ids = list(dict.fromkeys(ids))
+        responses = await asyncio.gather(*[self._wait_until_ready(key, id, timeout, progress_callback) for id in ids])
+        return dict(zip(ids, responses))
+
+    async def _download_file(self, url, file_name):
+        # write to <file_name>.part and rename it to file_name only when the
+        # transfer is complete, so a failed download leaves no truncated file
+        CHUNK_SIZE = 1024 * 1024
+        part_file_name = file_name + '.part'
+        try:
+            async with self._semaphore:
+                async with self._http.get(url) as response:
+                    if response.status != 200:
+                        text = await response.text()
+                        self._logger.error('status=' + str(response.status))
+                        self._logger.error('text=' + text)
+                        if self._raise_errors:
+                            raise api_error('GET', url[len(self._url_base):], response.status, text)
+                        return None
+                    # a cut-off transfer raises ClientPayloadError
+                    with open(part_file_name, 'wb') as file:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            file.write(chunk)
+            os.replace(part_file_name, file_name)
+        finally:
+            if os.path.exists(part_file_name):
+                os.remove(part_file_name)
+
+        return file_name
+
+    async def _create_and_wait(self, method, api, body, files, key):
+        response = await self._call_api(method, api, body, files)
+        if response is None:
+            return None
+
+        return await self._wait_until_ready(key, response['id'])
+
+    # for Version information
+
+    async def get_version(self):
+        self._logger.info('Get Version')
+        version_info = await self._call_api('GET', 'version')
+        if version_info is None:
+            return None
+        if version_info['VERSION'][0] != '4':
+            self._logger.warning('This PyInsightSQLTesting is tested on Insight SQL Testing Version 4.x. It may does not work properly for this version.')
+        return version_info
+
+    # for License operation (admin)
+
+    async def get_license(self):
+        self._logger.info('Get License')
+        return await self._call_api('GET', 'license')
+
+    async def update_license(self, license_key):
+        self._logger.info('Update License: ' + license_key)
+        body = { 'key': license_key }
+        return await self._call_api('PUT', 'license', body)
+
+    # for User operation (admin)
+
+    async def list_users(self):
+        self._logger.info('Get user list')
+        return await self._call_api('GET', 'users')
+
+    async def create_user(self, user_name, password):
+        self._logger.info('Create a user: ' + user_name)
+        body = { 'name': user_name, 'password': password }
+        return await self._call_api('POST', 'users', body)
+
+    async def get_user(self, user_id):
+        self._logger.info('Get the user: ' + user_id)
+        return await self._call_api('GET', 'users/' + user_id)
+
+    async def delete_user(self, user_id):
+        self._logger.info('Delete the user: ' + user_id)
+        return await self._call_api('DELETE', 'users/' + user_id)
+
+    async def reset_user_password(self, user_id):
+        self._logger.info('Reset the user password: ' + user_id)
+        return await self._call_api('POST', 'users/' + user_id + '/reset-password')
+
+    # for User operation
+
+    async def get_my_user_info(self):
+        self._logger.info('Get my user info')
+        return await self._call_api('GET', 'users/me')
+
+    async def change_my_password(self, current_password, password, password_confirmation):
+        self._logger.info('Change my password')
+        body = { 'currentPassword': current_password, 'password': password, 'passwordConfirmation': password_confirmation }
+        return await self._call_api('POST', 'users/change-my-password', body)
+
+    # for Database operation
+
+    async def list_databases(self):
+        return await self._list_elements('databases')
+
+    async def get_database_id_from_name(self, database_name):
+        return await self._get_id_from_name('databases', database_name)
+
+    async def create_database(self, database_name, db_type, db_version, connection_string, memo = None):
+        self._logger.info('Create a database: ' + database_name)
+        body = { 'name': database_name, 'dbType': db_type, 'dbVersion': db_version, 'connectionString': connection_string }
+        self._set_optional_parameter(body, 'memo', memo)
+        return await self._call_api('POST', 'databases', body)
+
+    async def get_database(self, database_id):
+        self._logger.info('Get the database: ' + database_id)
+        return await self._call_api('GET', 'databases/' + database_id)
+
+    async def update_database(self, database_id, database_name = None, db_type = None, db_version = None, connection_string = None, memo = None):
+        self._logger.info('Update the database: ' + database_id)
+        body = {}
+        self._set_optional_parameter(body, 'name', database_name)
+        self._set_optional_parameter(body, 'dbType', db_type)
+        self._set_optional_parameter(body, 'dbVersion', db_version)
+        self._set_optional_parameter(body, 'connectionString', connection_string)
+        self._set_optional_parameter(body, 'memo', memo)
+        if len(body) == 0:
+            # do nothing
+            return
+        return await self._call_api('PATCH', 'databases/' + database_id, body)
+
+    async def delete_database(self, database_id):
+        self._logger.info('Delete the database: ' + database_id)
+        return await self._call_api('DELETE', 'databases/' + database_id)
+
+    async def test_connect_database(self, database_user, database_password, db_type, connection_string):
+        self._logger.info('Test connect to the database: ' + database_user + ', ' + connection_string)
+        body = { 'user': database_user, 'pass': database_password, 'dbType': db_type, 'connectionString': connection_string }
+        return await self._call_api('POST', 'databases/test-connect', body)
+
+    async def try_parse_sql(self, database_user, database_password, db_type, connection_string, sql_text, convert_parameter = False, query_timeout_millisec = None):
+        self._logger.info('Try parse a SQL: ' + database_user + ', ' + connection_string + ', ' + sql_text)
+        body = { 'user': database_user, 'pass': database_password, 'dbType': db_type, 'connectionString': connection_string, 'sqlText': sql_text, 'convertParameter': convert_parameter, 'queryTimeoutMillisec': query_timeout_millisec }
+        return await self._call_api('POST', 'databases/parse', body)
+
+    async def try_execute_sql(self, database_user, database_password, db_type, connection_string, sql_text, persist = False, convert_parameter = False, bind = [], query_timeout_millisec = None):
+        self._logger.info('Try execute a SQL: ' + database_user + ', ' + connection_string + ', ' + sql_text)
+        body = { 'user': database_user, 'pass': database_password, 'dbType': db_type, 'connectionString': connection_string, 'sqlText': sql_text, 'persist': persist, 'convertParameter': convert_parameter, 'bind': bind, 'queryTimeoutMillisec': query_timeout_millisec }
+        return await self._call_api('POST', 'databases/execute', body)
+
+    async def get_query_plan(self, database_user, database_password, db_type, connection_string, sql_text, convert_parameter = False, bind = []):
+        self._logger.info('Get a SQL query plan: ' + database_user + ', ' + connection_string + ', ' + sql_text)
+        body = { 'user': database_user, 'pass': database_password, 'dbType': db_type, 'connectionString': connection_string, 'sqlText': sql_text, 'convertParameter': convert_parameter, 'bind': bind }
+        return await self._call_api('POST', 'databases/query-plan', body)
+
+    # for SQL workload operation
+
+    async def list_sql_workloads(self):
+        return await self._list_elements('sql-workloads')
+
+    async def create_sql_workload(self, sql_workload_name, db_type, source_file_name, is_unique = False, memo = None):
+        self._logger.info('Create a SQL-workload: ' + sql_workload_name)
+        body = { 'name': sql_workload_name, 'dbType': db_type, 'dataKind': 'MS', 'source': source_file_name, 'unique': ('true' if is_unique else 'false') }
+        self._set_optional_parameter(body, 'memo', memo)
+        return await self._create_and_wait('POST', 'sql-workloads/', body, None, 'sql-workloads')
+
+    async def create_sql_workload_upload(self, sql_workload_name, db_type, source_file_path, is_unique = False, memo = None):
+        self._logger.info('Create a SQL-workload(upload): ' + sql_workload_name)
+        body = { 'name': sql_workload_name, 'dbType': db_type, 'dataKind': 'MS', 'unique': ('true' if is_unique else 'false') }
+        self._set_optional_parameter(body, 'memo', memo)
+        with open(source_file_path, 'rb') as file_content:
+            files = {'source': ('upload_file', file_content, 'text/csv')}
+            response = await self._call_api('POST_UPLOAD', 'sql-workloads/upload', body, files)
+        if response is None:
+            return None
+
+        return await self._wait_until_ready('sql-workloads', response['id'])
+
+    async def get_sql_workload(self, sql_workload_id):
+        self._logger.info('Get the SQL-workload: ' + sql_workload_id)
+        return await self._call_api('GET', 'sql-workloads/' + sql_workload_id)
+
+    async def get_sql_workload_id_from_name(self, sql_workload_name):
+        return await self._get_id_from_name('sql-workloads', sql_workload_name)
+
+    async def update_sql_workload(self, sql_workload_id, sql_workload_name = None, db_type = None, memo = None):
+        self._logger.info('Update the SQL-workload: ' + sql_workload_id)
+        body = {}
+        self._set_optional_parameter(body, 'name', sql_workload_name)
+        self._set_optional_parameter(body, 'dbType', db_type)
+        self._set_optional_parameter(body, 'memo', memo)
+        if len(body) == 0:
+            # do nothing
+            return
+        return await self._call_api('PATCH', 'sql-workloads/' + sql_workload_id, body)
+
+    async def delete_sql_workload(self, sql_workload_id):
+        self._logger.info('Delete the SQL-workload: ' + sql_workload_id)
+        return await self._call_api('DELETE', 'sql-workloads/' + sql_workload_id)
+
+    async def get_sql_workload_sqls(self, sql_workload_id, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
+        self._logger.info('Get SQL-workload SQLs: ' + sql_workload_id + ' (limit=' + str(limit) + ', offset=' + str(offset) + ')')
+        return await self._list_elements_part('sql-workloads/' + sql_workload_id + '/rows', limit, offset, query_parameters)
+
+    async def get_sql_workload_sqls_all(self, sql_workload_id):
+        self._logger.info('Get SQL-workload all SQLs (This operation may take long time to be processed.): ' + sql_workload_id)
+        return await self._list_elements('sql-workloads/' + sql_workload_id + '/rows')
+
+    async def copy_sql_workload(self, sql_workload_id, name):
+        self._logger.info('Copy the SQL-workload: ' + sql_workload_id + ' (name=' + name + ')')
+        body = { 'name': name }
+        return await self._call_api('POST', 'sql-workloads/' + sql_workload_id + '/copy', body)
+
+    async def update_sql_workload_db_user(self, sql_workload_id, old_users, new_users):
+        self._logger.info('Update the SQL-workload DB users: ' + sql_workload_id)
+        body = { 'oldusers': old_users, 'newusers': new_users }
+        return await self._call_api('PUT', 'sql-workloads/' + sql_workload_id + '/modify', body)
+
+    async def wait_sql_workloads(self, sql_workload_ids, timeout = None, progress_callback = None):
+        return await self._wait_all('sql-workloads', sql_workload_ids, timeout, progress_callback)
+
+    async def wait_sql_workload(self, sql_workload_id, timeout = None, progress_callback = None):
+        return await self._wait_until_ready('sql-workloads', sql_workload_id, timeout, progress_callback)
+
+    # for Patch SQL set operation
+
+    async def list_patch_sqls(self):
+        return await self._list_elements('patch-sqls')
+
+    async def create_patch_sql_from_assessment(self, patch_sql_name, assessment_id, memo = None):
+        self._logger.info('Create a patch sql (from assessment): ' + patch_sql_name)
+        body = { 'name': patch_sql_name, 'assessmentId': assessment_id }
+        self._set_optional_parameter(body, 'memo', memo)
+        return await self._create_and_wait('POST', 'patch-sqls/from-assessment', body, None, 'patch-sqls')
+
+    async def create_patch_sql_upload(self, patch_sql_name, source_file_path, memo = None):
+        self._logger.info('Create a patch sql (upload): ' + patch_sql_name)
+        body = { 'name': patch_sql_name }
+        self._set_optional_parameter(body, 'memo', memo)
+        with open(source_file_path, 'rb') as file_content:
+            files = {'source': ('upload_file', file_content, 'text/csv')}
+            response = await self._call_api('POST_UPLOAD', 'patch-sqls/from-sct', body, files)
+        if response is None:
+            return None
+
+        return await self._wait_until_ready('patch-sqls', response['id'])
+
+    async def merge_patch_sqls(self, patch_sql_name, patch_sqls, memo = None):
+        self._logger.info('Create a patch sql (from patch sqls): ' + patch_sql_name)
+        body = { 'name': patch_sql_name, 'patchSqlIds': patch_sqls }
+        self._set_optional_parameter(body, 'memo', memo)
+        return await self._create_and_wait('POST', 'patch-sqls/merge', body, None, 'patch-sqls')
+
+    async def get_patch_sql(self, patch_sql_id):
+        self._logger.info('Get the patch sql: ' + patch_sql_id)
+        return await self._call_api('GET', 'patch-sqls/' + patch_sql_id)
+
+    async def get_patch_sql_id_from_name(self, patch_sql_name):
+        return await self._get_id_from_name('patch-sqls', patch_sql_name)
+
+    async def update_patch_sql(self, patch_sql_id, patch_sql_name = None, memo = None):
+        self._logger.info('Update the patch sql: ' + patch_sql_id)
+        body = {}
+        self._set_optional_parameter(body, 'name', patch_sql_name)
+        self._set_optional_parameter(body, 'memo', memo)
+        if len(body) == 0:
+            # do nothing
+            return
+        return await self._call_api('PATCH', 'patch-sqls/' + patch_sql_id, body)
+
+    async def delete_patch_sql(self, patch_sql_id):
+        self._logger.info('Delete the patch sql: ' + patch_sql_id)
+        return await self._call_api('DELETE', 'patch-sqls/' + patch_sql_id)
+
+    async def get_patch_sql_sqls(self, patch_sql_id, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
+        self._logger.info('Get patch sql SQLs: ' + patch_sql_id + ' (limit=' + str(limit) + ', offset=' + str(offset) + ')')
+        return await self._list_elements_part('patch-sqls/' + patch_sql_id + '/hash-rule/rows', limit, offset, query_parameters)
+
+    async def get_patch_sql_sqls_all(self, patch_sql_id):
+        self._logger.info('Get patch sql SQLs (This operation may take long time to be processed.): ' + patch_sql_id)
+        return await self._list_elements('patch-sqls/' + patch_sql_id + '/hash-rule/rows')
+
+    async def wait_patch_sqls(self, patch_sql_ids, timeout = None, progress_callback = None):
+        return await self._wait_all('patch-sqls', patch_sql_ids, timeout, progress_callback)
+
+    async def wait_patch_sql(self, patch_sql_id, timeout = None, progress_callback = None):
+        return await self._wait_until_ready('patch-sqls', patch_sql_id, timeout, progress_callback)
+
+    # for Assessment operation
+
+    async def list_assessments(self):
+        return await self._list_elements('assessments')
+
+    async def execute_assessment(self, assessment_name, sql_workload_id,
+        db_users, db_user_passwords,
+        target_db_id, cmp_source_db_id = None,
+        patch_sql_workload_id = None, cmp_patch_sql_workload_id = None,
+        memo = None,
+        start = '00000000000000', end = '99999999999999',
+        is_serial_mode = False, sql_start_time_begin = None, sql_start_time_end = None,
+        exec_level = 'E', transaction = 'N',
+        result_record = None, query_plan_record = None, compare_on_disk = None,
+        alt_users = None, cmp_alt_users = None,
+        etime_zero = 0.2, concurrency = 1, convert_parameter = False,
+        filling_bind_value_map = {'UNKNOWN': { 'type': 'UNKNOWN', 'value':'-'}},
+        cmp_filling_bind_value_map = {'UNKNOWN': { 'type': 'UNKNOWN', 'value':'-'}},
+        header_comparison_level = 'STRICT', order_comparison_level = 'STRICT',
+        query_timeout_millisec = None,
+        time_threshold = None, ratio_threshold = None,
+        trim_char = False, epsilon = None,
+        fetch_size = None, fetch_limit = None,
+        hook = None, cmp_hook = None, ses_hook = None, cmp_ses_hook = None,
+        cmp_pswds = None):
+        self._logger.info('Execute an assessment: ' + assessment_name)
+        body = {
+            'name': assessment_name,
+            'memo': memo,
+            'sqlWorkloadId': sql_workload_id,
+            'databaseId': target_db_id, 'cmpDatabaseId': cmp_source_db_id,
+            'patchSqlId': patch_sql_workload_id, 'cmpPatchSqlId': cmp_patch_sql_workload_id,
+            'start': start, 'end': end,
+            'isSerialMode': is_serial_mode, 'sqlStartTimeBegin': sql_start_time_begin, 'sqlStartTimeEnd': sql_start_time_end,
+            'execLevel': exec_level, 'transaction': transaction,
+            'resultRecord': result_record, 'queryPlanRecord': query_plan_record, 'compareOnDisk': compare_on_disk,
+            'users': db_users, 'altUsers': alt_users, 'cmpAltUsers': cmp_alt_users,
+            'etimeZero': etime_zero, 'concurrency': concurrency, 'convertParameter': convert_parameter,
+            'fillingBindValueMap': filling_bind_value_map, 'cmpFillingBindValueMap': cmp_filling_bind_value_map,
+            'headerComparisonLevel': header_comparison_level, 'orderComparisonLevel': order_comparison_level,
+            'queryTimeoutMillisec': query_timeout_millisec,
+            'timeThreshold': time_threshold, 'ratioThreshold': ratio_threshold,
+            'trimChar': trim_char, 'epsilon': epsilon,
+            'fetchSize': fetch_size, 'fetchLimit': fetch_limit,
+            'hook': hook, 'cmp': cmp_hook, 'sesHook': ses_hook, 'cmpSesHook': cmp_ses_hook,
+            'pswds': db_user_passwords, 'cmpPswds': cmp_pswds
+        }
+        return await self._create_and_wait('POST', 'assessments', body, None, 'assessments')
+
+    async def get_assessment(self, assessment_id):
+        self._logger.info('Get the assessment: ' + assessment_id)
+        return await self._call_api('GET', 'assessments/' + assessment_id)
+
+    async def get_assessment_id_from_name(self, assessment_name):
+        return await self._get_id_from_name('assessments', assessment_name)
+
+    async def update_assessment(self, assessment_id, assessment_name = None, memo = None):
+        self._logger.info('Update the assessment: ' + assessment_id)
+        body = {}
+        self._set_optional_parameter(body, 'name', assessment_name)
+        self._set_optional_parameter(body, 'memo', memo)
+        if len(body) == 0:
+            # do nothing
+            return
+        return await self._call_api('PATCH', 'assessments/' + assessment_id, body)
+
+    async def delete_assessment(self, assessment_id):
+        self._logger.info('Delete the assessment: ' + assessment_id)
+        return await self._call_api('DELETE', 'assessments/' + assessment_id)
+
+    async def wait_assessments(self, assessment_ids, timeout = None, progress_callback = None):
+        return await self._wait_all('assessments', assessment_ids, timeout, progress_callback)
+
+    async def wait_assessment(self, assessment_id, timeout = None, progress_callback = None):
+        return await self._wait_until_ready('assessments', assessment_id, timeout, progress_callback)
+
+    async def get_assessment_sqls(self, assessment_id, limit = PAGE_LIMIT, offset = 0, query_parameters = None):
+        self._logger.info('Get assessment SQLs: ' + assessment_id + ' (limit=' + str(limit) + ', offset=' + str(offset) + ')')
+        return await self._list_elements_part('assessments/' + assessment_id + '/results', limit, offset, query_parameters)
+
+    async def get_assessment_sqls_all(self, assessment_id, query_parameters = None):
+        self._logger.info('Get assessment SQLs (This operation may take long time to be processed.): ' + assessment_id)
+        return await self._list_elements('assessments/' + assessment_id + '/results', query_parameters)
+
+    async def get_assessment_sql(self, assessment_id, assessment_row_id):
+        self._logger.info('Get assessment SQL: ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
+        return await self._call_api('GET', 'assessments/' + assessment_id + '/results/' + str(assessment_row_id))
+
+    async def get_assessment_sql_query_rows(self, assessment_id, assessment_row_id, offset = 0):
+        self._logger.info('Get assessment SQL query rows: ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
+        return await self._call_api('GET', 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/queryRows?offset=' + str(offset))
+
+    async def get_assessment_sql_query_rows_all(self, assessment_id, assessment_row_id):
+        self._logger.info('Get assessment SQL query rows (This operation may take long time to be processed.): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
+        return await self._query_rows_elements('assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/queryRows')
+
+    async def download_assessment_sql_query_rows(self, assessment_id, assessment_row_id):
+        response = await self._call_api('GET', 'assessments/' + assessment_id)
+        if response is None:
+            return None
+
+        file_name = response['name'] + '_' + str(assessment_row_id) + '_returns(tgt).csv'
+        self._logger.info('Donwload the assessment SQL query rows(csv): ' + file_name)
+
+        url = self._url_base + 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/queryRows/download?format=csv'
+        return await self._download_file(url, file_name)
+
+    async def get_assessment_sql_cmp_query_rows(self, assessment_id, assessment_row_id, offset = 0):
+        self._logger.info('Get assessment SQL query rows(cmp): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
+        return await self._call_api('GET', 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/cmpQueryRows?offset=' + str(offset))
+
+    async def get_assessment_sql_cmp_query_rows_all(self, assessment_id, assessment_row_id):
+        self._logger.info('Get assessment SQL query rows(cmp) (This operation may take long time to be processed.): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
+        return await self._query_rows_elements('assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/cmpQueryRows')
+
+    async def download_assessment_sql_cmp_query_rows(self, assessment_id, assessment_row_id):
+        response = await self._call_api('GET', 'assessments/' + assessment_id)
+        if response is None:
+            return None
+
+        file_name = response['name'] + '_' + str(assessment_row_id) + '_returns(cmp).csv'
+        self._logger.info('Donwload the assessment SQL query rows(cmp, csv): ' + file_name)
+
+        url = self._url_base + 'assessments/' + assessment_id + '/results/' + str(assessment_row_id) + '/cmpQueryRows/download?format=csv'
+        return await self._download_file(url, file_name)
+
+    async def download_assessment_csv(self, assessment_id, csv_type = 'basic', result_code = '1,2,3,4,5'):
+        if result_code is None or result_code == '':
+            self._logger.warning('result_code must not be empty.')
+            return None
+
+        response = await self._call_api('GET', 'assessments/' + assessment_id)
+        if response is None:
+            return None
+
+        file_name = response['name'] + '.csv'
+        self._logger.info('Donwload the assessment csv: ' + file_name)
+
+        query_parameter = '?type=' + csv_type
+        query_parameter += '&resultCode=' + result_code
+
+        url = self._url_base + 'assessments/' + assessment_id + '/download/csv' + query_parameter
+        return await self._download_file(url, file_name)
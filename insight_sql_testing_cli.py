@@ -0,0 +1,289 @@
+"""
+Command line interface of PyInsightSQLTesting.
+
+    python3 insight_sql_testing_cli.py --help
+    python3 insight_sql_testing_cli.py list assessments --name 'nightly-*'
+    python3 insight_sql_testing_cli.py export assessment <id or name> > results.jsonl
+
+Connection settings come from --url/--user/--password or the INSIGHT_URL,
+INSIGHT_USER, INSIGHT_PASSWORD and INSIGHT_SESSION_STORE environment
+variables. Every command writes one JSON object per line to stdout.
+
+Only argparse is imported up front; the HTTP client is imported when a
+command runs, so --help returns at once.
+"""
+import argparse
+import json
+import os
+import sys
+
+RESOURCES = ('databases', 'sql-workloads', 'patch-sqls', 'assessments', 'users')
+JOB_RESOURCES = ('sql-workloads', 'patch-sqls', 'assessments')
+
+# resource -> suffix of the InsightSQLTesting methods
+_METHOD_NAMES = { 'databases': 'database', 'sql-workloads': 'sql_workload', 'patch-sqls': 'patch_sql', 'assessments': 'assessment', 'users': 'user' }
+
+# resource -> create method used by 'create'
+_CREATE_METHODS = { 'databases': 'create_database', 'sql-workloads': 'create_sql_workload_upload',
+    'patch-sqls': 'create_patch_sql_upload', 'assessments': 'execute_assessment', 'users': 'create_user' }
+
+def _json_default(value):
+    # InsightJob (create without waiting) -> its id
+    if hasattr(value, 'key') and hasattr(value, 'done'):
+        return { 'id': value.id, 'key': value.key, 'done': value.done() }
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    return str(value)
+
+def _emit(record):
+    # one JSON line
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+
+def _connect(args):
+    import insight_sql_testing
+    from logging import getLogger, StreamHandler, Formatter
+
+    if args.url is None or args.user is None or args.password is None:
+        raise SystemExit('error: --url, --user and --password (or INSIGHT_URL, INSIGHT_USER, INSIGHT_PASSWORD) are required')
+    logger = getLogger('insight_sql_testing_cli')
+    logger.setLevel(args.log_level)
+    handler = StreamHandler(sys.stderr)
+    handler.setFormatter(Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    session_store = None
+    if args.session_store:
+        from insight_sql_testing_session import SessionStore
+        session_store = SessionStore(args.session_store)
+    return insight_sql_testing.InsightSQLTesting(args.url, args.user, args.password, upper_logger=logger, session_store=session_store)
+
+def _resolve(sql_testing, resource, value):
+    # id, or the id of the element named value
+    if resource == 'users':
+        return value
+    resolved = getattr(sql_testing, 'get_' + _METHOD_NAMES[resource] + '_id_from_name')(value)
+    return value if resolved is None else resolved
+
+def _parallel(function, values, parallel):
+    # function(value) for each value, results in order
+    if parallel <= 1 or len(values) <= 1:
+        return [function(value) for value in values]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        return list(executor.map(function, values))
+
+def _load_specs(args):
+    # --spec file (JSON lines, '-': stdin) and/or --set KEY=VALUE (string) / KEY:=JSON
+    specs = []
+    if args.spec is not None:
+        source = sys.stdin if args.spec == '-' else open(args.spec, encoding='utf-8')
+        with source:
+            for line in source:
+                if line.strip():
+                    specs.append(json.loads(line))
+    if args.set:
+        spec = {}
+        for item in args.set:
+            key, separator, value = item.partition('=')
+            if not separator:
+                raise SystemExit('error: --set ' + item + ': expected KEY=VALUE or KEY:=JSON')
+            if key.endswith(':'):
+                try:
+                    spec[key[:-1]] = json.loads(value)
+                except ValueError as e:
+                    raise SystemExit('error: --set ' + item + ': ' + str(e))
+            else:
+                spec[key] = value
+        specs.append(spec)
+    if len(specs) == 0:
+        raise SystemExit('error: give --spec or --set')
+    return specs
+
+# commands
+
+def command_list(sql_testing, args):
+    if args.resource == 'users':
+        # not paged: { rows, total }
+        if args.older_than_days is not None:
+            raise SystemExit('error: --older-than-days does not apply to users')
+        from fnmatch import fnmatchcase
+        response = sql_testing.list_users()
+        for user in (response or {}).get('rows', []):
+            if args.name is None or fnmatchcase(str(user.get('name')), args.name):
+                _emit(user)
+        return
+    if args.name is None and args.older_than_days is None:
+        for element in getattr(sql_testing, 'list_' + args.resource.replace('-', '_'))():
+            _emit(element)
+        return
+    older_than = None if args.older_than_days is None else args.older_than_days * 86400
+    for element in sql_testing.select_elements(args.resource, args.name, older_than):
+        _emit(element)
+
+def command_get(sql_testing, args):
+    # one line per id; a failed id gives { id, error, status } and exit status 1
+    from insight_sql_testing import InsightAPIError
+    get = getattr(sql_testing, 'get_' + _METHOD_NAMES[args.resource])
+
+    def get_one(value):
+        try:
+            return get(_resolve(sql_testing, args.resource, value)), True
+        except InsightAPIError as e:
+            return { 'id': value, 'error': str(e), 'status': e.status }, False
+
+    failed = False
+    for element, ok in _parallel(get_one, args.ids, args.parallel):
+        _emit(element)
+        failed = failed or not ok
+    if failed:
+        sys.stdout.flush()
+        sys.exit(1)
+
+def command_create(sql_testing, args):
+    specs = _load_specs(args)
+    if args.resource in JOB_RESOURCES:
+        for spec in specs:
+            spec.setdefault('wait', not args.no_wait)
+    create = getattr(sql_testing, _CREATE_METHODS[args.resource])
+    for result in sql_testing.create_many(create, specs, dry_run=args.dry_run, max_workers=args.parallel):
+        _emit(result)
+
+def command_execute(sql_testing, args):
+    args.resource = 'assessments'
+    command_create(sql_testing, args)
+
+def command_wait(sql_testing, args):
+    ids = [_resolve(sql_testing, args.resource, value) for value in args.ids]
+    for id, response in sql_testing.wait_jobs(args.resource, ids, args.timeout).items():
+        _emit(response)
+
+def command_download(sql_testing, args):
+    assessment_id = _resolve(sql_testing, 'assessments', args.assessment)
+    if args.row_ids:
+        files = sql_testing.download_assessment_sql_query_rows_many(assessment_id, args.row_ids, cmp=False if args.tgt_only else None, max_workers=args.parallel)
+        for row_id, result in files.items():
+            _emit(dict({ 'assessmentId': assessment_id, 'rowId': row_id }, **result))
+        if any(result['error'] is not None for result in files.values()):
+            sys.stdout.flush()
+            sys.exit(1)
+        return
+    _emit({ 'assessmentId': assessment_id, 'file': sql_testing.download_assessment_csv(assessment_id, args.type, args.result_code) })
+
+def command_export(sql_testing, args):
+    # stream rows without holding them
+    resource_id = _resolve(sql_testing, args.resource, args.id)
+    if args.columnar is not None or args.parquet is not None:
+        import insight_sql_testing_columnar
+        path = args.columnar if args.parquet is None else args.parquet
+        format = 'columnar' if args.parquet is None else 'parquet'
+        if args.resource != 'assessments':
+            raise SystemExit('error: --columnar/--parquet export assessments only')
+        if args.row_id is None:
+            schema = insight_sql_testing_columnar.export_assessment_sqls(sql_testing, resource_id, path, format=format)
+        elif args.cmp:
+            schema = insight_sql_testing_columnar.export_assessment_sql_cmp_query_rows(sql_testing, resource_id, args.row_id, path, format=format)
+        else:
+            schema = insight_sql_testing_columnar.export_assessment_sql_query_rows(sql_testing, resource_id, args.row_id, path, format=format)
+        _emit(dict(schema, path=path))
+        return
+    if args.resource == 'sql-workloads':
+        rows = sql_testing.iter_sql_workload_sqls(resource_id)
+    elif args.resource == 'patch-sqls':
+        rows = sql_testing.iter_patch_sql_sqls(resource_id)
+    elif args.row_id is None:
+        rows = sql_testing.iter_assessment_sqls(resource_id)
+    elif args.cmp:
+        rows = sql_testing.iter_assessment_sql_cmp_query_rows(resource_id, args.row_id)
+    else:
+        rows = sql_testing.iter_assessment_sql_query_rows(resource_id, args.row_id)
+    for row in rows:
+        _emit(row)
+
+def command_cleanup(sql_testing, args):
+    if args.name is None and args.older_than_days is None:
+        raise SystemExit('error: give --name and/or --older-than-days')
+    older_than = None if args.older_than_days is None else args.older_than_days * 86400
+    delete_where = getattr(sql_testing, 'delete_' + args.resource.replace('-', '_') + '_where')
+    for result in delete_where(args.name, older_than, dry_run=args.dry_run, max_workers=args.parallel):
+        _emit(result)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Insight SQL Testing command line client (JSON lines on stdout)')
+    parser.add_argument('--url', default=os.environ.get('INSIGHT_URL'), help='DT Manager URL, e.g. http://127.0.0.1:7777/idt/')
+    parser.add_argument('--user', default=os.environ.get('INSIGHT_USER'))
+    parser.add_argument('--password', default=os.environ.get('INSIGHT_PASSWORD'))
+    parser.add_argument('--session-store', default=os.environ.get('INSIGHT_SESSION_STORE'), help='shared session cookie file')
+    parser.add_argument('--parallel', type=int, default=4, help='concurrent requests of batch operations')
+    parser.add_argument('--log-level', default='WARNING', help='log level (stderr)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    def add(name, function, help_text, resources = RESOURCES):
+        command = commands.add_parser(name, help=help_text)
+        if resources is not None:
+            command.add_argument('resource', choices=resources)
+        command.set_defaults(function=function)
+        return command
+
+    command = add('list', command_list, 'list elements')
+    command.add_argument('--name', help="shell-style name pattern, e.g. 'nightly-*'")
+    command.add_argument('--older-than-days', type=float, help='finished at least this many days ago')
+
+    command = add('get', command_get, 'get elements by id or name')
+    command.add_argument('ids', nargs='+', metavar='id')
+
+    for name, function, help_text, resources in (
+        ('create', command_create, 'create elements from specs (keyword arguments of the create method)', RESOURCES),
+        ('execute', command_execute, 'execute assessments from specs (keyword arguments of execute_assessment)', None)):
+        command = add(name, function, help_text, resources)
+        command.add_argument('--spec', help="JSON lines file of specs ('-': stdin)")
+        command.add_argument('--set', action='append', metavar='KEY=VALUE', help="one spec given inline (repeatable); KEY:=JSON for lists, numbers and booleans, e.g. 'db_users:=[\"app\"]'")
+        command.add_argument('--no-wait', action='store_true', help='do not wait for the jobs to finish')
+        command.add_argument('--dry-run', action='store_true')
+
+    command = add('wait', command_wait, 'wait for jobs to finish', JOB_RESOURCES)
+    command.add_argument('ids', nargs='+', metavar='id')
+    command.add_argument('--timeout', type=float)
+
+    command = add('download', command_download, 'download the assessment csv or query rows csv', None)
+    command.add_argument('assessment', help='assessment id or name')
+    command.add_argument('row_ids', nargs='*', metavar='row_id', help='download query rows of these result rows')
+    command.add_argument('--type', default='basic', help='csv type of the assessment csv')
+    command.add_argument('--result-code', default='1,2,3,4,5')
+    command.add_argument('--tgt-only', action='store_true', help='query rows of the target DB only')
+
+    command = add('export', command_export, 'stream rows (SQLs, results or query rows) as JSON lines', JOB_RESOURCES)
+    command.add_argument('id', help='id or name')
+    command.add_argument('--row-id', help='assessments: query rows of this result row')
+    command.add_argument('--cmp', action='store_true', help='assessments: query rows of the compare DB')
+    command.add_argument('--columnar', metavar='DIR', help='assessments: write typed column files to DIR instead of JSON lines')
+    command.add_argument('--parquet', metavar='FILE', help='assessments: write a Parquet file (requires pyarrow)')
+
+    command = add('cleanup', command_cleanup, 'delete elements by name pattern and/or age', RESOURCES[:-1])
+    command.add_argument('--name', help="shell-style name pattern, e.g. 'nightly-*'")
+    command.add_argument('--older-than-days', type=float, help='finished at least this many days ago')
+    command.add_argument('--dry-run', action='store_true')
+    return parser
+
+def main(argv = None):
+    args = build_parser().parse_args(argv)
+    from insight_sql_testing import InsightAPIError
+    sql_testing = None
+    try:
+        sql_testing = _connect(args)
+        args.function(sql_testing, args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # e.g. piped into head: drop the rest of the output quietly
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+    except (InsightAPIError, TimeoutError, ValueError, OSError) as e:
+        # API errors (login included), unreachable --url, wait --timeout, bad specs, unreadable files
+        sys.stderr.write('error: ' + str(e) + '\n')
+        sys.exit(1)
+    finally:
+        if sql_testing is not None:
+            sql_testing._remove_session()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,529 @@
+import csv
+import json
+import mmap
+import os
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMNAR_FORMAT = 'insight-columnar'
+COLUMNAR_VERSION = 1
+SCHEMA_FILE = 'schema.json'
+
+# Rows buffered per column before they are appended to the files (one Parquet row group)
+CHUNK_ROWS = 65536
+
+# column type -> array typecode of its .data file (str: utf-8 bytes, with an int64 .offsets file)
+COLUMN_TYPECODES = { 'int64': 'q', 'float64': 'd', 'bool': 'B', 'str': 'B' }
+
+_SWAP = sys.byteorder != 'little'    # files are little-endian
+
+def _infer_type(values):
+    # narrowest column type holding every non-null value (None: all null)
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add('bool')
+        elif isinstance(value, int):
+            kinds.add('int64')
+        elif isinstance(value, float):
+            kinds.add('float64')
+        else:
+            return 'str'
+    if len(kinds) == 0:
+        return None
+    if len(kinds) == 1:
+        return kinds.pop()
+    return _wider_type(*kinds) if len(kinds) == 2 else 'str'
+
+def _wider_type(a, b):
+    # type holding the values of both types
+    if a == b:
+        return a
+    if { a, b } == { 'int64', 'float64' }:
+        return 'float64'
+    return 'str'
+
+def _convert(value, column_type):
+    if value is None:
+        return None
+    if column_type == 'str':
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return value if isinstance(value, str) else str(value)
+    if column_type == 'float64':
+        return float(value)
+    if column_type == 'bool':
+        return bool(value)
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError('Not an integer: ' + repr(value))
+    return int(value)
+
+def _csv_value(text):
+    # CSV field -> int, float or str ('' -> None)
+    if text == '':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+class ColumnarWriter():
+    def __init__(self, path, columns = None, types = None, format = 'columnar', chunk_rows = CHUNK_ROWS):
+        """
+        Write rows (dicts) to typed column files, chunk by chunk.
+
+        At most chunk_rows rows are held in memory; each full chunk is appended
+        to the files. The schema header (schema.json) is written on close and
+        not when the export failed (an exception in the with block), so a
+        directory without it is an unfinished export. A Parquet file is
+        written as <path>.part and renamed on success.
+
+        Parameters
+        ----------
+        path : output directory (format='columnar') or file (format='parquet')
+        columns : column names (None: the keys of the first row; keys missing
+            from a row are null, other keys are dropped)
+        types : { column: 'int64' | 'float64' | 'bool' | 'str' } (columns not
+            given are inferred from the values, and widened (int64 ->
+            float64 -> str) by rewriting the column when a later chunk
+            does not fit; lists and dicts are stored as JSON strings)
+        format : 'columnar' or 'parquet' (requires pyarrow)
+        chunk_rows : rows per chunk (and per Parquet row group)
+        """
+        if format not in ('columnar', 'parquet'):
+            raise ValueError('Unknown format:' + str(format) + ' (columnar or parquet)')
+        if format == 'parquet' and pyarrow is None:
+            raise ImportError('pyarrow is required for format=parquet')
+        self.path = path
+        self.format = format
+        self.columns = None if columns is None else list(columns)
+        self.types = dict(types or {})
+        self._fixed_types = set(self.types)
+        self._null_columns = set()     # inferred while all values were null
+        self.rows = 0
+        self._chunk_rows = chunk_rows
+        self._buffer = []
+        self._files = None
+        self._sizes = None
+        self._parquet = None
+        self._parquet_path = path + '.part'
+        self._closed = False
+        if format == 'columnar':
+            os.makedirs(path, exist_ok=True)
+            schema_path = os.path.join(path, SCHEMA_FILE)
+            if os.path.exists(schema_path):
+                os.remove(schema_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        if ex_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, row):
+        if self.columns is None:
+            self.columns = list(row)
+        self._buffer.append(row)
+        if len(self._buffer) >= self._chunk_rows:
+            self._flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+        return self
+
+    def _column_values(self, column, column_type):
+        values = []
+        for row in self._buffer:
+            try:
+                values.append(_convert(row.get(column), column_type))
+            except (TypeError, ValueError) as e:
+                raise ValueError('Column ' + column + ' (' + column_type + '): ' + str(e) + ' at row ' + str(self.rows + len(values)) + '; pass types to store it as another type') from None
+        return values
+
+    def _flush(self):
+        if len(self._buffer) == 0:
+            return
+        for index, column in enumerate(self.columns):
+            if column in self._fixed_types:
+                continue
+            chunk_type = _infer_type(row.get(column) for row in self._buffer)
+            current = self.types.get(column)
+            if current is None:
+                self.types[column] = chunk_type or 'str'
+                if chunk_type is None:
+                    self._null_columns.add(column)
+            elif chunk_type is not None:
+                new_type = chunk_type if column in self._null_columns else _wider_type(current, chunk_type)
+                self._null_columns.discard(column)
+                if new_type != current:
+                    self._retype(index, column, current, new_type)
+        if self.format == 'parquet':
+            self._flush_parquet()
+        else:
+            self._flush_columnar()
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def _open_files(self):
+        self._files = []
+        self._sizes = [0] * len(self.columns)
+        for index, column in enumerate(self.columns):
+            files = { 'data': open(os.path.join(self.path, 'c' + str(index) + '.data'), 'wb'),
+                'valid': open(os.path.join(self.path, 'c' + str(index) + '.valid'), 'wb') }
+            if self.types.setdefault(column, 'str') == 'str':
+                files['offsets'] = open(os.path.join(self.path, 'c' + str(index) + '.offsets'), 'wb')
+                files['offsets'].write(self._bytes(array('q', [0])))
+            self._files.append(files)
+
+    def _flush_columnar(self):
+        if self._files is None:
+            self._open_files()
+
+        for index, (column, files) in enumerate(zip(self.columns, self._files)):
+            column_type = self.types[column]
+            values = self._column_values(column, column_type)
+            files['valid'].write(bytes(0 if value is None else 1 for value in values))
+            if column_type == 'str':
+                offsets = array('q')
+                data = bytearray()
+                for value in values:
+                    if value is not None:
+                        data += value.encode('utf-8')
+                    offsets.append(self._sizes[index] + len(data))
+                self._sizes[index] += len(data)
+                files['data'].write(data)
+                files['offsets'].write(self._bytes(offsets))
+            else:
+                zero = 0.0 if column_type == 'float64' else 0
+                files['data'].write(self._bytes(array(COLUMN_TYPECODES[column_type], (zero if value is None else value for value in values))))
+
+    def _retype(self, index, column, old_type, new_type):
+        # rewrite the rows written so far as new_type, chunk by chunk
+        self.types[column] = new_type
+        if self.rows == 0:
+            return
+        if self.format == 'parquet':
+            self._retype_parquet()
+            return
+        files = self._files[index]
+        for file in files.values():
+            file.close()
+        base = os.path.join(self.path, 'c' + str(index))
+        typecode = COLUMN_TYPECODES[old_type]
+        itemsize = array(typecode).itemsize
+        size = 0
+        with open(base + '.valid', 'rb') as valid_file, open(base + '.data', 'rb') as data_file, \
+            open(base + '.data.tmp', 'wb') as data_out, open(base + '.offsets.tmp', 'wb') as offsets_out:
+            if new_type == 'str':
+                offsets_out.write(self._bytes(array('q', [0])))
+            while True:
+                valid = valid_file.read(self._chunk_rows)
+                if not valid:
+                    break
+                if old_type == 'str':
+                    # only all-null columns are retyped from str
+                    values = [None] * len(valid)
+                else:
+                    numbers = array(typecode)
+                    numbers.frombytes(data_file.read(len(valid) * itemsize))
+                    if _SWAP and itemsize > 1:
+                        numbers.byteswap()
+                    values = [(bool(value) if old_type == 'bool' else value) if ok else None for ok, value in zip(valid, numbers)]
+                values = [_convert(value, new_type) for value in values]
+                if new_type == 'str':
+                    offsets = array('q')
+                    data = bytearray()
+                    for value in values:
+                        if value is not None:
+                            data += value.encode('utf-8')
+                        offsets.append(size + len(data))
+                    size += len(data)
+                    data_out.write(data)
+                    offsets_out.write(self._bytes(offsets))
+                else:
+                    zero = 0.0 if new_type == 'float64' else 0
+                    data_out.write(self._bytes(array(COLUMN_TYPECODES[new_type], (zero if value is None else value for value in values))))
+        os.replace(base + '.data.tmp', base + '.data')
+        if new_type == 'str':
+            os.replace(base + '.offsets.tmp', base + '.offsets')
+        else:
+            os.remove(base + '.offsets.tmp')
+            if os.path.exists(base + '.offsets'):
+                os.remove(base + '.offsets')
+        files = { 'data': open(base + '.data', 'ab'), 'valid': open(base + '.valid', 'ab') }
+        if new_type == 'str':
+            files['offsets'] = open(base + '.offsets', 'ab')
+        self._files[index] = files
+        self._sizes[index] = size
+
+    def _retype_parquet(self):
+        # copy the row groups written so far to a new file with the widened schema
+        self._parquet.close()
+        schema = self._arrow_schema()
+        old_path = self._parquet_path
+        self._parquet_path = self.path + ('.part' if old_path.endswith('.tmp') else '.part.tmp')
+        self._parquet = pyarrow.parquet.ParquetWriter(self._parquet_path, schema)
+        for batch in pyarrow.parquet.ParquetFile(old_path).iter_batches(batch_size=self._chunk_rows):
+            arrays = [pyarrow.array([_convert(value, self.types.get(field.name, 'str')) for value in batch.column(i).to_pylist()], type=field.type)
+                for i, field in enumerate(schema)]
+            self._parquet.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        os.remove(old_path)
+
+    def _bytes(self, values):
+        if _SWAP and values.itemsize > 1:
+            values.byteswap()
+        return values.tobytes()
+
+    def _arrow_schema(self):
+        arrow_types = { 'int64': pyarrow.int64(), 'float64': pyarrow.float64(), 'bool': pyarrow.bool_(), 'str': pyarrow.string() }
+        return pyarrow.schema([(column, arrow_types[self.types.get(column, 'str')]) for column in self.columns])
+
+    def _flush_parquet(self):
+        schema = self._arrow_schema()
+        if self._parquet is None:
+            self._parquet = pyarrow.parquet.ParquetWriter(self._parquet_path, schema)
+        arrays = [pyarrow.array(self._column_values(column, self.types[column]), type=field.type) for column, field in zip(self.columns, schema)]
+        self._parquet.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+    def schema(self):
+        return { 'format': COLUMNAR_FORMAT, 'version': COLUMNAR_VERSION, 'rows': self.rows, 'byteorder': 'little',
+            'columns': [{ 'name': column, 'type': self.types.get(column, 'str'), 'file': 'c' + str(index) }
+                for index, column in enumerate(self.columns or [])] }
+
+    def close(self):
+        """Write the last chunk and the schema header. Returns the schema."""
+        if self._closed:
+            return self.schema()
+        self._flush()
+        self._closed = True
+        if self.format == 'parquet':
+            if self._parquet is None and self.columns is not None:
+                self._parquet = pyarrow.parquet.ParquetWriter(self._parquet_path, self._arrow_schema())
+            if self._parquet is not None:
+                self._parquet.close()
+                os.replace(self._parquet_path, self.path)
+            return self.schema()
+
+        if self._files is None and self.columns is not None:
+            self._open_files()
+        for files in self._files or []:
+            for file in files.values():
+                file.close()
+        schema = self.schema()
+        temp_path = os.path.join(self.path, SCHEMA_FILE + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(schema, file, indent=2)
+        os.replace(temp_path, os.path.join(self.path, SCHEMA_FILE))
+        return schema
+
+    def abort(self):
+        """Close the files of a failed export without the schema header (Parquet: remove the file)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._buffer = []
+        if self.format == 'parquet':
+            if self._parquet is not None:
+                self._parquet.close()
+                os.remove(self._parquet_path)
+            return
+        for files in self._files or []:
+            for file in files.values():
+                file.close()
+
+class StringColumn():
+    def __init__(self, offsets, data, valid):
+        """
+        str column over mapped files; values are decoded when accessed.
+        offsets (int64, rows + 1) and data (utf-8 bytes) are the raw views.
+        """
+        self.offsets = offsets
+        self.data = data
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not self.valid[index]:
+            return None
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class ColumnarReader():
+    def __init__(self, path):
+        """
+        Memory-mapped reader of a directory written by ColumnarWriter.
+
+        column(name) returns a zero-copy view of the mapped file: a memoryview
+        ('q', 'd' or 'B' format) of numbers, or a StringColumn. Null entries
+        read as 0 there; valid(name) is the null mask (1: not null).
+        numpy(name) returns the numbers as a read-only numpy array on the same
+        memory. Release the views before close().
+        """
+        with open(os.path.join(path, SCHEMA_FILE), encoding='utf-8') as file:
+            self.schema = json.load(file)
+        if self.schema.get('format') != COLUMNAR_FORMAT or self.schema.get('version') != COLUMNAR_VERSION:
+            raise ValueError('Not a ' + COLUMNAR_FORMAT + ' version ' + str(COLUMNAR_VERSION) + ' directory: ' + path)
+        self.path = path
+        self._columns = { column['name']: column for column in self.schema['columns'] }
+        self._maps = []
+        self._views = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def __len__(self):
+        return self.schema['rows']
+
+    @property
+    def columns(self):
+        return [column['name'] for column in self.schema['columns']]
+
+    @property
+    def types(self):
+        return { column['name']: column['type'] for column in self.schema['columns'] }
+
+    def _map(self, file_name, typecode):
+        key = (file_name, typecode)
+        view = self._views.get(key)
+        if view is not None:
+            return view
+        if _SWAP and typecode != 'B':
+            raise ValueError('Memory-mapped reads need a little-endian platform')
+        with open(os.path.join(self.path, file_name), 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                view = memoryview(b'').cast(typecode)
+            else:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(mapped)
+                view = memoryview(mapped).cast(typecode)
+        self._views[key] = view
+        return view
+
+    def valid(self, name):
+        return self._map(self._columns[name]['file'] + '.valid', 'B')
+
+    def column(self, name):
+        column = self._columns[name]
+        if column['type'] == 'str':
+            return StringColumn(self._map(column['file'] + '.offsets', 'q'), self._map(column['file'] + '.data', 'B'), self.valid(name))
+        return self._map(column['file'] + '.data', COLUMN_TYPECODES[column['type']])
+
+    def numpy(self, name):
+        if numpy is None:
+            raise ImportError('numpy is required for numpy()')
+        column = self._columns[name]
+        if column['type'] == 'str':
+            raise ValueError('str column: ' + name + ' (use column())')
+        dtypes = { 'int64': '<i8', 'float64': '<f8', 'bool': 'bool' }
+        return numpy.frombuffer(self._map(column['file'] + '.data', 'B'), dtype=dtypes[column['type']])
+
+    def iter_rows(self):
+        """Yield the rows as dicts (null: None)."""
+        names = self.columns
+        columns = [self.column(name) for name in names]
+        valid = [self.valid(name) for name in names]
+        bools = [self._columns[name]['type'] == 'bool' for name in names]
+        for index in range(len(self)):
+            row = {}
+            for name, column, mask, is_bool in zip(names, columns, valid, bools):
+                if not mask[index]:
+                    row[name] = None
+                else:
+                    value = column[index]
+                    row[name] = bool(value) if is_bool else value
+            yield row
+
+    def close(self):
+        # a view still used outside (e.g. a numpy array) keeps its map alive until it is freed
+        for view in self._views.values():
+            try:
+                view.release()
+            except BufferError:
+                pass
+        self._views = {}
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+        self._maps = []
+
+def write_columnar(rows, path, columns = None, types = None, format = 'columnar', chunk_rows = CHUNK_ROWS):
+    """Write an iterable of rows with a ColumnarWriter. Returns the schema."""
+    with ColumnarWriter(path, columns, types, format, chunk_rows) as writer:
+        writer.write_rows(rows)
+    return writer.schema()
+
+def read_columnar(path):
+    return ColumnarReader(path)
+
+def convert_csv(csv_path, path, types = None, format = 'columnar', chunk_rows = CHUNK_ROWS, encoding = 'utf-8'):
+    """
+    Convert a downloaded CSV (download_assessment_csv, query rows downloads)
+    into columns. Fields are read as int, float or str; empty fields are null.
+    """
+    with open(csv_path, newline='', encoding=encoding) as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return write_columnar([], path, [], types, format, chunk_rows)
+        rows = (dict(zip(header, (_csv_value(field) for field in fields))) for fields in reader)
+        return write_columnar(rows, path, header, types, format, chunk_rows)
+
+def export_assessment_sqls(sql_testing, assessment_id, path, types = None, format = 'columnar', query_parameters = None, chunk_rows = CHUNK_ROWS):
+    """
+    Stream the result rows of an assessment into columns, page by page.
+    Returns the schema.
+    """
+    sql_testing._logger.info('Export assessment SQLs: ' + assessment_id + ' to ' + path)
+    with ColumnarWriter(path, None, types, format, chunk_rows) as writer:
+        for page in sql_testing.iter_assessment_sqls(assessment_id, query_parameters=query_parameters, pages=True):
+            writer.write_rows(page)
+    return writer.schema()
+
+def export_assessment_sql_query_rows(sql_testing, assessment_id, assessment_row_id, path, types = None, format = 'columnar', chunk_rows = CHUNK_ROWS):
+    """Stream the query rows (target DB) of an assessment result row into columns."""
+    sql_testing._logger.info('Export assessment SQL query rows: ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ') to ' + path)
+    with ColumnarWriter(path, None, types, format, chunk_rows) as writer:
+        for page in sql_testing.iter_assessment_sql_query_rows(assessment_id, assessment_row_id, pages=True):
+            writer.write_rows(page)
+    return writer.schema()
+
+def export_assessment_sql_cmp_query_rows(sql_testing, assessment_id, assessment_row_id, path, types = None, format = 'columnar', chunk_rows = CHUNK_ROWS):
+    """Stream the query rows (compare DB) of an assessment result row into columns."""
+    sql_testing._logger.info('Export assessment SQL query rows(cmp): ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ') to ' + path)
+    with ColumnarWriter(path, None, types, format, chunk_rows) as writer:
+        for page in sql_testing.iter_assessment_sql_cmp_query_rows(assessment_id, assessment_row_id, pages=True):
+            writer.write_rows(page)
+    return writer.schema()
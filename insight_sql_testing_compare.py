@@ -0,0 +1,338 @@
+import csv
+import hashlib
+import math
+import sys
+from collections.abc import Mapping
+from decimal import Decimal, InvalidOperation
+
+# Differing rows reported in detail
+MAX_DIFFERENCES = 10
+
+# Unmatched rows per side re-read to pair numbers across epsilon bucket boundaries (unordered)
+MAX_TOLERANCE_ROWS = 10000
+
+# Comparison levels of execute_assessment; 'STRICT' is exact, these skip the check
+IGNORED_LEVELS = ('NONE', 'IGNORE', 'UNORDERED')
+
+class QueryRowsComparison():
+    def __init__(self):
+        self.tgt_rows = 0
+        self.cmp_rows = 0
+        self.tgt_header = None
+        self.cmp_header = None
+        self.header_equal = True
+        self.difference_count = 0
+        # ordered: { 'index', 'tgt', 'cmp' }, unordered: { 'row', 'tgt_count', 'cmp_count' }
+        self.differences = []
+
+    @property
+    def equal(self):
+        return self.header_equal and self.difference_count == 0
+
+    def __str__(self):
+        text = ('equal' if self.equal else 'different') + ': tgt rows=' + str(self.tgt_rows) + ', cmp rows=' + str(self.cmp_rows)
+        text += ', differing rows=' + str(self.difference_count)
+        if not self.header_equal:
+            text += '\n    header: ' + str(self.tgt_header) + ' <> ' + str(self.cmp_header)
+        for difference in self.differences:
+            text += '\n    ' + str(difference)
+        return text
+
+class _Normalizer():
+    def __init__(self, epsilon, trim_char):
+        self._epsilon = None if epsilon is None else Decimal(str(epsilon))
+        self._trim_char = trim_char
+
+    def value(self, value):
+        if isinstance(value, str):
+            if self._trim_char:
+                # CHAR columns are blank-padded
+                value = value.rstrip(' ')
+            if self._epsilon is not None:
+                try:
+                    return Decimal(value)
+                except InvalidOperation:
+                    pass
+            return value
+        if self._epsilon is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+            if isinstance(value, float) and not math.isfinite(value):
+                return value
+            return Decimal(str(value))
+        return value
+
+    def row(self, row):
+        return tuple(self.value(v) for v in row)
+
+    def values_equal(self, tgt, cmp):
+        if self._epsilon is not None and isinstance(tgt, Decimal) and isinstance(cmp, Decimal):
+            return abs(tgt - cmp) <= self._epsilon
+        return tgt == cmp
+
+    def rows_equal(self, tgt, cmp):
+        return len(tgt) == len(cmp) and all(self.values_equal(t, c) for t, c in zip(tgt, cmp))
+
+    def bucket(self, value):
+        if self._epsilon > 0:
+            return int((value / self._epsilon).to_integral_value())
+        # same number regardless of the exponent (1.0 and 1)
+        return value.normalize()
+
+    def fingerprint(self, row):
+        # numbers are bucketed to multiples of epsilon to be hashable with the tolerance
+        if self._epsilon is not None:
+            row = tuple(self.bucket(v) if isinstance(v, Decimal) and v.is_finite() else v for v in row)
+        digest = hashlib.blake2b(repr(row).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    @property
+    def tolerant(self):
+        # values within epsilon may fall into neighbouring buckets
+        return self._epsilon is not None and self._epsilon > 0
+
+    @property
+    def epsilon(self):
+        return self._epsilon
+
+    def tolerance_key(self, row):
+        # (non-numeric values, first number): rows within epsilon share the first and are near in the second
+        first = None
+        values = []
+        for v in row:
+            if isinstance(v, Decimal) and v.is_finite():
+                if first is None:
+                    first = v
+                values.append(None)
+            else:
+                values.append(v)
+        return repr(values), first
+
+def _reiterable(source):
+    # callables and containers can be read again; iterators and generators cannot
+    return callable(source) or iter(source) is not source
+
+def _match_within_tolerance(normalizer, counts, tgt_rows, cmp_rows):
+    """
+    Pair rows left unmatched by the bucket fingerprints whose numbers are
+    within epsilon across a bucket boundary (e.g. 0.0149 and 0.0151 with
+    epsilon=0.01), so unordered matching agrees with the STRICT comparison.
+
+    The rows in the buckets around the unmatched ones are read again and
+    re-matched in sorted order of their first number, per group of equal
+    non-numeric values. Nothing changes when more than MAX_TOLERANCE_ROWS
+    rows per side would be held.
+    """
+    def rows_of(source):
+        for row in _rows_with_header(_open_rows(source))[1]:
+            normalized = normalizer.row(row)
+            values, first = normalizer.tolerance_key(normalized)
+            if first is not None:
+                yield normalizer.fingerprint(normalized), values, first, normalized
+
+    # buckets of the unmatched rows (the first |count| rows of each fingerprint)
+    near = set()
+    for source, sign in ((tgt_rows, 1), (cmp_rows, -1)):
+        remaining = { fingerprint: count * sign for fingerprint, count in counts.items() if count * sign > 0 }
+        if sum(remaining.values()) > MAX_TOLERANCE_ROWS:
+            return
+        for fingerprint, values, first, _ in rows_of(source) if remaining else ():
+            if remaining.get(fingerprint, 0) > 0:
+                remaining[fingerprint] -= 1
+                bucket = normalizer.bucket(first)
+                near.update((values, bucket + delta) for delta in (-1, 0, 1))
+    if not near:
+        return
+
+    # every row of those buckets, matched again from scratch
+    groups = {}
+    for side, source in enumerate((tgt_rows, cmp_rows)):
+        held = 0
+        for fingerprint, values, first, row in rows_of(source):
+            if (values, normalizer.bucket(first)) in near:
+                held += 1
+                if held > MAX_TOLERANCE_ROWS:
+                    return
+                groups.setdefault(values, ([], []))[side].append((first, fingerprint, row))
+    for tgt_group, cmp_group in groups.values():
+        for _, fingerprint, _ in tgt_group:
+            counts[fingerprint] = counts.get(fingerprint, 0) - 1
+        for _, fingerprint, _ in cmp_group:
+            counts[fingerprint] = counts.get(fingerprint, 0) + 1
+        tgt_group.sort(key=lambda item: item[0])
+        cmp_group.sort(key=lambda item: item[0])
+        matched = [False] * len(cmp_group)
+        low = 0
+        for first, tgt_fingerprint, tgt in tgt_group:
+            while low < len(cmp_group) and (matched[low] or cmp_group[low][0] < first - normalizer.epsilon):
+                low += 1
+            for i in range(low, len(cmp_group)):
+                if cmp_group[i][0] > first + normalizer.epsilon:
+                    i = None
+                    break
+                if not matched[i] and normalizer.rows_equal(tgt, cmp_group[i][2]):
+                    matched[i] = True
+                    break
+            else:
+                i = None
+            if i is None:
+                counts[tgt_fingerprint] += 1
+        for (_, fingerprint, _), done in zip(cmp_group, matched):
+            if not done:
+                counts[fingerprint] -= 1
+    for fingerprint in [fingerprint for fingerprint, count in counts.items() if count == 0]:
+        del counts[fingerprint]
+
+def _rows_with_header(rows):
+    # (header, iterator of value lists); dict rows give their keys as the header
+    iterator = iter(rows)
+    for first in iterator:
+        if isinstance(first, Mapping):
+            header = list(first.keys())
+            def values():
+                yield [first.get(k) for k in header]
+                for row in iterator:
+                    yield [row.get(k) for k in header]
+            return header, values()
+        def values():
+            yield first
+            yield from iterator
+        return None, values()
+    return None, iter(())
+
+def _open_rows(source):
+    return source() if callable(source) else source
+
+def _compare_headers(comparison, level):
+    tgt, cmp = comparison.tgt_header, comparison.cmp_header
+    if level in IGNORED_LEVELS or tgt is None or cmp is None:
+        return
+    if level == 'STRICT':
+        comparison.header_equal = list(tgt) == list(cmp)
+    else:
+        # looser levels: same column names regardless of case and order
+        comparison.header_equal = sorted(str(h).lower() for h in tgt) == sorted(str(h).lower() for h in cmp)
+
+def compare_query_rows(tgt_rows, cmp_rows, epsilon = None, trim_char = False,
+    header_comparison_level = 'STRICT', order_comparison_level = 'STRICT',
+    max_differences = MAX_DIFFERENCES, tgt_header = None, cmp_header = None):
+    """
+    Compare the query rows of the target DB and the compare DB without holding both sides.
+
+    Parameters
+    ----------
+    tgt_rows, cmp_rows : iterables of rows (lists, or dicts whose keys are the
+        header), or zero-argument callables returning such iterables
+    epsilon : numeric values within epsilon are equal (None: exact)
+    trim_char : ignore trailing blanks of strings (CHAR padding)
+    header_comparison_level : 'STRICT' (same names, same order), 'NONE' or
+        'IGNORE' (not compared); other levels compare the names regardless of
+        case and order
+    order_comparison_level : 'STRICT' compares rows position by position while
+        streaming both sides together; any other level matches rows
+        by hash, keeping one 64-bit fingerprint count per distinct row
+        (numbers are bucketed to multiples of epsilon for hashing; rows left
+        unmatched are re-read and paired within epsilon across bucket
+        boundaries when the sources are callables or lists and at most
+        MAX_TOLERANCE_ROWS rows per side are unmatched)
+    max_differences : differing rows reported in detail
+        (unordered: the sample rows are collected by a second pass when
+        tgt_rows/cmp_rows are callables or lists)
+    tgt_header, cmp_header : headers when the rows are lists
+
+    Returns
+    -------
+    QueryRowsComparison
+    """
+    normalizer = _Normalizer(epsilon, trim_char)
+    comparison = QueryRowsComparison()
+    found_tgt_header, tgt_values = _rows_with_header(_open_rows(tgt_rows))
+    found_cmp_header, cmp_values = _rows_with_header(_open_rows(cmp_rows))
+    comparison.tgt_header = tgt_header if tgt_header is not None else found_tgt_header
+    comparison.cmp_header = cmp_header if cmp_header is not None else found_cmp_header
+    _compare_headers(comparison, header_comparison_level)
+
+    if order_comparison_level == 'STRICT':
+        missing = object()
+        index = 0
+        while True:
+            tgt = next(tgt_values, missing)
+            cmp = next(cmp_values, missing)
+            if tgt is missing and cmp is missing:
+                break
+            if tgt is not missing:
+                comparison.tgt_rows += 1
+            if cmp is not missing:
+                comparison.cmp_rows += 1
+            if tgt is missing or cmp is missing or not normalizer.rows_equal(normalizer.row(tgt), normalizer.row(cmp)):
+                comparison.difference_count += 1
+                if len(comparison.differences) < max_differences:
+                    comparison.differences.append({ 'index': index,
+                        'tgt': None if tgt is missing else list(tgt), 'cmp': None if cmp is missing else list(cmp) })
+            index += 1
+        return comparison
+
+    # unordered: +1 per tgt row, -1 per cmp row
+    counts = {}
+    for row in tgt_values:
+        comparison.tgt_rows += 1
+        fingerprint = normalizer.fingerprint(normalizer.row(row))
+        counts[fingerprint] = counts.get(fingerprint, 0) + 1
+    for row in cmp_values:
+        comparison.cmp_rows += 1
+        fingerprint = normalizer.fingerprint(normalizer.row(row))
+        count = counts.get(fingerprint, 0) - 1
+        if count == 0:
+            del counts[fingerprint]
+        else:
+            counts[fingerprint] = count
+    if counts and normalizer.tolerant and _reiterable(tgt_rows) and _reiterable(cmp_rows):
+        _match_within_tolerance(normalizer, counts, tgt_rows, cmp_rows)
+    comparison.difference_count = sum(abs(count) for count in counts.values())
+
+    # sample rows of the first differing fingerprints
+    samples = {}
+    for fingerprint, count in counts.items():
+        if len(samples) >= max_differences:
+            break
+        samples[fingerprint] = { 'row': None, 'tgt_count': max(count, 0), 'cmp_count': max(-count, 0) }
+    for source, count_key in ((tgt_rows, 'tgt_count'), (cmp_rows, 'cmp_count')):
+        if not _reiterable(source) or all(sample['row'] is not None for sample in samples.values()):
+            continue
+        for row in _rows_with_header(_open_rows(source))[1]:
+            sample = samples.get(normalizer.fingerprint(normalizer.row(row)))
+            if sample is not None and sample['row'] is None and sample[count_key] > 0:
+                sample['row'] = list(row)
+    comparison.differences = list(samples.values())
+    return comparison
+
+def _csv_rows(file_name, encoding):
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+    with open(file_name, newline='', encoding=encoding) as file:
+        yield from csv.reader(file)
+
+def _csv_header(file_name, encoding):
+    for row in _csv_rows(file_name, encoding):
+        return row
+    return None
+
+def _csv_data(file_name, encoding):
+    rows = _csv_rows(file_name, encoding)
+    next(rows, None)
+    return rows
+
+def compare_query_rows_csv(tgt_file_name, cmp_file_name, encoding = 'utf-8', **options):
+    """
+    Compare two query rows csv files (download_assessment_sql_query_rows /
+    download_assessment_sql_cmp_query_rows). The first line is the header.
+    See compare_query_rows for the options.
+    """
+    return compare_query_rows(lambda: _csv_data(tgt_file_name, encoding), lambda: _csv_data(cmp_file_name, encoding),
+        tgt_header=_csv_header(tgt_file_name, encoding), cmp_header=_csv_header(cmp_file_name, encoding), **options)
+
+def compare_assessment_sql_query_rows(sql_testing, assessment_id, assessment_row_id, **options):
+    """
+    Stream the tgt and cmp query rows of an assessment row from the DT Manager
+    and compare them. See compare_query_rows for the options.
+    """
+    sql_testing._logger.info('Compare assessment SQL query rows: ' + assessment_id + ' (assessment_row_id=' + str(assessment_row_id) + ')')
+    return compare_query_rows(lambda: sql_testing.iter_assessment_sql_query_rows(assessment_id, assessment_row_id),
+        lambda: sql_testing.iter_assessment_sql_cmp_query_rows(assessment_id, assessment_row_id), **options)
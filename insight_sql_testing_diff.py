@@ -0,0 +1,249 @@
+import hashlib
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+from logging import getLogger
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from insight_sql_testing import RESULT_CODES, RESULT_ID_KEY, RESULT_CODE_KEY, RESULT_SQL_HASH_KEY, RESULT_SQL_TEXT_KEY, RESULT_ELAPSED_KEY
+
+SUCCESS = 0
+
+# Changes kept in detail by diff_assessments (per kind); the rest is counted
+MAX_DIFF_ITEMS = 1000
+# Largest elapsed-time increases kept by diff_assessments
+MAX_SLOWDOWNS = 100
+# Base rows sorted at a time without numpy (sorted runs are merged)
+SORT_CHUNK_ROWS = 1 << 18
+
+def _code(row):
+    code = row.get(RESULT_CODE_KEY)
+    return -1 if code is None else int(code)
+
+def _sort_fingerprints(fingerprints):
+    # (sorted fingerprints, their positions in run order) as arrays; stable
+    if numpy is not None:
+        values = numpy.frombuffer(fingerprints, dtype=numpy.uint64) if len(fingerprints) else numpy.empty(0, numpy.uint64)
+        order = numpy.argsort(values, kind='stable')
+        sorted_fingerprints = array('Q')
+        sorted_fingerprints.frombytes(values[order].tobytes())
+        positions = array('Q')
+        positions.frombytes(order.astype(numpy.uint64).tobytes())
+        return sorted_fingerprints, positions
+
+    # sort chunks of (fingerprint, position) and merge the packed runs
+    runs = []
+    for start in range(0, len(fingerprints), SORT_CHUNK_ROWS):
+        chunk = sorted((fingerprints[i], i) for i in range(start, min(start + SORT_CHUNK_ROWS, len(fingerprints))))
+        runs.append((array('Q', (fingerprint for fingerprint, _ in chunk)), array('Q', (i for _, i in chunk))))
+        del chunk
+    sorted_fingerprints = array('Q')
+    positions = array('Q')
+    for fingerprint, i in heapq.merge(*[zip(run_fingerprints, run_positions) for run_fingerprints, run_positions in runs]):
+        sorted_fingerprints.append(fingerprint)
+        positions.append(i)
+    return sorted_fingerprints, positions
+
+def _elapsed(row):
+    try:
+        return float(row[RESULT_ELAPSED_KEY])
+    except (KeyError, TypeError, ValueError):
+        return math.nan
+
+class _RowKeys():
+    # identity of a result row across two runs
+    def __init__(self, key):
+        if key not in ('sql_hash', 'row'):
+            raise ValueError('Unknown key:' + str(key) + ' (sql_hash or row)')
+        self._key = key
+
+    def label(self, row):
+        if self._key == 'row':
+            return str(row.get(RESULT_ID_KEY))
+        sql_hash = row.get(RESULT_SQL_HASH_KEY)
+        return str(sql_hash) if sql_hash else str(row.get(RESULT_SQL_TEXT_KEY))
+
+    def fingerprint(self, row):
+        # 64-bit hash of the label; repeated labels are told apart by their order in the run
+        digest = hashlib.blake2b(self.label(row).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+class _BaseRun():
+    # fingerprint, result code, elapsed time and row id of each base row, sorted by fingerprint
+    def __init__(self, rows, keys):
+        fingerprints = array('Q')
+        codes = array('b')
+        elapsed = array('d')
+        ids = array('q')
+        for row in rows:
+            fingerprints.append(keys.fingerprint(row))
+            codes.append(_code(row))
+            elapsed.append(_elapsed(row))
+            row_id = row.get(RESULT_ID_KEY)
+            if isinstance(ids, array):
+                try:
+                    ids.append(row_id)
+                    continue
+                except (TypeError, OverflowError):
+                    ids = list(ids)     # ids are not 64-bit ints
+            ids.append(row_id)
+
+        # stable: rows with the same fingerprint stay in run order
+        self.fingerprints, positions = _sort_fingerprints(fingerprints)
+        del fingerprints
+        self.codes = array('b', (codes[i] for i in positions))
+        self.elapsed = array('d', (elapsed[i] for i in positions))
+        self.ids = array('q', (ids[i] for i in positions)) if isinstance(ids, array) else [ids[i] for i in positions]
+        # run position -> sorted index, to report removed rows in run order
+        self._indexes = array('Q', bytes(8 * len(positions)))
+        for index, position in enumerate(positions):
+            self._indexes[position] = index
+        self.matched = bytearray(len(positions))
+        self._taken = array('Q', bytes(8 * len(positions)))   # per group of equal fingerprints, at its first index
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def match(self, fingerprint):
+        # index of the next unmatched base row with this fingerprint, or None
+        first = bisect_left(self.fingerprints, fingerprint)
+        if first == len(self.fingerprints) or self.fingerprints[first] != fingerprint:
+            return None
+        index = first + self._taken[first]
+        if index == len(self.fingerprints) or self.fingerprints[index] != fingerprint:
+            return None
+        self._taken[first] += 1
+        self.matched[index] = 1
+        return index
+
+    def unmatched(self):
+        # indexes of the base rows not matched, in run order
+        for index in self._indexes:
+            if not self.matched[index]:
+                yield index
+
+def iter_assessment_diff(sql_testing, base_assessment_id, new_assessment_id, key = 'sql_hash', query_parameters = None, unchanged = False):
+    """
+    Stream the differences between two runs of an assessment.
+
+    The base run is read first and only a 64-bit fingerprint, the result code,
+    the elapsed time and the row id per row are kept (in sorted arrays); the
+    new run is then streamed and compared row by row.
+
+    Parameters
+    ----------
+    key : 'sql_hash' (the n-th execution of a SQL hash matches the n-th one of
+        the other run) or 'row' (result row id)
+    unchanged : also yield rows whose result code did not change
+
+    Yields
+    ------
+    dict with kind ('regression': Success -> failure, 'fix': failure -> Success,
+    'changed': another code change, 'unchanged', 'added': only in the new run,
+    'removed': only in the base run), key (None for 'removed' with
+    key='sql_hash'), baseId (id of the base row, None for 'added'), baseCode,
+    newCode, baseElapsed, newElapsed, elapsedDelta and the new row (None for
+    'removed').
+    """
+    keys = _RowKeys(key)
+    base = _BaseRun(sql_testing.iter_assessment_sqls(base_assessment_id, query_parameters=query_parameters), keys)
+
+    for row in sql_testing.iter_assessment_sqls(new_assessment_id, query_parameters=query_parameters):
+        index = base.match(keys.fingerprint(row))
+        new_code = _code(row)
+        new_elapsed = _elapsed(row)
+        if index is None:
+            yield { 'kind': 'added', 'key': keys.label(row), 'baseId': None, 'baseCode': None, 'newCode': new_code,
+                'baseElapsed': None, 'newElapsed': new_elapsed, 'elapsedDelta': None, 'row': row }
+            continue
+
+        base_code = base.codes[index]
+        if base_code == new_code:
+            if not unchanged:
+                continue
+            kind = 'unchanged'
+        elif base_code == SUCCESS:
+            kind = 'regression'
+        elif new_code == SUCCESS:
+            kind = 'fix'
+        else:
+            kind = 'changed'
+        yield { 'kind': kind, 'key': keys.label(row), 'baseId': base.ids[index], 'baseCode': base_code, 'newCode': new_code,
+            'baseElapsed': base.elapsed[index], 'newElapsed': new_elapsed,
+            'elapsedDelta': new_elapsed - base.elapsed[index], 'row': row }
+
+    for index in base.unmatched():
+        base_id = base.ids[index]
+        yield { 'kind': 'removed', 'key': str(base_id) if key == 'row' else None, 'baseId': base_id,
+            'baseCode': base.codes[index], 'newCode': None,
+            'baseElapsed': base.elapsed[index], 'newElapsed': None, 'elapsedDelta': None, 'row': None }
+
+class AssessmentDiff():
+    def __init__(self, base_assessment_id, new_assessment_id, max_items = MAX_DIFF_ITEMS, max_slowdowns = MAX_SLOWDOWNS):
+        self.base_assessment_id = base_assessment_id
+        self.new_assessment_id = new_assessment_id
+        self.counts = { 'regression': 0, 'fix': 0, 'changed': 0, 'unchanged': 0, 'added': 0, 'removed': 0 }
+        self.regressions = []
+        self.fixes = []
+        self.changed = []
+        self.matched = 0
+        self.base_elapsed_total = 0.0
+        self.new_elapsed_total = 0.0
+        self._max_items = max_items
+        self._max_slowdowns = max_slowdowns
+        self._slowdowns = []    # min-heap of (elapsedDelta, sequence, item)
+
+    def add(self, item):
+        kind = item['kind']
+        self.counts[kind] += 1
+        details = { 'regression': self.regressions, 'fix': self.fixes, 'changed': self.changed }.get(kind)
+        if details is not None and len(details) < self._max_items:
+            details.append(item)
+
+        delta = item['elapsedDelta']
+        if delta is not None and not math.isnan(delta):
+            self.matched += 1
+            self.base_elapsed_total += item['baseElapsed']
+            self.new_elapsed_total += item['newElapsed']
+            if delta > 0:
+                entry = (delta, self.matched, item)
+                if len(self._slowdowns) < self._max_slowdowns:
+                    heapq.heappush(self._slowdowns, entry)
+                elif delta > self._slowdowns[0][0]:
+                    heapq.heapreplace(self._slowdowns, entry)
+
+    def slowdowns(self):
+        # largest elapsed-time increases first
+        return [item for _, _, item in sorted(self._slowdowns, key=lambda entry: (-entry[0], entry[1]))]
+
+    def __str__(self):
+        text = 'Assessment diff: ' + self.base_assessment_id + ' -> ' + self.new_assessment_id + '\n'
+        for kind, count in self.counts.items():
+            text += '    ' + kind + ': ' + str(count) + '\n'
+        text += '    elapsed (matched rows): ' + str(self.base_elapsed_total) + ' -> ' + str(self.new_elapsed_total)
+        for item in self.regressions[:10]:
+            text += '\n    regression: ' + item['key'] + ' ' + RESULT_CODES.get(item['baseCode'], str(item['baseCode'])) + ' -> ' + RESULT_CODES.get(item['newCode'], str(item['newCode']))
+        return text
+
+def diff_assessments(sql_testing, base_assessment_id, new_assessment_id, key = 'sql_hash', query_parameters = None,
+    max_items = MAX_DIFF_ITEMS, max_slowdowns = MAX_SLOWDOWNS, upper_logger = None):
+    """
+    Compare two runs of an assessment (see iter_assessment_diff).
+
+    Returns
+    -------
+    AssessmentDiff with the count of each kind of change, the first max_items
+    regressions/fixes/changes, elapsed-time totals of the matched rows and the
+    max_slowdowns largest elapsed-time increases.
+    """
+    logger = upper_logger or getLogger(__name__)
+    logger.info('Diff assessments: ' + base_assessment_id + ' -> ' + new_assessment_id + ' (key=' + key + ')')
+    diff = AssessmentDiff(base_assessment_id, new_assessment_id, max_items, max_slowdowns)
+    for item in iter_assessment_diff(sql_testing, base_assessment_id, new_assessment_id, key, query_parameters, unchanged=True):
+        diff.add(item)
+    return diff
@@ -0,0 +1,141 @@
+import concurrent.futures
+import datetime
+from logging import getLogger
+
+from insight_sql_testing import RESULT_CODES
+
+# Format of the start/end (and sql_start_time_begin/end) parameters of execute_assessment
+WINDOW_TIME_FORMAT = '%Y%m%d%H%M%S'
+
+def plan_shards(target_db_ids, begin, end, shards = None, window = 'start_end', time_format = WINDOW_TIME_FORMAT):
+    """
+    Split [begin, end] into consecutive time windows, one assessment per window,
+    assigned round-robin to the target DBs.
+
+    Parameters
+    ----------
+    target_db_ids : cloned target DBs to run the shards on
+    begin, end : datetime range covering the SQL-workload
+    shards : number of windows (None: one per target DB)
+    window : 'start_end' (start/end parameters) or 'sql_start_time'
+        (sql_start_time_begin/sql_start_time_end parameters)
+
+    Returns
+    -------
+    [{ index, target_db_id, begin, end, parameters }] where parameters are the
+    execute_assessment keyword arguments of the window. Windows do not overlap:
+    each one ends one second before the next one begins.
+    """
+    if window not in ('start_end', 'sql_start_time'):
+        raise ValueError('Unknown window:' + str(window) + ' (start_end or sql_start_time)')
+    if len(target_db_ids) == 0:
+        raise ValueError('No target DB.')
+    shards = len(target_db_ids) if shards is None else shards
+    seconds = int((end - begin).total_seconds()) + 1
+    shards = max(1, min(shards, seconds))
+    begin_key, end_key = ('start', 'end') if window == 'start_end' else ('sql_start_time_begin', 'sql_start_time_end')
+
+    plan = []
+    for index in range(shards):
+        shard_begin = begin + datetime.timedelta(seconds=seconds * index // shards)
+        shard_end = begin + datetime.timedelta(seconds=seconds * (index + 1) // shards - 1)
+        plan.append({ 'index': index, 'target_db_id': target_db_ids[index % len(target_db_ids)],
+            'begin': shard_begin, 'end': shard_end,
+            'parameters': { begin_key: shard_begin.strftime(time_format), end_key: shard_end.strftime(time_format) } })
+    return plan
+
+class FanOutReport():
+    def __init__(self, assessment_name, plan):
+        """
+        Shards of one logical assessment.
+
+        shards: the plan entries with assessment_id, info (the finished
+        assessment) and error added.
+        """
+        self.assessment_name = assessment_name
+        self.shards = [dict(shard, assessment_id=None, info=None, error=None) for shard in plan]
+
+    @property
+    def failed_shards(self):
+        return [shard for shard in self.shards if shard['error'] is not None]
+
+    def result_code_counts(self):
+        # summary.allCode summed over the finished shards
+        counts = [0] * len(RESULT_CODES)
+        for shard in self.shards:
+            if shard['info'] is None:
+                continue
+            all_code = shard['info'].get('summary', {}).get('allCode') or []
+            if len(all_code) > len(counts):
+                counts.extend([0] * (len(all_code) - len(counts)))
+            for code, count in enumerate(all_code):
+                counts[code] += count
+        return counts
+
+    def summary(self):
+        return { 'allCode': self.result_code_counts() }
+
+    def iter_rows(self, sql_testing, query_parameters = None):
+        """Yield (shard, result row) of every finished shard, shard by shard."""
+        for shard in self.shards:
+            if shard['info'] is None:
+                continue
+            for row in sql_testing.iter_assessment_sqls(shard['assessment_id'], query_parameters=query_parameters):
+                yield shard, row
+
+    def __str__(self):
+        text = 'Fan-out assessment: ' + self.assessment_name + ' (' + str(len(self.shards)) + ' shards, failed: ' + str(len(self.failed_shards)) + ')'
+        for code, count in enumerate(self.result_code_counts()):
+            text += '\n    ' + RESULT_CODES.get(code, str(code)).rjust(24) + ':' + str(count)
+        for shard in self.shards:
+            text += '\n    shard ' + str(shard['index']) + ' ' + str(shard['assessment_id']) + ' on ' + str(shard['target_db_id'])
+            text += ': ' + shard['begin'].strftime('%Y-%m-%d %H:%M:%S') + ' - ' + shard['end'].strftime('%Y-%m-%d %H:%M:%S')
+            if shard['error'] is not None:
+                text += ' FAILED ' + shard['error']
+        return text
+
+def fan_out_assessment(sql_testing, assessment_name, sql_workload_id, db_users, db_user_passwords, target_db_ids,
+    begin, end, shards = None, window = 'start_end', timeout = None, upper_logger = None, **assessment_options):
+    """
+    Run a SQL-workload as several assessments at the same time, one per time
+    window (see plan_shards), against several cloned target DBs, and merge them.
+
+    Each shard is an execute_assessment(..., wait=False) named
+    <assessment_name>_<shard index>; the other keyword arguments
+    (cmp_source_db_id, concurrency, ...) are passed to every shard.
+    All shards are waited on together by the client's job poller.
+
+    Returns
+    -------
+    FanOutReport (merged summary.allCode, per-shard assessments and errors)
+    """
+    logger = upper_logger or getLogger(__name__)
+    plan = plan_shards(target_db_ids, begin, end, shards, window)
+    report = FanOutReport(assessment_name, plan)
+    logger.info('Fan out an assessment: ' + assessment_name + ' (' + str(len(plan)) + ' shards on ' + str(len(set(target_db_ids))) + ' target DBs)')
+
+    jobs = {}
+    for shard in report.shards:
+        options = dict(assessment_options, **shard['parameters'])
+        try:
+            job = sql_testing.execute_assessment(assessment_name + '_' + str(shard['index']), sql_workload_id, db_users, db_user_passwords,
+                target_db_id=shard['target_db_id'], wait=False, **options)
+        except Exception as e:
+            job = None
+            shard['error'] = repr(e)
+        if job is None:
+            shard['error'] = shard['error'] or 'not created'
+            continue
+        shard['assessment_id'] = job.id
+        jobs[job] = shard
+
+    done, not_done = concurrent.futures.wait(list(jobs), timeout)
+    for job in done:
+        try:
+            jobs[job]['info'] = job.result()
+        except Exception as e:
+            jobs[job]['error'] = repr(e)
+    for job in not_done:
+        jobs[job]['error'] = 'not finished in ' + str(timeout) + ' seconds'
+    logger.info(str(report))
+    return report
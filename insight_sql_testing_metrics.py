@@ -0,0 +1,191 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+METRIC_PREFIX = 'insight_sql_testing'
+
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F-]{8,}|.*\d.*\d.*\d.*)$')
+
+def endpoint_template(api):
+    """
+    Endpoint of an api path with ids replaced, e.g.
+    'assessments/5f1e.../results/12/queryRows?limit=20' -> 'assessments/{id}/results/{id}/queryRows'
+    """
+    path = api.split('?', 1)[0]
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+def request_event(method, api, status, latency, bytes_sent = 0, bytes_received = 0, retries = 0, error = None):
+    # the dict passed to request hooks
+    query = parse_qs(api.split('?', 1)[1]) if '?' in api else {}
+    page = None
+    if 'offset' in query and 'limit' in query:
+        try:
+            page = int(query['offset'][0]) // max(1, int(query['limit'][0]))
+        except ValueError:
+            pass
+    return { 'method': method, 'endpoint': endpoint_template(api), 'api': api, 'status': status, 'latency': latency,
+        'bytesSent': bytes_sent, 'bytesReceived': bytes_received, 'retries': retries, 'page': page,
+        'error': None if error is None else repr(error) }
+
+def call_request_hooks(hooks, event, logger):
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception as e:
+            logger.warning('Request hook failed: ' + repr(e))
+
+class _EndpointStats():
+    def __init__(self, buckets):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.max_page = None
+        self.bucket_counts = [0] * len(buckets)
+        self.statuses = {}
+
+    def add(self, event, buckets):
+        self.requests += 1
+        status = event['status']
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status != 200 and status != 206:
+            self.errors += 1
+        self.retries += event['retries']
+        self.bytes_sent += event['bytesSent']
+        self.bytes_received += event['bytesReceived']
+        latency = event['latency']
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        for i, bound in enumerate(buckets):
+            if latency <= bound:
+                self.bucket_counts[i] += 1
+                break
+        page = event.get('page')
+        if page is not None and (self.max_page is None or page > self.max_page):
+            self.max_page = page
+
+class RequestMetrics():
+    def __init__(self, buckets = LATENCY_BUCKETS):
+        """
+        Request hook (InsightSQLTesting request_hooks) that aggregates the
+        requests per method and endpoint: counts, errors, retries, bytes,
+        latency histogram and the deepest page of paged endpoints.
+        """
+        self._buckets = tuple(buckets)
+        self._endpoints = {}    # (method, endpoint) -> _EndpointStats
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def __call__(self, event):
+        key = (event['method'], event['endpoint'])
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = _EndpointStats(self._buckets)
+            stats.add(event, self._buckets)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """Per endpoint totals, slowest (by total latency) first."""
+        with self._lock:
+            items = [(key, stats) for key, stats in self._endpoints.items()]
+            result = []
+            for (method, endpoint), stats in sorted(items, key=lambda item: -item[1].latency_sum):
+                cumulative = 0
+                histogram = []
+                for bound, count in zip(self._buckets, stats.bucket_counts):
+                    cumulative += count
+                    histogram.append(('+Inf' if math.isinf(bound) else bound, cumulative))
+                result.append({ 'method': method, 'endpoint': endpoint, 'requests': stats.requests, 'errors': stats.errors,
+                    'retries': stats.retries, 'bytesSent': stats.bytes_sent, 'bytesReceived': stats.bytes_received,
+                    'latencySum': stats.latency_sum, 'latencyMax': stats.latency_max,
+                    'latencyMean': stats.latency_sum / stats.requests if stats.requests else 0.0,
+                    'maxPage': stats.max_page, 'statuses': { str(k): v for k, v in stats.statuses.items() },
+                    'histogram': histogram })
+            return result
+
+    def to_json(self):
+        return json.dumps({ 'startedAt': self.started_at, 'endpoints': self.snapshot() }, indent=2)
+
+    def to_prometheus(self):
+        # Prometheus text exposition format
+        def labels(entry, extra = ''):
+            return '{method="' + entry['method'] + '",endpoint="' + entry['endpoint'] + '"' + extra + '}'
+        snapshot = self.snapshot()
+        lines = []
+        for name, kind, help_text, field in (
+            ('requests_total', 'counter', 'API requests', 'requests'),
+            ('errors_total', 'counter', 'API requests without a 2xx status', 'errors'),
+            ('retries_total', 'counter', 'API request retries', 'retries'),
+            ('sent_bytes_total', 'counter', 'Request body bytes', 'bytesSent'),
+            ('received_bytes_total', 'counter', 'Response body bytes', 'bytesReceived')):
+            lines.append('# HELP ' + METRIC_PREFIX + '_' + name + ' ' + help_text)
+            lines.append('# TYPE ' + METRIC_PREFIX + '_' + name + ' ' + kind)
+            for entry in snapshot:
+                lines.append(METRIC_PREFIX + '_' + name + labels(entry) + ' ' + str(entry[field]))
+        name = METRIC_PREFIX + '_request_seconds'
+        lines.append('# HELP ' + name + ' API request latency')
+        lines.append('# TYPE ' + name + ' histogram')
+        for entry in snapshot:
+            for bound, count in entry['histogram']:
+                lines.append(name + '_bucket' + labels(entry, ',le="' + str(bound) + '"') + ' ' + str(count))
+            lines.append(name + '_sum' + labels(entry) + ' ' + repr(entry['latencySum']))
+            lines.append(name + '_count' + labels(entry) + ' ' + str(entry['requests']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, format = None):
+        """
+        Write the metrics to path, replacing it atomically.
+        format: 'json' or 'prometheus' (None: json for *.json, otherwise prometheus)
+        """
+        if format is None:
+            format = 'json' if path.endswith('.json') else 'prometheus'
+        text = self.to_json() if format == 'json' else self.to_prometheus()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+class MetricsFileExporter():
+    def __init__(self, metrics, path, interval = 15.0, format = None):
+        """
+        Rewrite path with the metrics every interval seconds on a daemon thread
+        (e.g. for a node_exporter textfile collector), and once more on close.
+        """
+        self._metrics = metrics
+        self._path = path
+        self._interval = interval
+        self._format = format
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='insight-metrics-exporter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._metrics.write(self._path, self._format)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self._metrics.write(self._path, self._format)
@@ -0,0 +1,188 @@
+import json
+import sqlite3
+import time
+from logging import getLogger
+
+from insight_sql_testing_rows import json_default
+from insight_sql_testing import RESULT_ID_KEY, RESULT_CODE_KEY, RESULT_SQL_HASH_KEY, RESULT_ELAPSED_KEY, RESULT_CMP_ELAPSED_KEY
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS assessments (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    status_ex INTEGER,
+    info TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    assessment_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    row_id TEXT,
+    result_code INTEGER,
+    sql_hash TEXT,
+    elapsed REAL,
+    cmp_elapsed REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (assessment_id, row_index)
+);
+CREATE INDEX IF NOT EXISTS results_row_id ON results (assessment_id, row_id);
+CREATE INDEX IF NOT EXISTS results_result_code ON results (assessment_id, result_code);
+CREATE TABLE IF NOT EXISTS query_rows (
+    assessment_id TEXT NOT NULL,
+    row_id TEXT NOT NULL,
+    side TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (assessment_id, row_id, side, row_index)
+);
+'''
+
+def _number(value):
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+class AssessmentMirror():
+    def __init__(self, path, upper_logger = None):
+        """
+        Local SQLite mirror of assessments, result rows and query rows.
+
+        Result rows and query rows of an assessment never change once written
+        by the DT Manager, so a resync only fetches rows past the ones already
+        stored (by offset).
+
+        Parameters
+        ----------
+        path : SQLite database file (':memory:' for a temporary mirror)
+        upper_logger : logger to be used
+        """
+        self._logger = upper_logger or getLogger(__name__)
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _count(self, table, where, parameters):
+        return self._db.execute('SELECT COUNT(*) FROM ' + table + ' WHERE ' + where, parameters).fetchone()[0]
+
+    # sync from the DT Manager
+
+    def sync(self, sql_testing, assessment_id, query_parameters = None):
+        """
+        Fetch the assessment info and the result rows not mirrored yet.
+        Returns the number of new result rows.
+
+        The mirror always holds the whole result set: sync resumes at the
+        number of mirrored rows, which is only valid for unfiltered pages.
+        query_parameters (server-side filters) are rejected; filter locally
+        with rows(result_code=..., sql_hash=...) instead.
+        """
+        if query_parameters:
+            raise ValueError('sync mirrors all result rows; filter with rows()/count() instead of query_parameters')
+        info = sql_testing.get_assessment(assessment_id)
+        if info is None:
+            return None
+
+        offset = self._count('results', 'assessment_id = ?', (assessment_id,))
+        self._logger.info('Sync assessment: ' + assessment_id + ' (mirrored rows=' + str(offset) + ')')
+        new_rows = 0
+        for page in sql_testing.iter_assessment_sqls(assessment_id, offset, pages=True):
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+                    (assessment_id, offset + new_rows + i,
+                        None if row.get(RESULT_ID_KEY) is None else str(row.get(RESULT_ID_KEY)),
+                        row.get(RESULT_CODE_KEY), row.get(RESULT_SQL_HASH_KEY),
+                        _number(row.get(RESULT_ELAPSED_KEY)), _number(row.get(RESULT_CMP_ELAPSED_KEY)),
+                        json.dumps(row, default=json_default))
+                    for i, row in enumerate(page)])
+            new_rows += len(page)
+
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO assessments VALUES (?, ?, ?, ?, ?)',
+                (assessment_id, info.get('name'), info.get('statusEx'), json.dumps(info), time.time()))
+        self._logger.info('  new rows:' + str(new_rows))
+        return new_rows
+
+    def sync_query_rows(self, sql_testing, assessment_id, assessment_row_id, cmp = False):
+        """
+        Fetch the query rows (tgt, or cmp with cmp=True) of a result row not mirrored yet.
+        Returns the number of new query rows.
+        """
+        side = 'cmp' if cmp else 'tgt'
+        row_id = str(assessment_row_id)
+        offset = self._count('query_rows', 'assessment_id = ? AND row_id = ? AND side = ?', (assessment_id, row_id, side))
+        if cmp:
+            pages = sql_testing.iter_assessment_sql_cmp_query_rows(assessment_id, assessment_row_id, offset, pages=True)
+        else:
+            pages = sql_testing.iter_assessment_sql_query_rows(assessment_id, assessment_row_id, offset, pages=True)
+        new_rows = 0
+        for page in pages:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO query_rows VALUES (?, ?, ?, ?, ?)', [
+                    (assessment_id, row_id, side, offset + new_rows + i, json.dumps(row, default=json_default)) for i, row in enumerate(page)])
+            new_rows += len(page)
+        return new_rows
+
+    # local queries
+
+    def assessments(self):
+        return [json.loads(info) for (info,) in self._db.execute('SELECT info FROM assessments ORDER BY name')]
+
+    def get_assessment(self, assessment_id):
+        found = self._db.execute('SELECT info FROM assessments WHERE id = ?', (assessment_id,)).fetchone()
+        return None if found is None else json.loads(found[0])
+
+    def _results_where(self, assessment_id, result_code, sql_hash):
+        where = 'assessment_id = ?'
+        parameters = [assessment_id]
+        if result_code is not None:
+            where += ' AND result_code = ?'
+            parameters.append(result_code)
+        if sql_hash is not None:
+            where += ' AND sql_hash = ?'
+            parameters.append(sql_hash)
+        return where, parameters
+
+    def rows(self, assessment_id, result_code = None, sql_hash = None, offset = 0, limit = -1):
+        """
+        Iterate mirrored result rows in server order,
+        e.g. rows(assessment_id, result_code=5) for Performance degradation.
+        """
+        where, parameters = self._results_where(assessment_id, result_code, sql_hash)
+        cursor = self._db.execute('SELECT data FROM results WHERE ' + where + ' ORDER BY row_index LIMIT ? OFFSET ?', parameters + [limit, offset])
+        for (data,) in cursor:
+            yield json.loads(data)
+
+    def get_row(self, assessment_id, assessment_row_id):
+        found = self._db.execute('SELECT data FROM results WHERE assessment_id = ? AND row_id = ?', (assessment_id, str(assessment_row_id))).fetchone()
+        return None if found is None else json.loads(found[0])
+
+    def count(self, assessment_id, result_code = None, sql_hash = None):
+        where, parameters = self._results_where(assessment_id, result_code, sql_hash)
+        return self._count('results', where, parameters)
+
+    def result_code_counts(self, assessment_id):
+        # { result code: rows }
+        return dict(self._db.execute('SELECT result_code, COUNT(*) FROM results WHERE assessment_id = ? GROUP BY result_code', (assessment_id,)))
+
+    def query_rows(self, assessment_id, assessment_row_id, cmp = False):
+        cursor = self._db.execute('SELECT data FROM query_rows WHERE assessment_id = ? AND row_id = ? AND side = ? ORDER BY row_index',
+            (assessment_id, str(assessment_row_id), 'cmp' if cmp else 'tgt'))
+        for (data,) in cursor:
+            yield json.loads(data)
+
+    def delete(self, assessment_id):
+        with self._db:
+            for table in ('results', 'query_rows'):
+                self._db.execute('DELETE FROM ' + table + ' WHERE assessment_id = ?', (assessment_id,))
+            self._db.execute('DELETE FROM assessments WHERE id = ?', (assessment_id,))
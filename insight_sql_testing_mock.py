@@ -0,0 +1,376 @@
+"""
+Local stand-in for the Insight DT Manager api/v2 endpoints used by InsightSQLTesting.
+
+For development and benchmarks only: data is generated, nothing is executed.
+
+    python3 insight_sql_testing_mock.py --port 7777 --rows 100000 --latency 0.005
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from insight_sql_testing import RESULT_CODES, JOB_PROGRESS, JOB_TIME_FORMAT
+
+API_PREFIX = '/idt/api/v2/'
+COOKIE_NAME = 'mock-session'
+MAX_PAGE_LIMIT = 1000   # rows per page at most, like a real server cap
+QUERY_ROWS_PAGE = 100   # rows per queryRows page
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+class MockInsightServer():
+    def __init__(self, host = '127.0.0.1', port = 0, rows = 1000, query_rows = 200, latency = 0.0,
+        failure_rate = 0.0, failure_status = 503, job_seconds = 1.0, seed = 0):
+        """
+        Mock DT Manager on a background thread.
+
+        Parameters
+        ----------
+        rows : result rows of each assessment and SQLs of each SQL-workload
+        query_rows : query rows (tgt and cmp) of each result row
+        latency : seconds added to every response
+        failure_rate : share of requests (0.0 - 1.0) answered with failure_status
+        failure_status : status of injected failures (with Retry-After: 0)
+        job_seconds : seconds until a created sql-workload/patch-sql/assessment is ready
+        seed : random seed of the generated data and the failures
+        """
+        self.rows = rows
+        self.query_rows = query_rows
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.job_seconds = job_seconds
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sessions = set()
+        self._resources = { 'databases': {}, 'sql-workloads': {}, 'patch-sqls': {}, 'assessments': {}, 'users': {} }
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+        self._seed_resources()
+
+    @property
+    def url_base(self):
+        host, port = self._server.server_address[:2]
+        return 'http://' + host + ':' + str(port) + '/idt/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='insight-mock', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.stop()
+
+    # resources
+
+    def _seed_resources(self):
+        database = self.create('databases', { 'name': 'mock-db', 'dbType': 'MYSQL', 'dbVersion': '8.0', 'connectionString': 'localhost:3306/mock' }, job = False)
+        sql_workload = self.create('sql-workloads', { 'name': 'mock-workload', 'dbType': 'MYSQL' }, ready = True)
+        self.create('assessments', { 'name': 'mock-assessment', 'sqlWorkloadId': sql_workload['id'], 'databaseId': database['id'] }, ready = True)
+
+    def create(self, key, body, job = True, ready = False):
+        resource_id = uuid.uuid4().hex
+        info = { 'memo': None, 'cmpDatabaseId': None } if key == 'assessments' else {}
+        info.update(body)
+        info.pop('pass', None)
+        info.pop('pswds', None)
+        info.update({ 'id': resource_id, '_created': time.monotonic() - (self.job_seconds if ready else 0), '_job': job })
+        with self._lock:
+            self._resources[key][resource_id] = info
+        return self.view(key, info)
+
+    def get(self, key, resource_id):
+        with self._lock:
+            info = self._resources[key].get(resource_id)
+        return None if info is None else self.view(key, info)
+
+    def delete(self, key, resource_id):
+        with self._lock:
+            return self._resources[key].pop(resource_id, None) is not None
+
+    def update(self, key, resource_id, body):
+        with self._lock:
+            info = self._resources[key].get(resource_id)
+            if info is None:
+                return None
+            info.update(body)
+        return self.view(key, info)
+
+    def list(self, key):
+        with self._lock:
+            infos = list(self._resources[key].values())
+        return [self.view(key, info) for info in infos]
+
+    def view(self, key, info):
+        # the API representation, with the job state derived from the creation time
+        view = { k: v for k, v in info.items() if not k.startswith('_') }
+        if not info['_job']:
+            return view
+        elapsed = time.monotonic() - info['_created']
+        done = elapsed >= self.job_seconds
+        progress = 1.0 if done or self.job_seconds <= 0 else elapsed / self.job_seconds
+        start_time = _utcnow() - datetime.timedelta(seconds=elapsed)
+        end_time = start_time + datetime.timedelta(seconds=self.job_seconds)
+        job = { 'startTime': start_time.strftime(JOB_TIME_FORMAT), 'endTime': end_time.strftime(JOB_TIME_FORMAT) if done else None }
+        if key == 'patch-sqls':
+            job[JOB_PROGRESS[key][1]] = int(100 * progress)
+        else:
+            job[JOB_PROGRESS[key][1]] = int(self.rows * progress)
+        if key == 'assessments':
+            view['summary'] = { 'allCode': self.result_code_counts() if done else [0] * len(RESULT_CODES) }
+        view['statusEx'] = 0 if done else 1
+        view['jobs'] = [job]
+        return view
+
+    # generated rows
+
+    def result_code(self, index):
+        # mostly Success, a few of each failure
+        return 0 if index % 10 else (index // 10) % len(RESULT_CODES)
+
+    def result_code_counts(self):
+        counts = [0] * len(RESULT_CODES)
+        for index in range(self.rows):
+            counts[self.result_code(index)] += 1
+        return counts
+
+    def result_row(self, index):
+        return { 'id': index, 'resultCode': self.result_code(index), 'sqlHash': format(index % 97, '08x'),
+            'sqlText': 'SELECT * FROM t' + str(index % 97) + ' WHERE id = ?', 'dbUser': 'user' + str(index % 3),
+            'elapsedTime': 1.0 + index % 7, 'cmpElapsedTime': 1.0 + index % 5 }
+
+    def workload_row(self, index):
+        return { 'id': index, 'host': 'host' + str(index % 4), 'dbUser': 'user' + str(index % 3),
+            'sqlText': 'SELECT * FROM t' + str(index % 97) + ' WHERE id = ?', 'sqlHash': format(index % 97, '08x') }
+
+    def query_row(self, index, cmp):
+        return { 'ID': index, 'NAME': 'name' + str(index), 'VALUE': index * (1.0001 if cmp and index % 50 == 0 else 1.0) }
+
+    def query_rows_csv(self, cmp):
+        lines = ['"ID","NAME","VALUE"']
+        for index in range(self.query_rows):
+            row = self.query_row(index, cmp)
+            lines.append(str(row['ID']) + ',"' + row['NAME'] + '",' + repr(row['VALUE']))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def assessment_csv(self):
+        lines = ['"id","resultCode","sqlHash","sqlText","dbUser","elapsedTime","cmpElapsedTime"']
+        for index in range(self.rows):
+            row = self.result_row(index)
+            lines.append(','.join('"' + str(row[k]) + '"' for k in ('id', 'resultCode', 'sqlHash', 'sqlText', 'dbUser', 'elapsedTime', 'cmpElapsedTime')))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def inject_failure(self):
+        with self._lock:
+            self.requests += 1
+            if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+                self.failures += 1
+                return True
+        return False
+
+def _page(query, generate, total):
+    limit = min(int(query.get('limit', 20)), MAX_PAGE_LIMIT)
+    offset = int(query.get('offset', 0))
+    return { 'rows': [generate(i) for i in range(offset, min(offset + limit, total))], 'total': total }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes: avoid the Nagle / delayed ACK stall
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send(self, status, data = None, content_type = 'application/json', headers = None):
+        body = data if isinstance(data, bytes) else json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, content, content_type = 'text/csv'):
+        # supports Range: bytes=<start>- with If-Range (ETag) for resumed downloads
+        etag = '"' + hashlib.blake2b(content, digest_size=8).hexdigest() + '"'
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match is None or (if_range is not None and if_range != etag):
+            return self._send(200, content, content_type, { 'ETag': etag })
+        start = int(match.group(1))
+        if start >= len(content):
+            return self._send(416, {}, headers={ 'Content-Range': 'bytes */' + str(len(content)) })
+        self._send(206, content[start:], content_type, { 'Content-Range': 'bytes ' + str(start) + '-' + str(len(content) - 1) + '/' + str(len(content)), 'ETag': etag })
+
+    def _handle(self, method):
+        body = self._read_body() if method in ('POST', 'PUT', 'PATCH', 'DELETE') else b''
+        if self.mock.latency > 0:
+            time.sleep(self.mock.latency)
+        if not self.path.startswith(API_PREFIX):
+            return self._send(404, { 'message': 'not found' })
+        path, _, query_string = self.path[len(API_PREFIX):].partition('?')
+        query = dict(p.split('=', 1) for p in query_string.split('&') if '=' in p)
+        if path == 'auth':
+            return self._auth(method)
+        if self.mock.inject_failure():
+            return self._send(self.mock.failure_status, { 'message': 'injected failure' }, headers={ 'Retry-After': '0' })
+        cookie = self.headers.get('Cookie', '')
+        if not any(COOKIE_NAME + '=' + session in cookie for session in self.mock._sessions):
+            return self._send(401, { 'message': 'not logged in' })
+
+        status, data = self._route(method, path.rstrip('/'), query, body)
+        if isinstance(data, bytes):
+            return self._send_file(data)
+        self._send(status, data)
+
+    def _auth(self, method):
+        if method == 'POST':
+            session = uuid.uuid4().hex
+            self.mock._sessions.add(session)
+            return self._send(200, { 'message': 'logged in' }, headers={ 'Set-Cookie': COOKIE_NAME + '=' + session + '; Path=/' })
+        return self._send(200, { 'message': 'logged out' })
+
+    def _json(self, body):
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def _route(self, method, path, query, body):
+        mock = self.mock
+        parts = path.split('/')
+        key = parts[0]
+
+        if path == 'version':
+            return 200, { 'VERSION': '4.0.0-mock' }
+        if path == 'license':
+            return 200, { 'key': 'mock' }
+        if path in ('users/me', 'users/change-my-password'):
+            return 200, { 'name': 'mock' }
+        if path in ('databases/parse', 'databases/execute', 'databases/query-plan', 'databases/test-connect'):
+            request = self._json(body)
+            return 200, { 'result': 'OK', 'sqlText': request.get('sqlText'), 'plan': [{ 'id': 0, 'operation': 'SELECT STATEMENT' }] }
+        if key not in mock._resources:
+            return 404, { 'message': 'not found' }
+
+        if len(parts) == 1:
+            if method == 'GET':
+                resources = mock.list(key)
+                return 200, _page(query, resources.__getitem__, len(resources))
+            if method == 'POST':
+                return 200, mock.create(key, self._json(body), job = key in ('sql-workloads', 'patch-sqls', 'assessments'))
+        if len(parts) == 2 and parts[1] in ('upload', 'from-sct', 'from-assessment', 'merge'):
+            # multipart uploads: the fields are not parsed, the name is taken when found
+            match = re.search(rb'name="name"\r\n\r\n([^\r]*)', body)
+            request = self._json(body) if match is None else { 'name': match.group(1).decode('utf-8') }
+            return 200, mock.create(key, request)
+
+        resource_id = parts[1]
+        info = mock.get(key, resource_id)
+        if info is None:
+            return 404, { 'message': 'not found' }
+        if len(parts) == 2:
+            if method == 'GET':
+                return 200, info
+            if method == 'DELETE':
+                mock.delete(key, resource_id)
+                return 200, { 'id': resource_id }
+            if method in ('PATCH', 'PUT'):
+                return 200, mock.update(key, resource_id, self._json(body))
+
+        rest = parts[2:]
+        if key == 'sql-workloads' and rest == ['rows']:
+            return 200, _page(query, mock.workload_row, mock.rows)
+        if key == 'sql-workloads' and rest in (['copy'], ['modify'], ['summary']):
+            if rest == ['copy']:
+                return 200, mock.create(key, dict(info, **self._json(body)))
+            return 200, info
+        if key == 'patch-sqls' and rest == ['hash-rule', 'rows']:
+            return 200, _page(query, mock.workload_row, mock.rows)
+        if key == 'assessments':
+            if rest == ['results']:
+                return 200, _page(query, mock.result_row, mock.rows)
+            if rest == ['download', 'csv']:
+                return 200, mock.assessment_csv()
+            if len(rest) >= 2 and rest[0] == 'results':
+                index = int(rest[1])
+                if index >= mock.rows:
+                    return 404, { 'message': 'not found' }
+                if len(rest) == 2:
+                    return 200, mock.result_row(index)
+                cmp = rest[2] == 'cmpQueryRows'
+                if rest[3:] == ['download']:
+                    return 200, mock.query_rows_csv(cmp)
+                offset = int(query.get('offset', 0))
+                return 200, [mock.query_row(i, cmp) for i in range(offset, min(offset + QUERY_ROWS_PAGE, mock.query_rows))]
+        return 404, { 'message': 'not found' }
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mock Insight DT Manager (api/v2)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--query-rows', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--job-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+    server = MockInsightServer(args.host, args.port, args.rows, args.query_rows, args.latency,
+        args.failure_rate, args.failure_status, args.job_seconds)
+    print(server.url_base, flush=True)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
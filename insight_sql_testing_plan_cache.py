@@ -0,0 +1,135 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Plans kept in memory (least recently used ones are evicted first)
+PLAN_CACHE_ENTRIES = 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS query_plans (
+    key TEXT PRIMARY KEY,
+    schema_version TEXT,
+    plan TEXT NOT NULL,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS query_plans_schema_version ON query_plans (schema_version);
+'''
+
+def query_plan_key(db_type, connection_string, sql_text, bind = [], convert_parameter = False, schema_version = None):
+    """
+    Content hash of a get_query_plan request. The DB user and password are not
+    part of it: the same statement on the same database gives the same plan.
+    """
+    content = json.dumps([schema_version, db_type, connection_string, sql_text, bind, bool(convert_parameter)],
+        ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class QueryPlanCache():
+    def __init__(self, max_entries = PLAN_CACHE_ENTRIES, path = None, schema_version = None):
+        """
+        Cache of get_query_plan responses (pass it to InsightSQLTesting as query_plan_cache).
+
+        Parameters
+        ----------
+        max_entries : plans kept in memory (LRU)
+        path : SQLite file of the on-disk tier, shared by sessions (None: memory only)
+        schema_version : label of the current schema (e.g. a migration number);
+            plans cached under another version are not used
+        """
+        self.schema_version = schema_version
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (schema_version, plan)
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, db_type, connection_string, sql_text, bind = [], convert_parameter = False):
+        return query_plan_key(db_type, connection_string, sql_text, bind, convert_parameter, self.schema_version)
+
+    def get(self, key):
+        """Cached plan or None (counted as a hit or a miss)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if self._db is not None:
+                found = self._db.execute('SELECT schema_version, plan FROM query_plans WHERE key = ?', (key,)).fetchone()
+                if found is not None:
+                    plan = json.loads(found[1])
+                    self._remember(key, found[0], plan)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return plan
+            self.misses += 1
+            return None
+
+    def put(self, key, plan):
+        with self._lock:
+            self._remember(key, self.schema_version, plan)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute('INSERT OR REPLACE INTO query_plans VALUES (?, ?, ?, ?)',
+                        (key, self.schema_version, json.dumps(plan), time.time()))
+
+    def _remember(self, key, schema_version, plan):
+        self._entries[key] = (schema_version, plan)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, schema_version = None):
+        """
+        Drop the plans cached under schema_version (None: all plans).
+        Use set_schema_version to switch to a new schema instead.
+        """
+        with self._lock:
+            if schema_version is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, (version, _) in self._entries.items() if version == schema_version]:
+                    del self._entries[key]
+            if self._db is not None:
+                with self._db:
+                    if schema_version is None:
+                        self._db.execute('DELETE FROM query_plans')
+                    else:
+                        self._db.execute('DELETE FROM query_plans WHERE schema_version = ?', (schema_version,))
+
+    def set_schema_version(self, schema_version, drop_old = True):
+        # plans of the previous version are no longer looked up (and dropped with drop_old)
+        previous = self.schema_version
+        self.schema_version = schema_version
+        if drop_old and previous != schema_version:
+            self.invalidate(previous)
+
+    def stats(self):
+        looked_up = self.hits + self.misses
+        return { 'entries': len(self._entries), 'hits': self.hits, 'diskHits': self.disk_hits, 'misses': self.misses,
+            'evictions': self.evictions, 'hitRatio': self.hits / looked_up if looked_up else 0.0 }
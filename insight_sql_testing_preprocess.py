@@ -0,0 +1,203 @@
+import csv
+import datetime
+import hashlib
+import os
+import re
+import sys
+from collections import OrderedDict
+from logging import getLogger
+
+# Columns of a capture file (see sample.csv)
+HOST_COLUMN = 'Host'
+DB_USER_COLUMN = 'DB User'
+SQL_START_TIME_COLUMN = 'SQL Start Time'
+SQL_TEXT_COLUMN = 'SQL Text'
+SQL_HASH_COLUMN = 'SQL Hash'
+BIND_VARIABLES_COLUMN = 'Bind Variables'
+SQL_START_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Shard files kept open at the same time while splitting by time window
+MAX_OPEN_SHARDS = 32
+
+NO_TIME_SUFFIX = 'notime'
+
+_SPACES = re.compile(r'\s+')
+
+def normalize_sql(sql_text):
+    # same statement regardless of layout and a trailing semicolon
+    return _SPACES.sub(' ', sql_text).strip().rstrip(';').rstrip()
+
+def _fingerprint(*values):
+    # 8 bytes per distinct statement is all the dedupe keeps in memory
+    h = hashlib.blake2b(digest_size=8)
+    for v in values:
+        h.update(v.encode('utf-8'))
+        h.update(b'\0')
+    return h.digest()
+
+class PreprocessResult():
+    def __init__(self):
+        self.files = OrderedDict()  # suffix ('' without time windows) -> output file path
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_filtered = 0
+        self.rows_duplicated = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def reduction(self):
+        # ratio of removed bytes (0.0 - 1.0)
+        if self.bytes_read == 0:
+            return 0.0
+        return 1.0 - self.bytes_written / self.bytes_read
+
+    def __str__(self):
+        return ('rows: ' + str(self.rows_read) + ' -> ' + str(self.rows_written)
+            + ' (filtered:' + str(self.rows_filtered) + ', duplicated:' + str(self.rows_duplicated) + ')'
+            + ', bytes: ' + str(self.bytes_read) + ' -> ' + str(self.bytes_written)
+            + ' (' + format(-self.reduction() * 100, '+.1f') + '%)'
+            + ', files: ' + str(len(self.files)))
+
+class _ShardWriters():
+    # csv writers per shard, at most MAX_OPEN_SHARDS open files
+    def __init__(self, output_prefix, header, encoding):
+        self._output_prefix = output_prefix
+        self._header = header
+        self._encoding = encoding
+        self._open = OrderedDict()
+        self.files = OrderedDict()
+
+    def writer(self, suffix):
+        if suffix in self._open:
+            self._open.move_to_end(suffix)
+            return self._open[suffix][1]
+
+        if len(self._open) >= MAX_OPEN_SHARDS:
+            _, (file, _) = self._open.popitem(last=False)
+            file.close()
+        path = self._output_prefix + ('_' + suffix if suffix else '') + '.csv'
+        new_file = suffix not in self.files
+        file = open(path, 'w' if new_file else 'a', newline='', encoding=self._encoding)
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+        if new_file:
+            writer.writerow(self._header)
+            self.files[suffix] = path
+        self._open[suffix] = (file, writer)
+        return writer
+
+    def close(self):
+        for file, _ in self._open.values():
+            file.close()
+        self._open.clear()
+
+def preprocess_workload_csv(source_file_path, output_prefix, dedupe = None, dedupe_with_binds = False,
+    db_users = None, hosts = None, window_seconds = None, encoding = 'utf-8', upper_logger = None):
+    """
+    Stream a capture file (sample.csv format) into smaller upload files.
+
+    Parameters
+    ----------
+    source_file_path : capture file
+    output_prefix : output files are <output_prefix>.csv, or
+        <output_prefix>_<window start YYYYmmddHHMMSS>.csv with window_seconds
+        (rows without a valid SQL Start Time go to <output_prefix>_notime.csv)
+    dedupe : None, 'text' (normalized SQL Text) or 'hash' (SQL Hash, SQL Text
+        if the hash is empty); duplicates are removed within each output file
+    dedupe_with_binds : also compare Bind Variables when deduping
+    db_users : keep only these DB users (None: all)
+    hosts : keep only these hosts (None: all)
+    window_seconds : split by SQL Start Time windows of this length
+
+    Rows are read and written one at a time. Memory use does not grow with
+    the file size; only an 8-byte fingerprint per distinct statement is kept
+    for dedupe.
+
+    Returns
+    -------
+    PreprocessResult with the output files and the row/byte reduction.
+    """
+    if dedupe not in (None, 'text', 'hash'):
+        raise ValueError('Unknown dedupe:' + str(dedupe) + ' (None, text or hash)')
+    logger = upper_logger or getLogger(__name__)
+    db_users = None if db_users is None else set(db_users)
+    hosts = None if hosts is None else set(hosts)
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+    result = PreprocessResult()
+    seen = set()
+    with open(source_file_path, newline='', encoding=encoding) as source:
+        reader = csv.reader(source)
+        header = next(reader)
+        column = { name: i for i, name in enumerate(header) }
+        host_index = column.get(HOST_COLUMN)
+        db_user_index = column.get(DB_USER_COLUMN)
+        time_index = column.get(SQL_START_TIME_COLUMN)
+        text_index = column[SQL_TEXT_COLUMN]
+        hash_index = column.get(SQL_HASH_COLUMN)
+        bind_index = column.get(BIND_VARIABLES_COLUMN)
+
+        shards = _ShardWriters(output_prefix, header, encoding)
+        try:
+            for row in reader:
+                result.rows_read += 1
+                if (db_users is not None and (db_user_index is None or row[db_user_index] not in db_users)) \
+                    or (hosts is not None and (host_index is None or row[host_index] not in hosts)):
+                    result.rows_filtered += 1
+                    continue
+
+                suffix = ''
+                if window_seconds is not None:
+                    suffix = NO_TIME_SUFFIX
+                    if time_index is not None:
+                        try:
+                            start_time = datetime.datetime.strptime(row[time_index], SQL_START_TIME_FORMAT)
+                        except ValueError:
+                            start_time = None
+                        if start_time is not None:
+                            seconds = int(start_time.replace(tzinfo=datetime.timezone.utc).timestamp())
+                            window_start = datetime.datetime.fromtimestamp(seconds - seconds % window_seconds, datetime.timezone.utc)
+                            suffix = window_start.strftime('%Y%m%d%H%M%S')
+
+                if dedupe is not None:
+                    if dedupe == 'hash' and hash_index is not None and row[hash_index] != '':
+                        key = 'h:' + row[hash_index]
+                    else:
+                        key = 't:' + normalize_sql(row[text_index])
+                    binds = row[bind_index] if dedupe_with_binds and bind_index is not None else ''
+                    fingerprint = _fingerprint(suffix, key, binds)
+                    if fingerprint in seen:
+                        result.rows_duplicated += 1
+                        continue
+                    seen.add(fingerprint)
+
+                shards.writer(suffix).writerow(row)
+                result.rows_written += 1
+        finally:
+            shards.close()
+
+    result.files = shards.files
+    result.bytes_read = os.path.getsize(source_file_path)
+    result.bytes_written = sum(os.path.getsize(path) for path in result.files.values())
+    logger.info('Preprocessed ' + source_file_path + ': ' + str(result))
+    return result
+
+def create_sql_workload_upload_preprocessed(sql_testing, sql_workload_name, db_type, source_file_path, output_prefix = None,
+    is_unique = False, memo = None, wait = True, compress = False, **preprocess_options):
+    """
+    Preprocess a capture file (see preprocess_workload_csv) and upload every
+    output file with sql_testing.create_sql_workload_upload.
+    Each time window becomes a SQL-workload named <sql_workload_name>_<window start>.
+
+    Returns
+    -------
+    (list of create_sql_workload_upload results, PreprocessResult)
+    """
+    if output_prefix is None:
+        output_prefix = os.path.splitext(source_file_path)[0] + '_preprocessed'
+    result = preprocess_workload_csv(source_file_path, output_prefix, upper_logger=sql_testing._logger, **preprocess_options)
+
+    sql_workloads = []
+    for suffix, path in result.files.items():
+        name = sql_workload_name + ('_' + suffix if suffix else '')
+        sql_workloads.append(sql_testing.create_sql_workload_upload(name, db_type, path, is_unique, memo, wait=wait, compress=compress))
+    return sql_workloads, result
@@ -0,0 +1,113 @@
+import threading
+from collections.abc import Mapping
+
+# Keys whose values repeat across rows; equal strings share one object
+INTERN_KEYS = ('dbUser', 'host', 'sqlHash', 'sqlText', 'dbType', 'schema', 'program', 'module', 'status')
+# Strings kept per interned key; the pool starts over when full
+MAX_INTERNED_VALUES = 4096
+
+class RowSchema():
+    def __init__(self, keys, intern_keys = INTERN_KEYS, max_interned = MAX_INTERNED_VALUES):
+        """
+        Keys of a kind of row (e.g. the results of assessments), shared by
+        all its CompactRow instances.
+        """
+        self.keys = tuple(keys)
+        self.index = { key: i for i, key in enumerate(self.keys) }
+        self._interned = [{} if key in intern_keys else None for key in self.keys]
+        self._max_interned = max_interned
+
+    def values(self, row):
+        # dict -> tuple of values in key order, repeated strings interned
+        values = []
+        for key, pool in zip(self.keys, self._interned):
+            value = row[key]
+            if pool is not None and type(value) is str:
+                interned = pool.get(value)
+                if interned is None:
+                    if len(pool) >= self._max_interned:
+                        pool.clear()
+                    pool[value] = interned = value
+                value = interned
+            values.append(value)
+        return tuple(values)
+
+class CompactRow(Mapping):
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema, values):
+        """
+        Read-only row stored as a tuple of values plus a shared RowSchema.
+        Indexing by key, get, in, keys/items and == work as on the dict
+        returned by the API; to_dict() (or dict(row)) makes a dict.
+        """
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._schema.index[key]]
+
+    def __contains__(self, key):
+        return key in self._schema.index
+
+    def __iter__(self):
+        return iter(self._schema.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return 'CompactRow(' + repr(self.to_dict()) + ')'
+
+    def __reduce__(self):
+        return (dict, (self.to_dict(),))
+
+    def to_dict(self):
+        return dict(zip(self._schema.keys, self._values))
+
+    def copy(self):
+        # a mutable copy, as dict.copy() gives
+        return self.to_dict()
+
+class CompactRowFactory():
+    def __init__(self, intern_keys = INTERN_KEYS, max_interned = MAX_INTERNED_VALUES):
+        """
+        Converts pages of row dicts to CompactRow. One RowSchema is kept per
+        distinct key order, so rows of a kind share their keys and the
+        interned strings (at most max_interned per key).
+        """
+        self._intern_keys = intern_keys
+        self._max_interned = max_interned
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def schema(self, keys):
+        keys = tuple(keys)
+        schema = self._schemas.get(keys)
+        if schema is None:
+            with self._lock:
+                schema = self._schemas.setdefault(keys, RowSchema(keys, self._intern_keys, self._max_interned))
+        return schema
+
+    def rows(self, rows):
+        compact = []
+        schema = None
+        for row in rows:
+            if not isinstance(row, dict):
+                compact.append(row)
+                continue
+            keys = tuple(row)
+            if schema is None or keys != schema.keys:
+                schema = self.schema(keys)
+            compact.append(CompactRow(schema, schema.values(row)))
+        return compact
+
+def to_dict(row):
+    """dict of a row (CompactRow or dict)."""
+    return row.to_dict() if isinstance(row, CompactRow) else row
+
+def json_default(value):
+    # json.dumps(..., default=json_default) for data holding CompactRow
+    if isinstance(value, CompactRow):
+        return value.to_dict()
+    raise TypeError('Object of type ' + type(value).__name__ + ' is not JSON serializable')
@@ -0,0 +1,123 @@
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Seconds a stored session is reused; keep it below the DT Manager session timeout
+SESSION_TTL = 1800
+
+@contextlib.contextmanager
+def _locked(path):
+    # exclusive lock on <path>.lock, held across processes
+    with open(path + '.lock', 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class SessionStore():
+    def __init__(self, path, ttl = SESSION_TTL):
+        """
+        Session cookies shared by the clients of all processes of a user
+        (pass it to InsightSQLTesting as session_store).
+
+        The file holds only session cookies keyed by a hash of the URL and the
+        user name (never the password) and is created readable by the owner only.
+        Entries expire after ttl seconds or at the cookie expiry, whichever
+        comes first.
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def _key(self, url_base, user):
+        return hashlib.sha256((url_base + '\0' + user).encode('utf-8')).hexdigest()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        temp_path = self.path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(sessions, file)
+        os.replace(temp_path, self.path)
+
+    def _load(self, url_base, user):
+        entry = self._read().get(self._key(url_base, user))
+        if entry is None or entry['expires'] <= time.time():
+            return None
+        return requests.utils.cookiejar_from_dict(entry['cookies'])
+
+    def _save(self, url_base, user, cookies):
+        expires = time.time() + self.ttl
+        for cookie in cookies:
+            if cookie.expires is not None:
+                expires = min(expires, cookie.expires)
+        sessions = self._read()
+        now = time.time()
+        sessions = { k: v for k, v in sessions.items() if v['expires'] > now }
+        sessions[self._key(url_base, user)] = { 'cookies': requests.utils.dict_from_cookiejar(cookies), 'expires': expires }
+        self._write(sessions)
+
+    def load(self, url_base, user):
+        """Cookies of a live stored session, or None."""
+        with _locked(self.path):
+            return self._load(url_base, user)
+
+    def save(self, url_base, user, cookies):
+        with _locked(self.path):
+            self._save(url_base, user, cookies)
+
+    def load_or_login(self, url_base, user, login):
+        """
+        Cookies of a live stored session, else the cookies returned by login()
+        (stored unless None). The lock is held from the check to the save, so
+        clients starting together log in only once.
+
+        Returns
+        -------
+        (cookies, True if they were stored before)
+        """
+        with _locked(self.path):
+            cookies = self._load(url_base, user)
+            if cookies is not None:
+                return cookies, True
+            cookies = login()
+            if cookies is not None:
+                self._save(url_base, user, cookies)
+            return cookies, False
+
+    def discard(self, url_base, user, cookies = None):
+        """Forget the stored session (only if it is still cookies, when given)."""
+        with _locked(self.path):
+            sessions = self._read()
+            key = self._key(url_base, user)
+            entry = sessions.get(key)
+            if entry is None:
+                return
+            if cookies is not None and entry['cookies'] != requests.utils.dict_from_cookiejar(cookies):
+                return
+            del sessions[key]
+            self._write(sessions)